@@ -0,0 +1,287 @@
+"""アンケート回答の集計用ユーティリティ
+
+Pydanticモデルを経由しない軽量な行表現と、集計ロジックをまとめる。
+main.py に依存しないため、オフライン集計などからも利用できる。
+"""
+import operator
+import threading
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from sketches import HyperLogLog, ScoreHistogram
+
+# SurveyResponse と同じフィールド構成
+SURVEY_RESPONSE_FIELDS: Tuple[str, ...] = (
+    "id",
+    "age",
+    "gender",
+    "frequency",
+    "satisfaction",
+    "feedback",
+    "userId",
+    "displayName",
+    "timestamp",
+    "createdAt",
+)
+
+
+class SurveyRow:
+    """射影クエリ用の軽量な回答行（行ごとのバリデーションを行わない）"""
+
+    __slots__ = SURVEY_RESPONSE_FIELDS
+
+    def __init__(self, data: Dict[str, Any], doc_id: Optional[str] = None):
+        for name in SURVEY_RESPONSE_FIELDS:
+            setattr(self, name, data.get(name))
+        if doc_id is not None:
+            self.id = doc_id
+
+    def to_dict(self, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """指定フィールド（未指定なら全フィールド）を辞書に変換"""
+        names = SURVEY_RESPONSE_FIELDS if fields is None else fields
+        return {name: getattr(self, name) for name in names}
+
+
+# 時間バケット集計（ロールアップ）の対象となるカテゴリ項目
+ROLLUP_DIMENSIONS: Tuple[str, ...] = ("age", "gender", "frequency", "satisfaction")
+ROLLUP_GRANULARITIES: Tuple[str, ...] = ("hour", "day")
+
+
+def rollup_bucket_keys(timestamp: str) -> Dict[str, str]:
+    """ISO形式のタイムスタンプから粒度ごとのバケットキーを求める"""
+    date_part, _, time_part = timestamp.partition('T')
+    return {
+        "hour": f"{date_part}T{time_part[:2] or '00'}",  # YYYY-MM-DDTHH
+        "day": date_part,  # YYYY-MM-DD
+    }
+
+
+def rollup_document_id(granularity: str, bucket: str) -> str:
+    """ロールアップドキュメントのIDを生成"""
+    return f"{granularity}_{bucket}"
+
+
+def rollup_increments(response: Dict[str, Any]) -> Dict[str, Any]:
+    """1件の回答がロールアップに加算するカウンタを求める"""
+    increments: Dict[str, Any] = {"total": 1, "satisfaction_sum": int(response["satisfaction"])}
+    for dimension in ROLLUP_DIMENSIONS:
+        increments[dimension] = {str(response[dimension]): 1}
+    return increments
+
+
+def merge_rollup(target: Dict[str, Any], source: Dict[str, Any], sign: int = 1) -> Dict[str, Any]:
+    """ロールアップのカウンタをtargetに加算する（sign=-1で減算、targetを返す）
+
+    減算で0になったカテゴリは取り除く。
+    """
+    target["total"] = target.get("total", 0) + sign * source.get("total", 0)
+    target["satisfaction_sum"] = target.get("satisfaction_sum", 0) + sign * source.get("satisfaction_sum", 0)
+    for dimension in ROLLUP_DIMENSIONS:
+        counts = target.setdefault(dimension, {})
+        for key, value in (source.get(dimension) or {}).items():
+            counts[key] = counts.get(key, 0) + sign * value
+            if not counts[key]:
+                del counts[key]
+    return target
+
+
+def rollup_statistics(rollup: Dict[str, Any], responses_by_date: Dict[str, int]) -> Dict[str, Any]:
+    """合算したロールアップをStatisticsモデルの形式に変換"""
+    total = rollup.get("total", 0)
+    satisfaction_distribution = dict(rollup.get("satisfaction") or {})
+    return {
+        "total_responses": total,
+        "age_distribution": dict(rollup.get("age") or {}),
+        "gender_distribution": dict(rollup.get("gender") or {}),
+        "frequency_distribution": dict(rollup.get("frequency") or {}),
+        "satisfaction_distribution": satisfaction_distribution,
+        "average_satisfaction": round(rollup.get("satisfaction_sum", 0) / total, 2) if total else 0.0,
+        "responses_by_date": responses_by_date,
+        **satisfaction_summary(ScoreHistogram(counts=satisfaction_distribution)),
+    }
+
+
+# 満足度（1〜5）の分位点とNPS形式のスコアの定義
+SATISFACTION_PERCENTILES: Tuple[float, ...] = (0.25, 0.5, 0.75, 0.9)
+NPS_PROMOTER_MIN = 5  # 推奨者: 5
+NPS_DETRACTOR_MAX = 3  # 批判者: 1〜3
+
+
+def satisfaction_summary(histogram: ScoreHistogram) -> Dict[str, Any]:
+    """満足度の分位点（p25・p50・p75・p90）とNPS（回答がない場合はNone）"""
+    if not histogram.total:
+        return {"satisfaction_percentiles": None, "nps": None}
+    return {
+        "satisfaction_percentiles": {
+            f"p{round(q * 100)}": histogram.quantile(q) for q in SATISFACTION_PERCENTILES
+        },
+        "nps": histogram.nps(NPS_PROMOTER_MIN, NPS_DETRACTOR_MAX),
+    }
+
+
+class SatisfactionTracker:
+    """満足度の全期間のヒストグラムと、直近window_days日の日別ヒストグラム
+
+    回答ごとに加算し、日別のヒストグラムは期間外になったものから破棄するため、
+    メモリは回答数によらず一定となる。日単位のロールアップから復元できる。
+    """
+
+    def __init__(self, window_days: int = 7):
+        self.window_days = window_days
+        self.overall = ScoreHistogram()
+        self._daily: Dict[str, ScoreHistogram] = {}
+        self._lock = threading.Lock()
+
+    def add(self, day: str, score: int, count: int = 1) -> None:
+        """回答の満足度を加算する（置き換えた回答はcount=-1で取り除く）"""
+        with self._lock:
+            self.overall.add(score, count)
+            self._daily.setdefault(day, ScoreHistogram()).add(score, count)
+            self._prune(max(self._daily))
+
+    def add_distribution(self, day: str, distribution: Dict[str, int]) -> None:
+        """日単位の満足度分布（ロールアップのsatisfaction）を加算する"""
+        histogram = ScoreHistogram(counts=distribution)
+        with self._lock:
+            self.overall.merge(histogram)
+            self._daily.setdefault(day, ScoreHistogram()).merge(histogram)
+            self._prune(max(self._daily))
+
+    def _prune(self, latest: str) -> None:
+        oldest = (date.fromisoformat(latest) - timedelta(days=self.window_days - 1)).isoformat()
+        for day in [day for day in self._daily if day < oldest]:
+            del self._daily[day]
+
+    def window(self, today: str) -> ScoreHistogram:
+        """today（YYYY-MM-DD）までの直近window_days日のヒストグラム"""
+        start = (date.fromisoformat(today) - timedelta(days=self.window_days - 1)).isoformat()
+        merged = ScoreHistogram()
+        with self._lock:
+            for day, histogram in self._daily.items():
+                if start <= day <= today:
+                    merged.merge(histogram)
+        return merged
+
+    def summary(self, today: str) -> Dict[str, Any]:
+        window = self.window(today)
+        with self._lock:
+            overall = ScoreHistogram().merge(self.overall)
+        return {
+            "total_responses": overall.total,
+            "average_satisfaction": round(overall.mean(), 2),
+            "satisfaction_distribution": overall.to_dict(),
+            **satisfaction_summary(overall),
+            "rolling": {
+                "days": self.window_days,
+                "start": (date.fromisoformat(today) - timedelta(days=self.window_days - 1)).isoformat(),
+                "end": today,
+                "total_responses": window.total,
+                "average_satisfaction": round(window.mean(), 2),
+                "nps": window.nps(NPS_PROMOTER_MIN, NPS_DETRACTOR_MAX),
+            },
+        }
+
+
+class StatisticsAccumulator:
+    """マージ可能な部分統計
+
+    回答を分割して別々に集計し、merge()で合算するとStatisticsと同じ結果になる
+    （unique_usersのみHyperLogLogによる推定値）。プロセス間で受け渡せるよう
+    組み込み型とスケッチのみを持つ。
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.distributions: Dict[str, Dict[str, int]] = {dimension: {} for dimension in ROLLUP_DIMENSIONS}
+        self.satisfaction_sum = 0
+        self.responses_by_date: Dict[str, int] = {}
+        self.users = HyperLogLog()
+
+    def add(self, response: Dict[str, Any]) -> None:
+        self.total += 1
+        for dimension in ROLLUP_DIMENSIONS:
+            value = response.get(dimension)
+            if value is not None:
+                counts = self.distributions[dimension]
+                counts[value] = counts.get(value, 0) + 1
+        satisfaction = response.get("satisfaction")
+        if satisfaction is not None:
+            self.satisfaction_sum += int(satisfaction)
+        timestamp = response.get("timestamp")
+        if timestamp:
+            date_key = timestamp.split('T')[0]  # YYYY-MM-DD
+            self.responses_by_date[date_key] = self.responses_by_date.get(date_key, 0) + 1
+        user_id = response.get("userId")
+        if user_id:
+            self.users.add(user_id)
+
+    def merge(self, other: "StatisticsAccumulator") -> "StatisticsAccumulator":
+        """他の部分統計を合算する（selfを返す）"""
+        self.total += other.total
+        for dimension, counts in other.distributions.items():
+            target = self.distributions[dimension]
+            for key, value in counts.items():
+                target[key] = target.get(key, 0) + value
+        self.satisfaction_sum += other.satisfaction_sum
+        for date_key, value in other.responses_by_date.items():
+            self.responses_by_date[date_key] = self.responses_by_date.get(date_key, 0) + value
+        self.users.merge(other.users)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Firestoreのドキュメントとして保存できる形式（アーカイブしたパーティションの集計）"""
+        return {
+            "total": self.total,
+            "distributions": {dimension: dict(counts) for dimension, counts in self.distributions.items()},
+            "satisfaction_sum": self.satisfaction_sum,
+            "responses_by_date": dict(self.responses_by_date),
+            "users": self.users.to_bytes(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StatisticsAccumulator":
+        accumulator = cls()
+        accumulator.total = data["total"]
+        for dimension, counts in data["distributions"].items():
+            accumulator.distributions[dimension] = dict(counts)
+        accumulator.satisfaction_sum = data["satisfaction_sum"]
+        accumulator.responses_by_date = dict(data["responses_by_date"])
+        accumulator.users = HyperLogLog.from_bytes(data["users"])
+        return accumulator
+
+    def to_statistics(self) -> Dict[str, Any]:
+        """Statisticsモデルの形式に変換"""
+        satisfaction_count = sum(self.distributions["satisfaction"].values())
+        return {
+            "total_responses": self.total,
+            "age_distribution": dict(self.distributions["age"]),
+            "gender_distribution": dict(self.distributions["gender"]),
+            "frequency_distribution": dict(self.distributions["frequency"]),
+            "satisfaction_distribution": dict(self.distributions["satisfaction"]),
+            "average_satisfaction": round(self.satisfaction_sum / satisfaction_count, 2) if satisfaction_count else 0.0,
+            "responses_by_date": dict(self.responses_by_date),
+            # calculate_statisticsと同様に、ユーザーIDを含まない回答のみの場合はNone
+            "unique_users": self.users.count() or (None if self.total else 0),
+            **satisfaction_summary(ScoreHistogram(counts=self.distributions["satisfaction"])),
+        }
+
+
+# フィルタ条件で使用する比較演算子（Firestoreのwhere演算子と対応）
+_FILTER_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+}
+
+ResponseFilter = Tuple[str, str, Any]
+
+
+def matches_filters(data: Dict[str, Any], filters: Iterable[ResponseFilter]) -> bool:
+    """回答がすべてのフィルタ条件（field, op, value）を満たすか判定"""
+    for field, op, value in filters:
+        actual = data.get(field)
+        if actual is None or not _FILTER_OPERATORS[op](actual, value):
+            return False
+    return True
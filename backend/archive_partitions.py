@@ -0,0 +1,196 @@
+"""古い月のパーティションのアーカイブとTTLによる削除
+
+RESPONSE_PARTITIONING=monthly で保存した回答のうち、直近 --live-months か月より前の月を
+gzip圧縮したNDJSON（report.py でそのまま集計できる）に書き出し、台帳
+（survey_partitions/{YYYY-MM}）に集計結果を保存してアーカイブ済みとする。
+アーカイブ済みの月はAPIの読み取りの対象外となり、全体統計は保存した集計結果を合算する。
+アーカイブから --ttl-days 日を経過した月は、アーカイブファイルの件数が台帳と一致することを
+確認してから、Firestoreから回答を削除する。
+
+--migrate-legacy はパーティション導入前の survey_responses の回答を回答月のパーティションへ
+移す（ドキュメントIDは変えない。移動は1件ずつ書き込みと削除を同じバッチでコミットする）。
+
+使い方:
+    python archive_partitions.py --output archive/ [--live-months 12] [--ttl-days 30]
+    python archive_partitions.py --migrate-legacy
+"""
+import argparse
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from analytics import StatisticsAccumulator
+from partitions import (
+    PARTITION_COLLECTION,
+    STATUS_ACTIVE,
+    STATUS_ARCHIVED,
+    STATUS_DELETED,
+    partition_key,
+    partition_path,
+    shift_month,
+)
+import main
+
+# Firestoreの1バッチあたりの書き込み上限
+BATCH_SIZE = 500
+
+
+def archive_file_path(output_dir: str, key: str) -> str:
+    return os.path.join(output_dir, f"survey_responses-{key}.ndjson.gz")
+
+
+def iter_documents(collection, page_size: int) -> Iterator[List[Any]]:
+    """コレクションの回答をcreatedAtの古い順にページ単位で返す"""
+    query = collection.order_by('createdAt')
+    last = None
+    while True:
+        page_query = query.limit(page_size)
+        if last is not None:
+            page_query = page_query.start_after(last)
+        docs = list(page_query.stream())
+        if docs:
+            yield docs
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+def archive_partition(key: str, output_dir: str, page_size: int = 1000) -> Dict[str, Any]:
+    """パーティションの回答をアーカイブファイルに書き出し、台帳に保存する内容を返す"""
+    path = archive_file_path(output_dir, key)
+    accumulator = StatisticsAccumulator()
+    # 書き込み途中で中断しても壊れないよう、一時ファイルから置き換える
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+        for docs in iter_documents(main.db.collection(partition_path(key)), page_size):
+            for doc in docs:
+                response = {**doc.to_dict(), "id": doc.id}
+                accumulator.add(response)
+                f.write(json.dumps(response, ensure_ascii=False, default=str) + "\n")
+    os.replace(path + ".tmp", path)
+    return {
+        "status": STATUS_ARCHIVED,
+        "archive": path,
+        "count": accumulator.total,
+        "summary": accumulator.to_dict(),
+    }
+
+
+def verify_archive(entry: Dict[str, Any]) -> Optional[str]:
+    """アーカイブファイルが読み取れ、件数が台帳と一致するか（問題があれば理由を返す）"""
+    path = entry.get("archive")
+    if not path or not os.path.exists(path):
+        return f"archive {path} not found"
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            lines = sum(1 for line in f if line.strip())
+    except (OSError, EOFError) as e:
+        return f"archive {path} is not readable: {e}"
+    if lines != entry.get("count"):
+        return f"archive {path} has {lines} responses, expected {entry.get('count')}"
+    return None
+
+
+def delete_partition(key: str) -> int:
+    """パーティションの回答を削除し、削除件数を返す"""
+    collection = main.db.collection(partition_path(key))
+    deleted = 0
+    while True:
+        docs = list(collection.limit(BATCH_SIZE).stream())
+        if not docs:
+            return deleted
+        batch = main.db.batch()
+        for doc in docs:
+            batch.delete(collection.document(doc.id))
+        batch.commit()
+        deleted += len(docs)
+
+
+def archive_partitions(
+    output_dir: str,
+    live_months: int = 12,
+    ttl_days: int = 30,
+    page_size: int = 1000,
+    now: Optional[datetime] = None
+) -> Dict[str, str]:
+    """古い月をアーカイブし、TTLを経過した月の回答を削除する（月ごとの処理結果を返す）"""
+    if not main.FIRESTORE_AVAILABLE:
+        raise RuntimeError("Firestore is not available")
+    if live_months < 1:
+        raise ValueError("live_months must be at least 1")
+
+    now = now or datetime.now()
+    oldest_live = shift_month(partition_key(now.isoformat()), -(live_months - 1))
+    registry = main.db.collection(PARTITION_COLLECTION)
+    os.makedirs(output_dir, exist_ok=True)
+
+    results: Dict[str, str] = {}
+    for doc in registry.stream():
+        key = doc.id
+        entry = doc.to_dict()
+        status = entry.get("status", STATUS_ACTIVE)
+        if status == STATUS_ACTIVE and key < oldest_live:
+            entry = {
+                **archive_partition(key, output_dir, page_size),
+                "archivedAt": now.isoformat(),
+                "expireAt": (now + timedelta(days=ttl_days)).isoformat(),
+            }
+            registry.document(key).set(entry, merge=True)
+            status = results[key] = STATUS_ARCHIVED
+            print(f"Archived {entry['count']} responses of {key} to {entry['archive']}")
+        if status == STATUS_ARCHIVED and entry["expireAt"] <= now.isoformat():
+            # アーカイブが失われた・壊れた月は回答を削除せずに残す
+            problem = verify_archive(entry)
+            if problem:
+                print(f"Warning: skipped deleting {key}: {problem}")
+                continue
+            deleted = delete_partition(key)
+            registry.document(key).set({"status": STATUS_DELETED, "deletedAt": now.isoformat()}, merge=True)
+            results[key] = STATUS_DELETED
+            print(f"Deleted {deleted} responses of {key}")
+    return results
+
+
+def migrate_legacy() -> int:
+    """survey_responses の回答を回答月のパーティションへ移し、移動件数を返す"""
+    if not main.FIRESTORE_AVAILABLE:
+        raise RuntimeError("Firestore is not available")
+
+    legacy = main.db.collection(main.RESPONSE_COLLECTION)
+    registry = main.db.collection(PARTITION_COLLECTION)
+    registered = set()
+    moved = 0
+    while True:
+        # 1件につき書き込みと削除の2操作
+        docs = list(legacy.limit(BATCH_SIZE // 2).stream())
+        if not docs:
+            print(f"Moved {moved} responses into {len(registered)} partitions")
+            return moved
+        batch = main.db.batch()
+        for doc in docs:
+            data = doc.to_dict()
+            key = partition_key(data['createdAt'])
+            if key not in registered:
+                registry.document(key).set({"collection": partition_path(key)}, merge=True)
+                registered.add(key)
+            batch.set(main.db.collection(partition_path(key)).document(doc.id), data)
+            batch.delete(legacy.document(doc.id))
+        batch.commit()
+        moved += len(docs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="古い月のパーティションをアーカイブし、TTLを経過した回答を削除する")
+    parser.add_argument("--output", default="archive", help="アーカイブの出力先ディレクトリ")
+    parser.add_argument("--live-months", type=int, default=12, help="アーカイブせずに残す直近の月数（当月を含む）")
+    parser.add_argument("--ttl-days", type=int, default=30, help="アーカイブから回答を削除するまでの日数")
+    parser.add_argument("--page-size", type=int, default=1000, help="1回のクエリで取得する件数")
+    parser.add_argument("--migrate-legacy", action="store_true", help="survey_responsesの回答をパーティションへ移す")
+    args = parser.parse_args()
+
+    if args.migrate_legacy:
+        migrate_legacy()
+    else:
+        results = archive_partitions(args.output, args.live_months, args.ttl_days, args.page_size)
+        print(f"Processed {len(results)} partitions")
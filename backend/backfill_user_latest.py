@@ -0,0 +1,66 @@
+"""user_latest のバックフィル
+
+回答を走査してユーザーごとの最新の回答と回答件数を求め、user_latest/{userId} を現在の形式
+（回答の内容と回答件数を含む）で書き込む。導入前に保存された回答しかないユーザーや、
+回答IDのみの形式の user_latest を持つユーザーが対象となる。
+実行後に USER_LATEST_BACKFILLED=true とすると、user_latest のないユーザーの /user/status などで
+回答を検索しなくなる（複合インデックスを使うクエリが不要になる）。
+走査中に送信された回答は件数に含まれない場合があるため、アクセスの少ない時間帯に実行すること。
+
+使い方:
+    python backfill_user_latest.py
+"""
+import argparse
+from typing import Any, Dict, Optional, Tuple
+
+import main
+
+# Firestoreの1バッチあたりの書き込み上限
+BATCH_SIZE = 500
+
+
+def backfill_user_latest() -> int:
+    """user_latest を書き込み、対象のユーザー数を返す"""
+    if not main.FIRESTORE_AVAILABLE:
+        raise RuntimeError("Firestore is not available")
+
+    # ユーザーごとの (回答ID, 回答, パーティション) と回答件数
+    latest: Dict[str, Tuple[str, Dict[str, Any], Optional[str]]] = {}
+    counts: Dict[str, int] = {}
+    for partition in main.live_partitions():
+        for doc in main.response_collection(partition).stream():
+            data = doc.to_dict()
+            user_id = data.get('userId')
+            if not user_id:
+                continue
+            counts[user_id] = counts.get(user_id, 0) + 1
+            current = latest.get(user_id)
+            if current is None or data.get('createdAt', '') > current[1].get('createdAt', ''):
+                latest[user_id] = (doc.id, data, partition)
+
+    collection = main.db.collection(main.USER_LATEST_COLLECTION)
+    user_ids = list(latest)
+    for i in range(0, len(user_ids), BATCH_SIZE):
+        chunk = user_ids[i:i + BATCH_SIZE]
+        refs = [collection.document(user_id) for user_id in chunk]
+        existing = {snapshot.id: snapshot.to_dict() for snapshot in main.db.get_all(refs) if snapshot.exists}
+
+        batch = main.db.batch()
+        for user_id, ref in zip(chunk, refs):
+            response_id, data, partition = latest[user_id]
+            entry = existing.get(user_id)
+            if entry and 'response' in entry and entry['createdAt'] > data.get('createdAt', ''):
+                # 走査後に送信された回答は上書きせず、件数のみ補正する
+                batch.set(ref, {"responseCount": max(entry.get('responseCount', 0), counts[user_id] + 1)}, merge=True)
+                continue
+            batch.set(ref, {**main.user_latest_entry(response_id, data, partition), "responseCount": counts[user_id]})
+        batch.commit()
+
+    print(f"Backfilled user_latest for {len(user_ids)} users")
+    return len(user_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="user_latestを回答から作り直す")
+    parser.parse_args()
+    backfill_user_latest()
@@ -0,0 +1,66 @@
+"""レスポンスの圧縮の有無によるバイト数とレイテンシの比較
+
+メモリ上のストアに合成データを保存し、/survey/results?limit=1000 とエクスポートを
+Accept-Encodingごとに取得する。レイテンシはアプリ内での処理時間（圧縮を含む）で、
+回線の転送時間は --mbps の帯域を仮定して推定する。
+
+使い方:
+    python benchmarks/bench_compression.py [--responses 20000] [--mbps 5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+from synthetic_data import generate_responses  # noqa: E402
+
+ENCODINGS = ("identity", "gzip", "br")
+PATHS = ("/survey/results?limit=1000", "/survey/results/export")
+
+
+async def measure(client: httpx.AsyncClient, path: str, encoding: str, repeat: int):
+    """(圧縮後のバイト数, 平均レイテンシ[ms])"""
+    size, started = 0, time.perf_counter()
+    for _ in range(repeat):
+        async with client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+            response.raise_for_status()
+            size = 0
+            async for chunk in response.aiter_raw():
+                size += len(chunk)
+    return size, (time.perf_counter() - started) * 1000 / repeat
+
+
+async def run(args):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'path':>28} {'encoding':>9} {'bytes':>11} {'latency(ms)':>12} {'transfer(ms)':>13}")
+        for path in PATHS:
+            await measure(client, path, "identity", 1)  # ウォームアップ
+            for encoding in ENCODINGS:
+                size, latency = await measure(client, path, encoding, args.repeat)
+                transfer = size * 8 / (args.mbps * 1_000_000) * 1000
+                print(f"{path:>28} {encoding:>9} {size:>11} {latency:>12.1f} {transfer:>13.1f}")
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="レスポンスの圧縮のベンチマーク")
+    parser.add_argument("--responses", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mbps", type=float, default=5, help="転送時間の推定に使う回線の帯域（Mbps）")
+    args = parser.parse_args()
+
+    responses = list(generate_responses(args.responses, seed=42))
+    with patch.object(main, "FIRESTORE_AVAILABLE", False), patch.object(main, "mock_storage", responses), \
+            patch.object(main, "RATE_LIMIT_ENABLED", False):
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    cli()
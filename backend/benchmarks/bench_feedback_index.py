@@ -0,0 +1,73 @@
+"""自由記述の転置インデックスの検索レイテンシベンチマーク
+
+合成した自由記述でインデックスを構築し、検索・頻出キーワード取得のレイテンシと
+永続化サイズを計測する。
+
+使い方:
+    python benchmarks/bench_feedback_index.py [--responses 1000000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from text_index import FeedbackIndex  # noqa: E402
+
+SUBJECTS = ["スタッフ", "接客", "アプリ", "店内", "料金", "商品", "予約", "ポイント", "LINE", "サービス", "待ち時間", "品揃え"]
+PREDICATES = ["がとても良かった", "が丁寧でした", "が分かりにくい", "に不満があります", "が便利です", "が遅いと感じました", "を改善してほしい", "に満足しています"]
+QUERIES = ["接客", "アプリ", "待ち時間", "丁寧", "改善", "ポイント 便利", "LINE", "料金 不満", "品揃え", "予約が遅い"]
+
+
+def synthetic_feedback(rng: random.Random) -> str:
+    parts = [f"{rng.choice(SUBJECTS)}{rng.choice(PREDICATES)}" for _ in range(rng.randint(1, 3))]
+    return "。".join(parts)
+
+
+def measure(func, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自由記述インデックスのベンチマーク")
+    parser.add_argument("--responses", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = FeedbackIndex()
+    started = time.perf_counter()
+    for number in range(args.responses):
+        index.add(f"r{number}", synthetic_feedback(rng))
+    elapsed = time.perf_counter() - started
+    metrics = index.metrics()
+    print(f"indexed {metrics['documents']} responses in {elapsed:.1f}s "
+          f"(terms={metrics['terms']} postings={metrics['postings']})")
+
+    started = time.perf_counter()
+    data = index.to_bytes()
+    print(f"serialized {len(data) / 1024 / 1024:.1f}MB in {time.perf_counter() - started:.1f}s")
+
+    print(f"{'query':>14} {'p50(ms)':>9} {'p99(ms)':>9}")
+    for query in QUERIES:
+        p50, p99 = measure(lambda: index.search(query, 20), args.queries)
+        print(f"{query:>14} {p50:>9.3f} {p99:>9.3f}")
+
+    # 初回は集計、以降はインデックスの更新がない限りキャッシュを返す
+    first, _ = measure(lambda: index.top_keywords(20), 1)
+    p50, p99 = measure(lambda: index.top_keywords(20), args.queries)
+    print(f"{'keywords':>14} {p50:>9.3f} {p99:>9.3f} (first {first:.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""ローカルストレージ（追記専用ログ）の書き込みスループット・復元時間ベンチマーク
+
+合成回答を追記し、fsyncの間隔ごとの書き込みスループットと、再起動時の
+索引の復元（mmapでの走査）にかかる時間を計測する。
+
+使い方:
+    python benchmarks/bench_local_storage.py [--responses 200000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from local_storage import AppendOnlyLog  # noqa: E402
+from synthetic_data import generate_responses  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ローカルストレージのベンチマーク")
+    parser.add_argument("--responses", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    responses = list(generate_responses(args.responses, seed=args.seed))
+    print(f"{'fsync':>12} {'writes/s':>10} {'fsyncs':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        # fsync_batch=1 は回答ごとにfsyncする場合（比較用に件数を絞る）
+        for label, batch, count in [("per-write", 1, min(args.responses, 2000)), ("batched", 1000, args.responses)]:
+            path = os.path.join(directory, f"{label}.log")
+            log = AppendOnlyLog(path, fsync_batch=batch)
+            started = time.perf_counter()
+            log.extend(responses[:count])
+            log.sync()
+            elapsed = time.perf_counter() - started
+            print(f"{label:>12} {count / elapsed:>10.0f} {log.fsyncs:>8}")
+            log.close()
+
+        path = os.path.join(directory, "batched.log")
+        started = time.perf_counter()
+        log = AppendOnlyLog(path)
+        elapsed = time.perf_counter() - started
+        metrics = log.metrics()
+        print(f"recovered {metrics['records']} responses ({metrics['bytes'] / 1024 / 1024:.1f}MB, "
+              f"{metrics['users']} users) in {elapsed:.2f}s")
+        log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""プロファイリングのオーバーヘッドの計測
+
+サンプリングの割合ごとに /survey/results（メモリ上のストア）を繰り返し取得し、
+1リクエストあたりの処理時間を比較する。
+
+使い方:
+    python benchmarks/bench_profiling.py [--requests 2000] [--responses 1000]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from unittest.mock import patch
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+from synthetic_data import generate_responses  # noqa: E402
+
+SAMPLE_RATES = (0.0, 0.01, 0.1, 1.0)
+
+
+async def measure(requests: int, path: str):
+    """(平均[ms], p99[ms])"""
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            (await client.get(path)).raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return statistics.mean(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="プロファイリングのオーバーヘッドの計測")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--responses", type=int, default=1000)
+    parser.add_argument("--path", default="/survey/results?limit=100")
+    args = parser.parse_args()
+
+    responses = list(generate_responses(args.responses, seed=42))
+    with patch.object(main, "FIRESTORE_AVAILABLE", False), patch.object(main, "mock_storage", responses), \
+            patch.object(main, "RATE_LIMIT_ENABLED", False):
+        asyncio.run(measure(100, args.path))  # ウォームアップ
+        print(f"{'sample rate':>12} {'mean(ms)':>9} {'p99(ms)':>9} {'profiles':>9}")
+        for rate in SAMPLE_RATES:
+            main.request_profiler.sample_rate = rate
+            main.request_profiler.profiles.clear()
+            mean, p99 = asyncio.run(measure(args.requests, args.path))
+            print(f"{rate:>12} {mean:>9.3f} {p99:>9.3f} {len(main.request_profiler.profiles):>9}")
+
+
+if __name__ == "__main__":
+    cli()
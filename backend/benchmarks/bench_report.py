@@ -0,0 +1,51 @@
+"""エクスポートの並列集計のスケーリングベンチマーク
+
+合成した回答のNDJSONを生成し、ワーカー数1・2・4・8での集計時間を比較する。
+ワーカー数がCPUコア数を超える場合は速度向上が頭打ちになる。
+
+使い方:
+    python benchmarks/bench_report.py [--responses 1000000] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from report import aggregate_file  # noqa: E402
+from synthetic_data import generate_responses, write_ndjson  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="並列集計のスケーリングベンチマーク")
+    parser.add_argument("--responses", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "responses.ndjson")
+        started = time.perf_counter()
+        write_ndjson(path, generate_responses(args.responses, args.seed))
+        print(f"generated {args.responses} responses ({os.path.getsize(path) / 1024 / 1024:.0f}MB) "
+              f"in {time.perf_counter() - started:.1f}s, cpu_count={os.cpu_count()}")
+
+        print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}")
+        baseline = None
+        expected = None
+        for workers in args.workers:
+            started = time.perf_counter()
+            statistics = aggregate_file(path, "ndjson", workers, args.chunk_size)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            # ワーカー数によらず同じ集計結果になること
+            expected = expected or statistics
+            assert statistics == expected
+            print(f"{workers:>8} {elapsed:>9.2f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""単一プロセス（python main.py）とマルチワーカー（python server.py）のスループット比較
+
+それぞれのサーバーを起動し、同時接続数を固定して一定時間リクエストを送り続け、
+秒間リクエスト数とレイテンシを計測する。Firestoreを使わないメモリ上のストアで実行する。
+
+使い方:
+    python benchmarks/bench_server.py [--duration 10] [--connections 64] [--path /survey/statistics]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SERVERS = {
+    "single (main.py)": ["main.py"],
+    "multi (server.py)": ["server.py"],
+}
+
+
+async def wait_ready(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+async def load(base_url: str, path: str, duration: float, connections: int):
+    latencies = []
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def worker():
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        await asyncio.gather(*[worker() for _ in range(connections)])
+
+    latencies.sort()
+    return len(latencies) / duration, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="サーバー構成ごとのスループット比較")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    print(f"cpus={os.cpu_count()} path={args.path} connections={args.connections}")
+    print(f"{'server':>18} {'req/s':>9} {'p50(ms)':>9} {'p99(ms)':>9}")
+    for label, command in SERVERS.items():
+        env = {**os.environ, "PORT": str(args.port), "RATE_LIMIT_ENABLED": "false",
+               "MAX_INFLIGHT_REQUESTS": str(args.connections * 4)}
+        process = subprocess.Popen(
+            [sys.executable, *command], cwd=BACKEND_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            asyncio.run(wait_ready(base_url))
+            rps, p50, p99 = asyncio.run(load(base_url, args.path, args.duration, args.connections))
+            print(f"{label:>18} {rps:>9.0f} {p50:>9.2f} {p99:>9.2f}")
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""SQLiteストレージとメモリ上のストア（mock_storage）の比較ベンチマーク
+
+同時送信の書き込みスループット（グループコミット）、ユーザー別の回答取得、
+全体統計（GROUP BY とPythonでの集計）のレイテンシを計測する。
+
+使い方:
+    python benchmarks/bench_sqlite_storage.py [--responses 200000] [--concurrency 100]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from analytics import StatisticsAccumulator  # noqa: E402
+from sqlite_storage import SQLiteStore  # noqa: E402
+from synthetic_data import generate_responses  # noqa: E402
+
+
+def elapsed_ms(func, repeat: int = 5) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def memory_statistics(storage):
+    accumulator = StatisticsAccumulator()
+    for response in storage:
+        accumulator.add(response)
+    return accumulator.to_statistics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLiteストレージのベンチマーク")
+    parser.add_argument("--responses", type=int, default=200000)
+    parser.add_argument("--concurrency", type=int, default=100, help="同時に送信する回答数")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    responses = list(generate_responses(args.responses, seed=args.seed))
+    user_id = responses[0]["userId"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteStore(os.path.join(directory, "survey.db"))
+
+        async def submit_all():
+            # concurrency件ずつ同時に送信する（submit_surveyの同時リクエストに相当）
+            for i in range(0, len(responses), args.concurrency):
+                await asyncio.gather(*[store.insert(dict(r)) for r in responses[i:i + args.concurrency]])
+
+        started = time.perf_counter()
+        asyncio.run(submit_all())
+        sqlite_writes = len(responses) / (time.perf_counter() - started)
+        metrics = store.metrics()
+
+        memory = []
+        started = time.perf_counter()
+        for response in responses:
+            memory.append(dict(response))
+        memory_writes = len(responses) / (time.perf_counter() - started)
+
+        print(f"{'':>18} {'memory':>12} {'sqlite':>12}")
+        print(f"{'writes/s':>18} {memory_writes:>12.0f} {sqlite_writes:>12.0f}"
+              f"  ({metrics['commits']} commits, {metrics['rows_per_commit']} rows/commit)")
+        print(f"{'user lookup (ms)':>18} "
+              f"{elapsed_ms(lambda: [r for r in memory if r['userId'] == user_id]):>12.2f} "
+              f"{elapsed_ms(lambda: store.user_responses(user_id)):>12.2f}")
+        print(f"{'statistics (ms)':>18} "
+              f"{elapsed_ms(lambda: memory_statistics(memory), 3):>12.1f} "
+              f"{elapsed_ms(store.statistics, 3):>12.1f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
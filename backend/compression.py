@@ -0,0 +1,193 @@
+"""レスポンスの圧縮（gzip・brotli）
+
+Accept-Encodingのq値からエンコーディングを選び、minimum_size未満の小さなレスポンスは
+圧縮しない。ストリーミングレスポンス（エクスポートなど）はチャンクごとに圧縮してフラッシュし、
+全体をバッファせずに送出する。brotliはbrotliパッケージがインストールされている場合のみ使う。
+"""
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# 同じq値の場合の優先順（brotliの方が圧縮率が高い）
+PREFERRED_ENCODINGS = ("br", "gzip") if BROTLI_AVAILABLE else ("gzip",)
+# 圧縮済みの形式や、チャンクごとに即時に届ける必要があるServer-Sent Eventsは圧縮しない
+EXCLUDED_CONTENT_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip", "text/event-stream")
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Accept-Encodingをエンコーディングごとのq値に変換"""
+    qualities: Dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities
+
+
+def negotiate_encoding(header: str, available: Iterable[str] = PREFERRED_ENCODINGS) -> Optional[str]:
+    """クライアントが受け付けるエンコーディングのうちq値が最大のもの（なければNone）"""
+    qualities = parse_accept_encoding(header)
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = qualities.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """Accept-Encodingに応じてレスポンスをgzip・brotliで圧縮するASGIミドルウェア
+
+    brotliの品質は既定で4とする（11は圧縮率が高いが、動的なレスポンスには遅すぎる）。
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        await _CompressionResponder(self, encoding, send).run(scope, receive)
+
+    def compressor(self, encoding: str):
+        if encoding == "br":
+            return _BrotliCompressor(self.brotli_quality)
+        return _GzipCompressor(self.gzip_level)
+
+
+class _CompressionResponder:
+    """1リクエスト分のレスポンスの圧縮
+
+    Content-Lengthのあるレスポンスは全体を受け取ってから圧縮し（BaseHTTPMiddlewareを
+    経由すると複数のチャンクに分かれて届くため）、Content-Lengthのないストリーミング
+    レスポンスはチャンクごとに圧縮して送出する。
+    """
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: Optional[str], send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message: Optional[Message] = None
+        self.compressor = None
+        self.passthrough = False
+        # Noneの場合はストリーミングとして圧縮する
+        self.buffer: Optional[List[bytes]] = []
+
+    async def run(self, scope: Scope, receive: Receive) -> None:
+        await self.middleware.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.buffer is not None:
+            self.buffer.append(body)
+            if more_body:
+                return
+            await self.send_buffered(b"".join(self.buffer))
+            return
+
+        # ストリーミング: チャンクごとにフラッシュし、受信側で逐次展開できるようにする
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            await self.send(start)
+        if more_body:
+            chunk = self.compressor.compress(body) + self.compressor.flush()
+        else:
+            chunk = self.compressor.compress(body) + self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def start(self, message: Message) -> None:
+        headers = MutableHeaders(raw=message["headers"])
+        content_type = headers.get("content-type", "")
+        eligible = (
+            "content-encoding" not in headers
+            and message["status"] not in (204, 304)
+            and not content_type.startswith(EXCLUDED_CONTENT_TYPES)
+        )
+        if eligible:
+            # 圧縮しない場合も、共有キャッシュがエンコーディングごとに保持するようVaryを付ける
+            headers.add_vary_header("Accept-Encoding")
+        content_length = headers.get("content-length")
+        if (not eligible or self.encoding is None
+                or (content_length is not None and int(content_length) < self.middleware.minimum_size)):
+            self.passthrough = True
+            return
+
+        self.start_message = message
+        self.compressor = self.middleware.compressor(self.encoding)
+        headers["Content-Encoding"] = self.encoding
+        if "etag" in headers and not headers["etag"].startswith("W/"):
+            # 圧縮後のバイト列は元のボディと異なるため弱いETagとする
+            headers["ETag"] = "W/" + headers["etag"]
+        if content_length is None:
+            self.buffer = None
+        else:
+            del headers["Content-Length"]
+
+    async def send_buffered(self, body: bytes) -> None:
+        start, self.start_message = self.start_message, None
+        compressed = self.compressor.compress(body) + self.compressor.finish()
+        MutableHeaders(raw=start["headers"])["Content-Length"] = str(len(compressed))
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": compressed})
@@ -0,0 +1,150 @@
+"""リクエスト単位の期限（デッドライン）の伝播
+
+リクエストの受信時に期限を決め、ContextVarで保持する。ContextVarはasyncioのタスクと
+スレッドプール（run_in_threadpool）に引き継がれるため、IDToken検証やスレッドプールで
+実行されるFirestoreの呼び出しは残り時間をタイムアウトとして使える。
+残り時間が足りない処理は開始せずにDeadlineExceeded（504）とする。
+"""
+import asyncio
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, List, Optional, Pattern, Sequence, Tuple, TypeVar
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+T = TypeVar("T")
+
+TIMEOUT_HEADER = "x-request-timeout"
+
+
+class DeadlineExceeded(Exception):
+    """リクエストの期限までに処理を完了できない"""
+
+
+class Deadline:
+    """期限（単調増加時計での時刻）"""
+
+    def __init__(self, timeout: float, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.timeout = timeout
+        self.expires_at = clock() + timeout
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(timeout: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """この範囲の処理に期限を設定する（Noneは期限なし）"""
+    deadline = Deadline(timeout) if timeout is not None else None
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def check_deadline(required: float = 0.0) -> None:
+    """残り時間がrequired秒以下であればDeadlineExceeded"""
+    deadline = _current.get()
+    if deadline is not None and deadline.remaining() <= required:
+        raise DeadlineExceeded(f"{deadline.timeout}s deadline exceeded")
+
+
+def call_timeout(limit: float) -> float:
+    """外部呼び出しのタイムアウト（limitと残り時間の小さい方。残り時間がなければDeadlineExceeded）"""
+    check_deadline()
+    deadline = _current.get()
+    return limit if deadline is None else min(limit, deadline.remaining())
+
+
+async def within_deadline(awaitable: Awaitable[T]) -> T:
+    """残り時間内に完了しない場合はDeadlineExceeded
+
+    期限切れにより内部の呼び出しが失敗した場合（Firestoreのタイムアウトなど）もDeadlineExceededとする。
+    スレッドプールで実行中の処理は中断されないが、各呼び出しにタイムアウトを渡しているため残り時間内に終わる。
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return await awaitable
+    try:
+        timeout = call_timeout(deadline.timeout)
+    except DeadlineExceeded:
+        # 開始前に打ち切ったコルーチンの未実行の警告を出さない
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"{deadline.timeout}s deadline exceeded")
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        if deadline.expired:
+            raise DeadlineExceeded(f"{deadline.timeout}s deadline exceeded") from e
+        raise
+
+
+def parse_timeout_header(value: Optional[str]) -> Optional[float]:
+    """X-Request-Timeout（秒）の値（不正な値はNone）"""
+    if not value:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        return None
+    return timeout if timeout > 0 else None
+
+
+class DeadlineMiddleware:
+    """リクエストごとに期限を設定するASGIミドルウェア
+
+    期限はルートの既定値（パスの正規表現ごと、Noneは期限なし）とし、X-Request-Timeoutヘッダーが
+    あればそれより短い場合のみ採用する（呼び出し元の残り時間を引き継ぐ）。
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        default_timeout: Optional[float],
+        route_timeouts: Sequence[Tuple[str, Optional[float]]] = ()
+    ):
+        self.app = app
+        self.default_timeout = default_timeout
+        self.route_timeouts: List[Tuple[Pattern[str], Optional[float]]] = [
+            (re.compile(pattern), timeout) for pattern, timeout in route_timeouts
+        ]
+
+    def timeout_for(self, path: str, header: Optional[str] = None) -> Optional[float]:
+        timeout = self.default_timeout
+        for pattern, route_timeout in self.route_timeouts:
+            if pattern.fullmatch(path):
+                timeout = route_timeout
+                break
+        if timeout is None:
+            return None
+        requested = parse_timeout_header(header)
+        return min(timeout, requested) if requested is not None else timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timeout = self.timeout_for(scope["path"], Headers(scope=scope).get(TIMEOUT_HEADER))
+        with deadline_scope(timeout):
+            await self.app(scope, receive, send)
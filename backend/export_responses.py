@@ -0,0 +1,224 @@
+"""survey_responses の列指向エクスポート（Parquet / Arrow IPC）
+
+createdAt の古い順にカーソルでページングしながら読み込み、回答日ごとのパーティション
+（output/date=YYYY-MM-DD/part-<実行ID>.parquet）に書き出す。createdAt順に読むため
+同時に開くファイルは1つで、メモリ使用量はページサイズ分で一定となる。
+
+カテゴリ項目（age・gender・frequency・satisfaction）は辞書エンコードする。
+パーティションを書き終えるごとに出力先の _watermark.json を更新し、次回の実行では
+それ以降の回答のみを新しいパーツとして追記する（中断した場合も続きから再開できる）。
+
+pyarrow が必要（pip install -r requirements-export.txt）。
+
+使い方:
+    python export_responses.py --output exports/ [--format parquet|arrow] [--page-size 1000]
+"""
+import argparse
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+import main
+
+# 辞書エンコードするカテゴリ項目
+CATEGORICAL_FIELDS = ("age", "gender", "frequency", "satisfaction")
+STRING_FIELDS = ("id", "feedback", "userId", "displayName")
+TIMESTAMP_FIELDS = ("timestamp", "createdAt")
+WATERMARK_FILE = "_watermark.json"
+# 書き込み中の回答を取りこぼさないよう、直近この秒数の回答は次回の実行に回す
+SAFETY_LAG_SECONDS = 60
+FILE_EXTENSIONS = {"parquet": "parquet", "arrow": "arrow"}
+
+
+def export_schema() -> "pa.Schema":
+    fields = [pa.field("id", pa.string())]
+    fields += [pa.field(name, pa.dictionary(pa.int32(), pa.string())) for name in CATEGORICAL_FIELDS]
+    fields += [pa.field(name, pa.string()) for name in STRING_FIELDS if name != "id"]
+    fields += [pa.field(name, pa.timestamp("us")) for name in TIMESTAMP_FIELDS]
+    return pa.schema(fields)
+
+
+def read_watermark(output_dir: str) -> Optional[str]:
+    path = os.path.join(output_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["createdAt"]
+
+
+def write_watermark(output_dir: str, created_at: str) -> None:
+    # 書き込み途中で中断しても壊れないよう、一時ファイルから置き換える
+    path = os.path.join(output_dir, WATERMARK_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"createdAt": created_at, "updatedAt": datetime.now().isoformat()}, f)
+    os.replace(path + ".tmp", path)
+
+
+def iter_pages(watermark: Optional[str], cutoff: str, page_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """watermarkより新しくcutoffより古い回答を、createdAtの古い順にページ単位で返す"""
+    if main.FIRESTORE_AVAILABLE:
+        # パーティションを使う場合はwatermarkからcutoffまでの月を古い順に読む
+        for collection in reversed(main.response_collections(since=watermark, until=cutoff)):
+            query = collection.where('createdAt', '<', cutoff)
+            if watermark is not None:
+                query = query.where('createdAt', '>', watermark)
+            query = query.order_by('createdAt')
+
+            last = None
+            while True:
+                page_query = query.limit(page_size)
+                if last is not None:
+                    # オフセットではなくカーソルで続きを取得する（読み飛ばし分の課金が発生しない）
+                    page_query = page_query.start_after(last)
+                docs = list(page_query.stream())
+                if docs:
+                    yield [{**doc.to_dict(), "id": doc.id} for doc in docs]
+                if len(docs) < page_size:
+                    break
+                last = docs[-1]
+    else:
+        responses = sorted(
+            (r for r in main.mock_storage
+             if r.get('createdAt', '') < cutoff and (watermark is None or r.get('createdAt', '') > watermark)),
+            key=lambda r: r.get('createdAt', '')
+        )
+        for i in range(0, len(responses), page_size):
+            yield responses[i:i + page_size]
+
+
+class _DictionaryEncoder:
+    """パーティション内で共有する辞書（追加のみのため、Arrow IPCでは差分として書き出される）"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.indices: Dict[str, int] = {}
+
+    def encode(self, values: List[Optional[str]]) -> "pa.DictionaryArray":
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            index = self.indices.get(value)
+            if index is None:
+                index = self.indices[value] = len(self.values)
+                self.values.append(value)
+            indices.append(index)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(self.values, pa.string()))
+
+
+class PartitionWriter:
+    """1日分のパーティションのファイルへの書き込み"""
+
+    def __init__(self, output_dir: str, day: str, file_format: str, run_id: str):
+        self.schema = export_schema()
+        directory = os.path.join(output_dir, f"date={day}")
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"part-{run_id}.{FILE_EXTENSIONS[file_format]}")
+        # 完成するまでは隠しファイルとして書き込み、読み取り側に途中のファイルを見せない
+        self.temp_path = os.path.join(directory, f".part-{run_id}.tmp")
+        self.encoders = {name: _DictionaryEncoder() for name in CATEGORICAL_FIELDS}
+        self.rows = 0
+        if file_format == "parquet":
+            self.writer = pq.ParquetWriter(self.temp_path, self.schema, use_dictionary=list(CATEGORICAL_FIELDS))
+        else:
+            self.writer = pa_ipc.new_file(
+                self.temp_path, self.schema, options=pa_ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            )
+
+    def write(self, responses: List[Dict[str, Any]]) -> None:
+        columns = {"id": pa.array([r.get("id") for r in responses], pa.string())}
+        for name in CATEGORICAL_FIELDS:
+            columns[name] = self.encoders[name].encode([_as_str(r.get(name)) for r in responses])
+        for name in STRING_FIELDS[1:]:
+            columns[name] = pa.array([r.get(name) for r in responses], pa.string())
+        for name in TIMESTAMP_FIELDS:
+            columns[name] = pa.array([_as_datetime(r.get(name)) for r in responses], pa.timestamp("us"))
+        batch = pa.record_batch([columns[field.name] for field in self.schema], schema=self.schema)
+        self.writer.write_batch(batch)
+        self.rows += len(responses)
+
+    def close(self) -> None:
+        self.writer.close()
+        os.replace(self.temp_path, self.path)
+
+
+def _as_str(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _as_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def export_responses(
+    output_dir: str,
+    file_format: str = "parquet",
+    page_size: int = 1000,
+    now: Optional[datetime] = None
+) -> Dict[str, int]:
+    """前回のwatermark以降の回答をエクスポートし、パーティションごとの件数を返す"""
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow is not installed (pip install -r requirements-export.txt)")
+    if file_format not in FILE_EXTENSIONS:
+        raise ValueError(f"unsupported format: {file_format}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    watermark = read_watermark(output_dir)
+    cutoff = ((now or datetime.now()) - timedelta(seconds=SAFETY_LAG_SECONDS)).isoformat()
+    run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    written: Dict[str, int] = {}
+    writer: Optional[PartitionWriter] = None
+    current_day = None
+    last_created_at = None
+
+    def finish_partition():
+        writer.close()
+        written[current_day] = writer.rows
+        # パーティションを書き終えるごとに進めるため、中断しても続きから再開できる
+        write_watermark(output_dir, last_created_at)
+
+    for page in iter_pages(watermark, cutoff, page_size):
+        # 1ページが日付をまたぐ場合はパーティションごとに分けて書き込む
+        start = 0
+        while start < len(page):
+            day = page[start]["createdAt"][:10]
+            end = start
+            while end < len(page) and page[end]["createdAt"][:10] == day:
+                end += 1
+
+            if day != current_day:
+                if writer is not None:
+                    finish_partition()
+                writer = PartitionWriter(output_dir, day, file_format, run_id)
+                current_day = day
+            writer.write(page[start:end])
+            last_created_at = page[end - 1]["createdAt"]
+            start = end
+
+    if writer is not None:
+        finish_partition()
+
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="survey_responsesをParquet/Arrow形式でエクスポートする")
+    parser.add_argument("--output", required=True, help="出力先ディレクトリ")
+    parser.add_argument("--format", choices=sorted(FILE_EXTENSIONS), default="parquet")
+    parser.add_argument("--page-size", type=int, default=1000, help="1回のクエリで取得する件数")
+    args = parser.parse_args()
+
+    partitions = export_responses(args.output, args.format, args.page_size)
+    print(f"Exported {sum(partitions.values())} responses into {len(partitions)} partitions")
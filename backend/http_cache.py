@@ -0,0 +1,113 @@
+"""ルートごとのCache-Controlと条件付きリクエスト（ETag / If-None-Match）
+
+パスのパターンごとにCache-Controlを付与し、キャッシュ可能なGETのレスポンスには
+ボディのハッシュから弱いETagを付ける。If-None-Matchが一致した場合は304を返し、
+ボディの送信（と圧縮）を省略する。エラーレスポンスはキャッシュさせない。
+"""
+import hashlib
+import re
+from typing import List, Optional, Pattern, Sequence, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CachePolicy = Tuple[Pattern[str], str]
+
+
+def compile_policies(policies: Sequence[Tuple[str, str]]) -> List[CachePolicy]:
+    """(パスの正規表現, Cache-Control) の一覧をコンパイル（先に一致したものを使う）"""
+    return [(re.compile(pattern), cache_control) for pattern, cache_control in policies]
+
+
+def etag_for(body: bytes) -> str:
+    return 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Matchの弱い比較（W/の有無を無視する）"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+class HttpCacheMiddleware:
+    """ルートごとのCache-Controlを付与し、GETのレスポンスをETagで検証可能にするASGIミドルウェア
+
+    ルート側でCache-Controlを設定済みのレスポンス（SSEなど）とストリーミングレスポンスは
+    そのまま送出する。
+    """
+
+    def __init__(self, app: ASGIApp, policies: Sequence[Tuple[str, str]], default: str = "no-store"):
+        self.app = app
+        self.policies = compile_policies(policies)
+        self.default = default
+
+    def cache_control_for(self, path: str) -> str:
+        for pattern, cache_control in self.policies:
+            if pattern.fullmatch(path):
+                return cache_control
+        return self.default
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        cache_control = self.cache_control_for(scope["path"]) if method in ("GET", "HEAD") else "no-store"
+        if_none_match = Headers(scope=scope).get("if-none-match") if method == "GET" else None
+        validate = method == "GET" and "no-store" not in cache_control
+        start_message: Optional[Message] = None
+        buffer: List[bytes] = []
+        streaming = False
+
+        async def send_with_cache_headers(message: Message) -> None:
+            nonlocal start_message, streaming
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if "cache-control" in headers:
+                    streaming = True
+                elif message["status"] != 200:
+                    headers["Cache-Control"] = "no-store"
+                    streaming = True
+                else:
+                    headers["Cache-Control"] = cache_control
+                    # Content-Lengthのないストリーミングレスポンスはバッファせずに送出する
+                    streaming = not validate or "content-length" not in headers
+                if streaming:
+                    await send(message)
+                else:
+                    # ETagを付けるためボディを受け取るまでヘッダーの送出を保留する
+                    start_message = message
+                return
+
+            if streaming or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            buffer.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(buffer)
+            start, start_message = start_message, None
+
+            headers = MutableHeaders(raw=start["headers"])
+            etag = etag_for(body)
+            headers["ETag"] = etag
+            if if_none_match and etag_matches(if_none_match, etag):
+                not_modified = MutableHeaders()
+                for name in ("cache-control", "etag", "vary"):
+                    if name in headers:
+                        not_modified[name] = headers[name]
+                await send({"type": "http.response.start", "status": 304, "headers": not_modified.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_with_cache_headers)
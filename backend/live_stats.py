@@ -0,0 +1,129 @@
+"""統計のライブ配信（Server-Sent Events）用のプロセス内Pub/Sub
+
+回答の送信ごとに統計の差分を1回だけ計算・シリアライズし、購読中の全ての
+ダッシュボードへ配信する。購読者ごとのバッファは上限付きで、溢れた購読者
+（処理の遅いクライアント）は切断する。
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from analytics import ROLLUP_DIMENSIONS, rollup_bucket_keys
+
+# バッファ溢れで切断したことを購読者に伝える番兵
+_DROPPED = object()
+
+
+def statistics_delta(response: Dict[str, Any], sign: int = 1) -> Dict[str, Any]:
+    """1件の回答がStatisticsに加える差分（sign=-1で取り除く差分）"""
+    delta: Dict[str, Any] = {
+        "total_responses": sign,
+        "satisfaction_sum": sign * int(response["satisfaction"]),
+        "responses_by_date": {rollup_bucket_keys(response["timestamp"])["day"]: sign},
+    }
+    for dimension in ROLLUP_DIMENSIONS:
+        delta[f"{dimension}_distribution"] = {str(response[dimension]): sign}
+    return delta
+
+
+def format_sse(event: str, data: Any) -> str:
+    """SSEのメッセージ形式に変換"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class Subscription:
+    """1つのダッシュボード接続の受信バッファ"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, buffer_size: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+    def offer(self, message: str) -> bool:
+        """メッセージをバッファに追加する（溢れた場合はFalse）"""
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            # 未送信のメッセージを破棄し、切断を通知する
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_DROPPED)
+            return False
+
+
+class StatisticsBroadcaster:
+    """統計差分を購読者へ配信する"""
+
+    def __init__(self, buffer_size: int = 100, max_subscribers: int = 1000):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Optional[Subscription]:
+        """購読を開始する（上限に達している場合はNone）"""
+        if len(self._subscribers) >= self.max_subscribers:
+            return None
+        subscription = Subscription(asyncio.get_running_loop(), self.buffer_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def publish(self, event: str, data: Any) -> None:
+        """全ての購読者へ配信する（シリアライズは1回のみ）"""
+        if not self._subscribers:
+            return
+        message = format_sse(event, data)
+        self.published += 1
+        for subscription in list(self._subscribers):
+            # 購読者のイベントループ上でバッファに追加する
+            subscription.loop.call_soon_threadsafe(self._deliver, subscription, message)
+
+    def _deliver(self, subscription: Subscription, message: str) -> None:
+        if not subscription.offer(message) and subscription in self._subscribers:
+            self.dropped += 1
+            self.unsubscribe(subscription)
+
+    async def stream(
+        self,
+        subscription: Subscription,
+        is_disconnected: Callable[[], Awaitable[bool]],
+        keepalive: float = 15.0
+    ) -> AsyncIterator[str]:
+        """購読者へ送るSSEメッセージを順に返す"""
+        try:
+            yield format_sse("ready", {"buffer_size": self.buffer_size})
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+                    # 接続維持のためのコメント行
+                    yield ": keepalive\n\n"
+                    continue
+
+                if message is _DROPPED:
+                    yield format_sse("dropped", {"reason": "slow consumer"})
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,190 @@
+"""Firestoreを使わない場合のローカル永続化ストレージ
+
+回答を追記専用のログファイルに長さ付きレコード（長さ・CRC32・JSON）として書き込み、
+メモリ上にはレコードのオフセットのみを回答ID別・ユーザーID別に索引として持つ。
+fsyncは同期スレッドが一定間隔・一定件数ごとにまとめて行い、書き込みのスループットを確保する
+（追記はfsyncを待たない。電源断時には直近のfsync間隔分の回答が失われうる）。
+
+起動時はログをmmapで先頭から走査して索引を復元し、書き込み途中で途切れた末尾の
+レコードは切り詰める。main.mock_storage と同じく回答のリストとして扱える。
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+# レコードヘッダー: ペイロード長（4バイト）とCRC32（4バイト）
+_HEADER = struct.Struct(">II")
+# 置き換えた回答のID（置き換えと追記を1レコードで記録し、途中で途切れても片方だけ反映されないようにする）
+_REPLACES = "_replaces"
+
+
+class AppendOnlyLog:
+    """追記専用ログによる回答ストア
+
+    リストと同様に append・len・イテレーション・インデックス/スライスでの参照ができ、
+    回答の読み取りは索引のオフセットからファイルを直接読む。
+    """
+
+    def __init__(self, path: str, fsync_interval: float = 0.05, fsync_batch: int = 1000):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self._lock = threading.Lock()
+        self._offsets: List[int] = []
+        self._by_id: Dict[str, int] = {}
+        self._by_user: Dict[str, List[int]] = {}
+        self._unsynced = 0
+        self.fsyncs = 0
+        self.truncated_bytes = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self._file = open(path, "ab")
+        self._read_fd = os.open(path, os.O_RDONLY)
+
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, name="local-storage-fsync", daemon=True)
+        self._syncer.start()
+
+    # --- 起動時の復元 ---
+
+    def _recover(self) -> None:
+        """ログを走査して索引を復元し、不完全な末尾のレコードを切り詰める"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+
+        with open(self.path, "r+b") as f:
+            size = os.fstat(f.fileno()).st_size
+            valid_end = 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                offset = 0
+                while offset + _HEADER.size <= size:
+                    length, checksum = _HEADER.unpack_from(data, offset)
+                    end = offset + _HEADER.size + length
+                    if end > size:
+                        break
+                    payload = data[offset + _HEADER.size:end]
+                    if zlib.crc32(payload) != checksum:
+                        break
+                    record = json.loads(payload)
+                    self._index(offset, record, record.pop(_REPLACES, None))
+                    offset = valid_end = end
+
+            if valid_end < size:
+                # 書き込み途中でプロセスが停止した末尾を破棄する
+                self.truncated_bytes = size - valid_end
+                f.truncate(valid_end)
+                print(f"Local storage: truncated {self.truncated_bytes} bytes of incomplete records")
+
+    def _index(self, offset: int, record: Dict[str, Any], replaces: Optional[str] = None) -> None:
+        if replaces is not None and replaces in self._by_id:
+            # 置き換えた回答を索引から外す（同じユーザーの回答を置き換える前提）
+            replaced = self._by_id.pop(replaces)
+            del self._offsets[bisect_left(self._offsets, replaced)]
+            user_offsets = self._by_user.get(record.get("userId"), [])
+            if replaced in user_offsets:
+                user_offsets.remove(replaced)
+        self._offsets.append(offset)
+        if record.get("id") is not None:
+            self._by_id[record["id"]] = offset
+        if record.get("userId") is not None:
+            self._by_user.setdefault(record["userId"], []).append(offset)
+
+    # --- 書き込み ---
+
+    def append(self, record: Dict[str, Any], replaces: Optional[str] = None) -> None:
+        """回答をログに追記する（fsyncは同期スレッドが間隔・件数に応じてまとめて行う）
+
+        replacesを指定した場合は、同じユーザーのそのIDの回答を置き換える。
+        """
+        stored = {**record, _REPLACES: replaces} if replaces is not None else record
+        payload = json.dumps(stored, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            # OSのページキャッシュへ書き出し、オフセットからの読み取りを可能にする
+            self._file.flush()
+            self._index(offset, record, replaces)
+            self._unsynced += 1
+            due = self._unsynced >= self.fsync_batch
+        if due:
+            # fsyncはイベントループから呼ばれる追記では行わず、同期スレッドを起こす
+            self._wake.set()
+
+    def extend(self, records) -> None:
+        for record in records:
+            self.append(record)
+
+    def sync(self) -> None:
+        """未同期の書き込みをディスクに反映する
+
+        fsyncの間も追記できるよう、ロックは未同期の件数を取り出す間だけ保持する。
+        """
+        with self._lock:
+            if not self._unsynced:
+                return
+            self._unsynced = 0
+            self.fsyncs += 1
+            fd = self._file.fileno()
+        os.fsync(fd)
+
+    def _sync_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            self.sync()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._syncer.join()
+        self.sync()
+        self._file.close()
+        os.close(self._read_fd)
+
+    # --- 読み取り ---
+
+    def _read(self, offset: int) -> Dict[str, Any]:
+        length, _ = _HEADER.unpack(os.pread(self._read_fd, _HEADER.size, offset))
+        record = json.loads(os.pread(self._read_fd, length, offset + _HEADER.size))
+        record.pop(_REPLACES, None)
+        return record
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """回答IDで取得する（同じIDが複数ある場合は最後に追記したもの）"""
+        offset = self._by_id.get(record_id)
+        return None if offset is None else self._read(offset)
+
+    def by_user(self, user_id: str) -> List[Dict[str, Any]]:
+        """ユーザーの回答を追記順に取得する"""
+        return [self._read(offset) for offset in list(self._by_user.get(user_id, ()))]
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for offset in list(self._offsets):
+            yield self._read(offset)
+
+    def __getitem__(self, key: Union[int, slice]):
+        if isinstance(key, slice):
+            return [self._read(offset) for offset in self._offsets[key]]
+        return self._read(self._offsets[key])
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "records": len(self._offsets),
+            "users": len(self._by_user),
+            "bytes": self._file.tell(),
+            "unsynced": self._unsynced,
+            "fsyncs": self.fsyncs,
+            "truncated_bytes": self.truncated_bytes,
+        }
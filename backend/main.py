@@ -1,16 +1,52 @@
-from fastapi import FastAPI, HTTPException, status, Depends
+from fastapi import FastAPI, HTTPException, status, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import uvicorn
-from datetime import datetime
-from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, Field
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Iterator, List, Tuple, Union
+from pydantic import BaseModel, Field, ValidationError
 import os
 import httpx
 import json
+import math
+import time
+import uuid
+import zlib
 from contextlib import asynccontextmanager
 
+from analytics import (
+    ROLLUP_GRANULARITIES,
+    ResponseFilter,
+    SatisfactionTracker,
+    StatisticsAccumulator,
+    SurveyRow,
+    matches_filters,
+    merge_rollup,
+    rollup_bucket_keys,
+    rollup_document_id,
+    rollup_increments,
+    rollup_statistics,
+    satisfaction_summary,
+)
+from compression import CompressionMiddleware
+from deadline import DeadlineExceeded, DeadlineMiddleware, call_timeout, within_deadline
+from http_cache import HttpCacheMiddleware
+from materialized_view import MaterializedView
+from partitions import PARTITION_COLLECTION, PartitionRegistry, partition_key, partition_path
+from profiling import ProfilingMiddleware, RequestProfiler
+from live_stats import StatisticsBroadcaster, statistics_delta
+from local_storage import AppendOnlyLog
+from ratelimit import ConcurrencyLimiter, InMemoryRateLimitBackend, RateLimitBackend, RateLimiter
+from resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, hedged
+from singleflight import KeyedLock, SingleFlight
+from sketches import HyperLogLog, ScoreHistogram
+from sqlite_storage import DuplicateUserResponse, SQLiteStore
+from surveys import DEFAULT_SURVEY, DEFAULT_SURVEY_ID, CompiledSurvey, SurveyRegistry, survey_collection
+from text_index import FeedbackIndex
+
 # セキュリティスキーム
 security = HTTPBearer(auto_error=False)
 
@@ -24,9 +60,52 @@ class LineUser(BaseModel):
     pictureUrl: Optional[str] = None
     statusMessage: Optional[str] = None
 
+# IDToken検証の耐障害性設定
+LINE_VERIFY_TIMEOUT = float(os.getenv("LINE_VERIFY_TIMEOUT", "3.0"))  # 1回の呼び出しの上限（秒）
+LINE_VERIFY_HEDGE = os.getenv("LINE_VERIFY_HEDGE", "false").lower() == "true"
+LINE_VERIFY_HEDGE_DELAY = float(os.getenv("LINE_VERIFY_HEDGE_DELAY", "0.5"))  # p95が計測できるまでの遅延（秒）
+line_verify_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("LINE_VERIFY_FAILURE_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("LINE_VERIFY_RESET_TIMEOUT", "30"))
+)
+line_verify_latency = LatencyTracker()
+
+class LineVerifyUnavailable(Exception):
+    """LINEの検証エンドポイントがサーバーエラーを返した"""
+
+async def request_line_verify(id_token: str) -> httpx.Response:
+    """LINEの検証エンドポイントを1回呼び出す（5xxはLineVerifyUnavailable）"""
+    # リクエストの残り時間がLINE_VERIFY_TIMEOUTより短い場合はそれまでで打ち切る
+    timeout = call_timeout(LINE_VERIFY_TIMEOUT)
+    started = time.monotonic()
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.post(
+                LINE_ID_TOKEN_VERIFY_URL,
+                data={
+                    "id_token": id_token,
+                    "client_id": os.getenv("LINE_CHANNEL_ID", "")  # LINEチャンネルIDが必要
+                },
+                headers={"Content-Type": "application/x-www-form-urlencoded"}
+            )
+    except httpx.TimeoutException:
+        if timeout < LINE_VERIFY_TIMEOUT:
+            # リクエストの期限による打ち切りはLINE側の障害として扱わない
+            raise DeadlineExceeded("deadline exceeded during IDToken verification")
+        raise
+    line_verify_latency.record(time.monotonic() - started)
+
+    if response.status_code >= 500:
+        raise LineVerifyUnavailable(f"status {response.status_code}")
+    return response
+
 # IDToken検証関数
 async def verify_line_id_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[LineUser]:
-    """LINE IDTokenを検証してユーザー情報を返す"""
+    """LINE IDTokenを検証してユーザー情報を返す
+
+    LINE側の障害時はサーキットブレーカーで即座に503を返し、ワーカーを占有しない。
+    LINE_VERIFY_HEDGE=true の場合、p95レイテンシを超えた呼び出しに2回目の検証を並行して送る。
+    """
     
     # 開発環境の場合、モックユーザーを返す
     if os.getenv("ENVIRONMENT") == "development" or not credentials:
@@ -44,38 +123,60 @@ async def verify_line_id_token(credentials: Optional[HTTPAuthorizationCredential
         )
     
     id_token = credentials.credentials
+
+    try:
+        line_verify_breaker.before_call()
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="IDToken検証サービスが一時的に利用できません",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
     
+    settled = False
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                LINE_ID_TOKEN_VERIFY_URL,
-                data={
-                    "id_token": id_token,
-                    "client_id": os.getenv("LINE_CHANNEL_ID", "")  # LINEチャンネルIDが必要
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="無効なIDTokenです"
-                )
-            
-            user_data = response.json()
-            
-            return LineUser(
-                userId=user_data.get("sub"),
-                displayName=user_data.get("name", "Unknown User"),
-                pictureUrl=user_data.get("picture"),
-                statusMessage=None  # IDTokenにはstatusMessageは含まれない
-            )
-            
-    except httpx.RequestError:
+        if LINE_VERIFY_HEDGE:
+            delay = line_verify_latency.percentile(0.95, default=LINE_VERIFY_HEDGE_DELAY)
+            response = await hedged(lambda: request_line_verify(id_token), delay)
+        else:
+            response = await request_line_verify(id_token)
+    except (httpx.RequestError, LineVerifyUnavailable) as e:
+        # タイムアウト・接続エラー・5xxはLINE側の障害として記録
+        line_verify_breaker.record_failure()
+        settled = True
+        print(f"IDToken verification unavailable: {str(e)}")
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="IDToken検証に失敗しました"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="IDToken検証に失敗しました",
+            headers={"Retry-After": "1"}
+        )
+    else:
+        # LINE側は応答しているため、トークンの正否に関わらず成功として扱う
+        line_verify_breaker.record_success()
+        settled = True
+    finally:
+        if not settled:
+            # リクエストの期限切れやキャンセルはLINE側の障害とせず、試行枠のみ返す
+            line_verify_breaker.release()
+    
+    try:
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="無効なIDTokenです"
+            )
+        
+        user_data = response.json()
+        
+        return LineUser(
+            userId=user_data.get("sub"),
+            displayName=user_data.get("name", "Unknown User"),
+            pictureUrl=user_data.get("picture"),
+            statusMessage=None  # IDTokenにはstatusMessageは含まれない
         )
+            
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"IDToken verification error: {str(e)}")
         raise HTTPException(
@@ -83,10 +184,87 @@ async def verify_line_id_token(credentials: Optional[HTTPAuthorizationCredential
             detail="IDToken検証に失敗しました"
         )
 
+# Firestoreの1回の呼び出しの上限（秒）。リクエストの残り時間の方が短い場合はそちらを使う
+FIRESTORE_TIMEOUT = float(os.getenv("FIRESTORE_TIMEOUT", "5.0"))
+
+def storage_timeout() -> float:
+    """Firestoreの呼び出しに渡すタイムアウト（残り時間がなければDeadlineExceeded）"""
+    return call_timeout(FIRESTORE_TIMEOUT)
+
 # グローバル変数の初期化
 db = None
 FIRESTORE_AVAILABLE = False
-mock_storage: List[Dict[str, Any]] = []
+mock_storage: Union[List[Dict[str, Any]], AppendOnlyLog, SQLiteStore] = []
+mock_rollups: Dict[str, Dict[str, Any]] = {}
+mock_user_sketches: Dict[str, HyperLogLog] = {}
+# 既定以外のアンケートの回答（アンケートIDごと）
+mock_survey_storage: Dict[str, List[Dict[str, Any]]] = {}
+
+# アンケート定義のレジストリ（定義ごとにバリデータと集計プランを1回だけコンパイルする）
+survey_registry = SurveyRegistry()
+survey_registry.register(DEFAULT_SURVEY)
+if os.getenv("SURVEY_DEFINITIONS_PATH"):
+    survey_registry.load_file(os.environ["SURVEY_DEFINITIONS_PATH"])
+
+# 同一条件の同時読み取りを1回にまとめる
+read_coalescer = SingleFlight()
+
+# Firestoreスナップショットリスナーによるマテリアライズドビュー（読み取りをメモリから応答）
+MATERIALIZED_VIEW_ENABLED = os.getenv("MATERIALIZED_VIEW_ENABLED", "false").lower() == "true"
+materialized_view = MaterializedView(max_documents=int(os.getenv("MATERIALIZED_VIEW_MAX_DOCUMENTS", "100000")))
+
+# 自由記述の転置インデックス（FEEDBACK_INDEX_PATHを指定した場合は起動時に読み込み、終了時に保存する）
+FEEDBACK_INDEX_PATH = os.getenv("FEEDBACK_INDEX_PATH")
+# 他インスタンスへの送信分をFirestoreから取り込む間隔（秒）
+FEEDBACK_INDEX_SYNC_INTERVAL = float(os.getenv("FEEDBACK_INDEX_SYNC_INTERVAL", "30"))
+# 他インスタンスの時計のずれやコミットの遅れで、watermarkより前のcreatedAtの回答が後から
+# 見えるようになるため、watermarkからこの秒数だけ遡って読み直す（取り込み済みの回答は追加されない）
+FEEDBACK_INDEX_SAFETY_LAG_SECONDS = 60
+feedback_index = FeedbackIndex()
+feedback_index_synced_at: Optional[float] = None
+
+# 統計差分のライブ配信（SSE）
+statistics_broadcaster = StatisticsBroadcaster(
+    buffer_size=int(os.getenv("STATS_STREAM_BUFFER", "100")),
+    max_subscribers=int(os.getenv("STATS_STREAM_MAX_SUBSCRIBERS", "1000"))
+)
+
+# 時間バケット集計（ロールアップ）の保存先コレクション
+ROLLUP_COLLECTION = 'survey_stats_rollups'
+# 日単位のユニークユーザー数スケッチ（HyperLogLog）の保存先コレクション
+USER_SKETCH_COLLECTION = 'survey_user_sketches'
+# 1日のスケッチの分割数（ユーザーIDのハッシュで振り分け、読み取り時にマージする）
+# 全インスタンスの送信が1つのドキュメントのトランザクションに集中しないようにする
+USER_SKETCH_SHARDS = int(os.getenv("USER_SKETCH_SHARDS", "16"))
+# 満足度の分位点・NPS・直近7日間の平均（回答ごとに加算し、日単位のロールアップから定期的に復元する）
+SATISFACTION_REFRESH_INTERVAL = float(os.getenv("SATISFACTION_REFRESH_INTERVAL", "60"))
+satisfaction_tracker = SatisfactionTracker(window_days=7)
+satisfaction_tracker_loaded_at: Optional[float] = None
+# 時系列統計で一度に取得できるバケット数の上限
+MAX_TIMESERIES_BUCKETS = {"hour": 24 * 31, "day": 366}
+
+# 同じユーザーの2回目以降の回答の扱い
+# allow: 常に追加 / reject: 409で拒否 / overwrite: 最新の回答を置き換える
+RESPONSE_POLICIES = ("allow", "reject", "overwrite")
+RESPONSE_POLICY = os.getenv("RESPONSE_POLICY", "allow")
+if RESPONSE_POLICY not in RESPONSE_POLICIES:
+    raise ValueError(f"RESPONSE_POLICY must be one of {RESPONSE_POLICIES}: {RESPONSE_POLICY}")
+# ユーザーごとの最新の回答（回答ID・回答の内容・回答件数）
+# 送信時に回答と同じバッチで書き込み（allow以外はトランザクション内で読み書きし、同時送信を直列化する）、
+# /user/status などは複合インデックスを使うクエリではなく1回のドキュメント取得で応答する
+USER_LATEST_COLLECTION = 'user_latest'
+# backfill_user_latest.py の実行後にtrueにすると、user_latestのないユーザーは回答を検索せずに未回答とする
+USER_LATEST_BACKFILLED = os.getenv("USER_LATEST_BACKFILLED", "false").lower() == "true"
+# Firestoreを使わない場合に同じユーザーの送信を直列化するロック
+user_submit_locks = KeyedLock()
+
+# 回答の保存先（none: survey_responsesのみ / monthly: 回答月ごとのパーティション。Firestoreのみ）
+RESPONSE_COLLECTION = 'survey_responses'
+RESPONSE_PARTITIONINGS = ("none", "monthly")
+RESPONSE_PARTITIONING = os.getenv("RESPONSE_PARTITIONING", "none")
+if RESPONSE_PARTITIONING not in RESPONSE_PARTITIONINGS:
+    raise ValueError(f"RESPONSE_PARTITIONING must be one of {RESPONSE_PARTITIONINGS}: {RESPONSE_PARTITIONING}")
+response_partitions = PartitionRegistry(refresh_interval=float(os.getenv("PARTITION_REFRESH_INTERVAL", "60")))
 
 try:
     # Cloud Functions環境では自動的に認証される
@@ -101,6 +279,46 @@ except Exception as e:
     print(f"Warning: Failed to initialize Firestore client: {e}. Using mock storage.")
     FIRESTORE_AVAILABLE = False
 
+# Firestoreを使わない場合の回答の永続化先（未指定時はプロセス内のみで、再起動時に失われる）
+SQLITE_PATH = os.getenv("SQLITE_PATH")
+LOCAL_STORAGE_PATH = os.getenv("LOCAL_STORAGE_PATH")
+if not FIRESTORE_AVAILABLE and SQLITE_PATH:
+    mock_storage = SQLiteStore(
+        SQLITE_PATH,
+        pool_size=int(os.getenv("SQLITE_POOL_SIZE", "4")),
+        batch_size=int(os.getenv("SQLITE_BATCH_SIZE", "256"))
+    )
+    print(f"SQLite storage opened ({len(mock_storage)} responses)")
+elif not FIRESTORE_AVAILABLE and LOCAL_STORAGE_PATH:
+    mock_storage = AppendOnlyLog(
+        LOCAL_STORAGE_PATH,
+        fsync_interval=float(os.getenv("LOCAL_STORAGE_FSYNC_INTERVAL", "0.05")),
+        fsync_batch=int(os.getenv("LOCAL_STORAGE_FSYNC_BATCH", "1000"))
+    )
+    print(f"Local storage opened ({len(mock_storage)} responses)")
+
+def prepare_fork() -> None:
+    """ワーカーをフォークする前のマスタープロセスでの処理（server.pyから呼ばれる）
+
+    SQLiteのコネクションと書き込みスレッド、追記専用ログのfsyncスレッドはフォーク後のプロセスに
+    引き継げないため閉じる。
+    """
+    if isinstance(mock_storage, (SQLiteStore, AppendOnlyLog)):
+        mock_storage.close()
+
+def init_worker() -> None:
+    """フォークしたワーカープロセスでの初期化（server.pyから呼ばれる）
+
+    gRPCのチャネルはプロセス間で共有できないため、Firestoreクライアントを作り直す。
+    """
+    global db, mock_storage
+    if FIRESTORE_AVAILABLE:
+        db = firestore.Client()
+    if isinstance(mock_storage, SQLiteStore):
+        mock_storage = SQLiteStore(mock_storage.path, mock_storage.pool_size, mock_storage.batch_size)
+    elif isinstance(mock_storage, AppendOnlyLog):
+        mock_storage = AppendOnlyLog(mock_storage.path, mock_storage.fsync_interval, mock_storage.fsync_batch)
+
 # Pydanticモデル
 class UserStatusRequest(BaseModel):
     userId: str = Field(..., description="LINEユーザーID")
@@ -134,6 +352,10 @@ class SurveyResponse(BaseModel):
     timestamp: str
     createdAt: str
 
+class UserBootstrap(BaseModel):
+    status: UserStatus
+    latestResponse: Optional[SurveyResponse] = None
+
 class ApiResponse(BaseModel):
     success: bool
     message: Optional[str] = None
@@ -148,19 +370,94 @@ class Statistics(BaseModel):
     satisfaction_distribution: Dict[str, int]
     average_satisfaction: float
     responses_by_date: Dict[str, int]
+    unique_users: Optional[int] = None
+    satisfaction_percentiles: Optional[Dict[str, int]] = None
+    nps: Optional[float] = None
 
 class SurveyResultsResponse(BaseModel):
     responses: List[SurveyResponse]
     statistics: Statistics
     pagination: Dict[str, int]
 
+def parse_result_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """fieldsパラメータ（カンマ区切り）を射影対象のフィールド一覧に変換"""
+    if fields is None:
+        return None
+
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    invalid = [name for name in names if name not in SurveyResponse.model_fields]
+    if not names or invalid:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"fieldsに無効なフィールドが含まれています: {', '.join(invalid)}"
+        )
+
+    # idは常に返す（ドキュメントIDのため射影には含めない）
+    return ['id'] + [name for name in dict.fromkeys(names) if name != 'id']
+
+def build_response_filters(
+    age: Optional[str] = None,
+    gender: Optional[str] = None,
+    frequency: Optional[str] = None,
+    satisfaction: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> List[ResponseFilter]:
+    """クエリパラメータをFirestoreのwhere条件（field, op, value）に変換
+
+    等価条件の各フィールドには firestore.indexes.json に (field, createdAt DESC) の
+    複合インデックスが必要（複数指定時はインデックスのマージで処理される）。
+    """
+    filters: List[ResponseFilter] = []
+    for field, value in (("age", age), ("gender", gender), ("frequency", frequency), ("satisfaction", satisfaction)):
+        if value is not None:
+            filters.append((field, '==', value))
+
+    try:
+        if start_date is not None:
+            start = datetime.strptime(start_date, "%Y-%m-%d")
+            filters.append(('createdAt', '>=', start.isoformat()))
+        if end_date is not None:
+            # 終了日当日を含めるため翌日0時未満とする
+            end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+            filters.append(('createdAt', '<', end.isoformat()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="start_date・end_dateはYYYY-MM-DD形式で指定してください"
+        )
+
+    return filters
+
 # アプリケーション初期化
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 起動時の処理
     print("FastAPI Survey API starting up...")
+    global feedback_index
+    if FEEDBACK_INDEX_PATH and os.path.exists(FEEDBACK_INDEX_PATH):
+        try:
+            feedback_index = FeedbackIndex.load(FEEDBACK_INDEX_PATH)
+            print(f"Loaded feedback index ({len(feedback_index)} responses)")
+        except Exception as e:
+            # 読み込めない場合は空のインデックスからFirestoreの全件を取り込む
+            print(f"Warning: Failed to load feedback index: {e}")
+    if MATERIALIZED_VIEW_ENABLED and FIRESTORE_AVAILABLE and RESPONSE_PARTITIONING != "none":
+        print("Warning: Materialized view is not supported with RESPONSE_PARTITIONING. Disabled.")
+    elif MATERIALIZED_VIEW_ENABLED and FIRESTORE_AVAILABLE:
+        # 初回スナップショットの受信までは従来どおりFirestoreへ問い合わせる
+        materialized_view.start(response_collection())
     yield
     # 終了時の処理
+    materialized_view.stop()
+    if FEEDBACK_INDEX_PATH:
+        feedback_index.save(FEEDBACK_INDEX_PATH)
+    if isinstance(mock_storage, AppendOnlyLog):
+        # 未同期の回答をディスクに反映する
+        mock_storage.sync()
+    elif isinstance(mock_storage, SQLiteStore):
+        # 書き込みキューに残っている回答をコミットしてから閉じる
+        mock_storage.close()
     print("FastAPI Survey API shutting down...")
 
 app = FastAPI(
@@ -170,6 +467,129 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# レート制限・アドミッション制御の設定
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMITED_PATHS = {"/survey/submit", "/user/status", "/user/bootstrap"}
+# Cloud Run等のプロキシ配下ではX-Forwarded-ForのクライアントIPを使う
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+# X-Forwarded-Forに追記する信頼できるプロキシの数（右からこの位置をクライアントIPとする。
+# 左側はクライアントが自由に指定できるため使わない）
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+if TRUSTED_PROXY_HOPS < 1:
+    raise ValueError(f"TRUSTED_PROXY_HOPS must be at least 1: {TRUSTED_PROXY_HOPS}")
+rate_limit_backend: RateLimitBackend = InMemoryRateLimitBackend()
+user_rate_limiter = RateLimiter(
+    rate_limit_backend, "user",
+    rate=float(os.getenv("RATE_LIMIT_USER_RATE", "1")),
+    burst=int(os.getenv("RATE_LIMIT_USER_BURST", "20"))
+)
+ip_rate_limiter = RateLimiter(
+    rate_limit_backend, "ip",
+    rate=float(os.getenv("RATE_LIMIT_IP_RATE", "10")),
+    burst=int(os.getenv("RATE_LIMIT_IP_BURST", "100"))
+)
+inflight_limiter = ConcurrencyLimiter(int(os.getenv("MAX_INFLIGHT_REQUESTS", "100")))
+
+def set_rate_limit_backend(backend: RateLimitBackend) -> None:
+    """レート制限の状態を保持するバックエンドを差し替える（複数インスタンスでの共有用）"""
+    global rate_limit_backend
+    rate_limit_backend = backend
+    user_rate_limiter.backend = backend
+    ip_rate_limiter.backend = backend
+
+def client_ip(request: Request) -> str:
+    """レート制限に使用するクライアントIP"""
+    if TRUST_FORWARDED_FOR:
+        forwarded = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+        if forwarded:
+            # 信頼できるプロキシが追記した右端から数える（プロキシの数より少なければ左端）
+            return forwarded[-min(TRUSTED_PROXY_HOPS, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+def limit_exceeded_response(status_code: int, message: str, retry_after: float) -> JSONResponse:
+    """レート制限・負荷制限時のレスポンス"""
+    return JSONResponse(
+        status_code=status_code,
+        content=ApiResponse(success=False, error=message, message=message).model_dump(),
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+# リクエスト単位のプロファイリング（PROFILE_SAMPLE_RATEの割合、または署名付きのX-Debug-Profileヘッダーのリクエスト）
+# 処理中のスタックからこのミドルウェアのフレームを探すため、別タスクで処理を実行するアドミッション制御より内側に置く
+request_profiler = RequestProfiler(
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    debug_secret=os.getenv("PROFILE_DEBUG_SECRET") or None,
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+    buffer_size=int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+)
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
+# アドミッション制御（CORSヘッダーを付与するためCORSより内側で実行）
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """同時実行数の上限超過時は503、クライアントIP単位のレート超過時は429を即座に返す"""
+    if not RATE_LIMIT_ENABLED or request.url.path == "/health" or request.method == "OPTIONS":
+        return await call_next(request)
+
+    path = request.url.path
+    if path in RATE_LIMITED_PATHS or (path.startswith("/surveys/") and path.endswith("/submit")):
+        retry_after = ip_rate_limiter.check(client_ip(request))
+        if retry_after:
+            return limit_exceeded_response(
+                status.HTTP_429_TOO_MANY_REQUESTS, "リクエストが多すぎます。しばらくしてから再度お試しください", retry_after
+            )
+
+    if not inflight_limiter.try_acquire():
+        return limit_exceeded_response(
+            status.HTTP_503_SERVICE_UNAVAILABLE, "サーバーが混雑しています。しばらくしてから再度お試しください", 1
+        )
+    try:
+        return await call_next(request)
+    finally:
+        inflight_limiter.release()
+
+async def rate_limited_user(current_user: LineUser = Depends(verify_line_id_token)) -> LineUser:
+    """検証済みユーザーID単位のレート制限を適用したユーザー情報"""
+    if RATE_LIMIT_ENABLED:
+        retry_after = user_rate_limiter.check(current_user.userId)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="リクエストが多すぎます。しばらくしてから再度お試しください",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+    return current_user
+
+# リクエストの期限（X-Request-Timeoutヘッダーが短ければそれを使う）。IDToken検証・Firestoreの呼び出しに伝播する
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))
+ROUTE_TIMEOUTS = [
+    # 長時間の接続・出力には期限を設けない（Firestoreの各呼び出しにはFIRESTORE_TIMEOUTを適用する）
+    (r"/survey/statistics/stream|/survey/results/export", None),
+]
+app.add_middleware(DeadlineMiddleware, default_timeout=REQUEST_TIMEOUT, route_timeouts=ROUTE_TIMEOUTS)
+
+# キャッシュ制御（ルートごとのCache-Control。キャッシュ可能なGETにはETagを付けて304で応答する）
+HEALTH_CACHE_MAX_AGE = int(os.getenv("HEALTH_CACHE_MAX_AGE", "5"))
+STATS_CACHE_MAX_AGE = int(os.getenv("STATS_CACHE_MAX_AGE", "10"))
+CACHE_POLICIES = [
+    (r"/health", f"public, max-age={HEALTH_CACHE_MAX_AGE}"),
+    # 全体の集計は利用者によらないため、CDNなどの共有キャッシュにも短時間保持させる
+    (r"/survey/statistics(/satisfaction|/timeseries)?",
+     f"public, max-age={STATS_CACHE_MAX_AGE}, stale-while-revalidate={STATS_CACHE_MAX_AGE}"),
+    # ユーザーごとの情報は共有キャッシュに保持させず、ブラウザでも毎回検証させる
+    (r"/user/.*", "private, no-cache"),
+    (r"/metrics|/admin/.*", "no-store"),
+]
+app.add_middleware(HttpCacheMiddleware, policies=CACHE_POLICIES, default="private, no-cache")
+
+# レスポンスの圧縮（COMPRESSION_MIN_SIZEバイト未満は圧縮しない）
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+)
+
 # CORS設定
 app.add_middleware(
     CORSMiddleware,
@@ -193,73 +613,227 @@ async def health_check():
         }
     )
 
+# 運用メトリクス
+@app.get("/metrics", response_model=ApiResponse)
+async def get_metrics():
+    """読み取り集約などの運用メトリクスを取得（管理者用）"""
+    return ApiResponse(
+        success=True,
+        data={
+            "singleflight": read_coalescer.metrics(),
+            "line_verify": line_verify_breaker.metrics(),
+            "statistics_stream": statistics_broadcaster.metrics(),
+            "materialized_view": materialized_view.metrics(),
+            "feedback_index": feedback_index.metrics(),
+            "user_submit_locks": user_submit_locks.metrics(),
+            "local_storage": mock_storage.metrics() if isinstance(mock_storage, (AppendOnlyLog, SQLiteStore)) else None,
+            "rate_limit": {
+                "user": user_rate_limiter.metrics(),
+                "ip": ip_rate_limiter.metrics(),
+                "admission": inflight_limiter.metrics()
+            }
+        }
+    )
+
+def response_collection(partition: Optional[str] = None):
+    """回答を保存するコレクション（Noneはパーティション導入前の survey_responses）"""
+    return db.collection(partition_path(partition) if partition else RESPONSE_COLLECTION)
+
+def live_partitions(since: Optional[str] = None, until: Optional[str] = None) -> List[Optional[str]]:
+    """読み取り対象のパーティションを新しい順に返す（since・untilはcreatedAtの範囲）
+
+    パーティションを使う場合は台帳で有効な月のみを対象とし、導入前の回答を持つ
+    survey_responses（None）を最後に加える。
+    """
+    if RESPONSE_PARTITIONING == "none":
+        return [None]
+    if response_partitions.stale:
+        docs = db.collection(PARTITION_COLLECTION).stream(timeout=storage_timeout())
+        response_partitions.load((doc.id, doc.to_dict()) for doc in docs)
+    return response_partitions.live(partition_key(datetime.now().isoformat()), since, until) + [None]
+
+def response_collections(since: Optional[str] = None, until: Optional[str] = None) -> List[Any]:
+    """読み取り対象のコレクションを新しい順に返す"""
+    return [response_collection(partition) for partition in live_partitions(since, until)]
+
+def created_at_range(filters: List[ResponseFilter]) -> Tuple[Optional[str], Optional[str]]:
+    """絞り込み条件のcreatedAtの範囲 (since, until)"""
+    since = max((value for field, op, value in filters if field == 'createdAt' and op in ('>=', '>')), default=None)
+    until = min((value for field, op, value in filters if field == 'createdAt' and op in ('<=', '<')), default=None)
+    return since, until
+
+def write_partition(created_at: str) -> Optional[str]:
+    """回答の書き込み先のパーティション（このプロセスで初めての月は台帳に追加する）"""
+    if RESPONSE_PARTITIONING == "none":
+        return None
+    key = partition_key(created_at)
+    if response_partitions.register(key):
+        try:
+            db.collection(PARTITION_COLLECTION).document(key).set(
+                {"collection": partition_path(key)}, merge=True, timeout=storage_timeout()
+            )
+        except Exception:
+            response_partitions.forget(key)
+            raise
+    return key
+
+def fetch_user_responses(user_id: str) -> List[Dict[str, Any]]:
+    """ユーザーの回答を新しい順に取得（各要素にidを含む）"""
+    if FIRESTORE_AVAILABLE:
+        # Firestoreでユーザーの回答を検索（パーティションは新しい順のため、連結しても新しい順になる）
+        responses = []
+        for collection in response_collections():
+            query = collection.where('userId', '==', user_id).order_by('createdAt', direction=firestore.Query.DESCENDING)
+            for doc in query.stream(timeout=storage_timeout()):
+                data = doc.to_dict()
+                data['id'] = doc.id
+                responses.append(data)
+        return responses
+
+    if isinstance(mock_storage, SQLiteStore):
+        # (userId, createdAt DESC) のインデックスで新しい順に取得
+        return mock_storage.user_responses(user_id)
+
+    # モックストレージでユーザーの回答を検索（createdAtでソート）
+    if isinstance(mock_storage, AppendOnlyLog):
+        # ローカルストレージはユーザーIDの索引から読み取る
+        user_responses = mock_storage.by_user(user_id)
+    else:
+        user_responses = [r for r in mock_storage if r.get('userId') == user_id]
+    return sorted(user_responses, key=lambda x: x.get('createdAt', ''), reverse=True)
+
+def user_latest_entry(response_id: str, response_data: Dict[str, Any], partition: Optional[str]) -> Dict[str, Any]:
+    """user_latest/{userId} の内容（回答件数を除く）"""
+    return {
+        "responseId": response_id,
+        "createdAt": response_data['createdAt'],
+        "partition": partition,
+        "response": response_data
+    }
+
+def fetch_user_summary(user_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+    """ユーザーの最新の回答（idを含む）と回答件数を取得
+
+    Firestoreでは user_latest/{userId} を1回取得する。回答の内容を持たない（導入前の）
+    ユーザーは、backfill_user_latest.py の実行前であれば回答を検索する。
+    """
+    if FIRESTORE_AVAILABLE:
+        snapshot = db.collection(USER_LATEST_COLLECTION).document(user_id).get(timeout=storage_timeout())
+        entry = snapshot.to_dict() if snapshot.exists else None
+        if entry is not None and 'response' in entry:
+            return {**entry['response'], 'id': entry['responseId']}, entry.get('responseCount', 1)
+        if entry is None and USER_LATEST_BACKFILLED:
+            return None, 0
+
+    user_responses = fetch_user_responses(user_id)
+    return (user_responses[0] if user_responses else None), len(user_responses)
+
+async def load_user_summary(user_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+    """ユーザーの最新の回答と回答件数を取得
+
+    マテリアライズドビューが利用可能な場合はメモリから応答し、それ以外は
+    同一ユーザーの同時読み取りを1回の取得にまとめる。
+    """
+    if materialized_view.ready:
+        user_responses = materialized_view.user_responses(user_id)
+        return (user_responses[0] if user_responses else None), len(user_responses)
+    return await within_deadline(
+        read_coalescer.do(("user_summary", user_id), lambda: fetch_user_summary(user_id))
+    )
+
 # ユーザーの回答状態確認
 @app.post("/user/status", response_model=ApiResponse)
-async def check_user_status(user_request: UserStatusRequest, current_user: LineUser = Depends(verify_line_id_token)):
+async def check_user_status(user_request: UserStatusRequest, current_user: LineUser = Depends(rate_limited_user)):
     """ユーザーの回答状態を確認"""
     try:
         # 認証されたユーザーIDを使用
         user_id = current_user.userId
+        latest_response, response_count = await load_user_summary(user_id)
         
-        if FIRESTORE_AVAILABLE:
-            # Firestoreでユーザーの回答を検索
-            query = db.collection('survey_responses').where('userId', '==', user_id).order_by('createdAt', direction=firestore.Query.DESCENDING)
-            docs = list(query.stream())
-            
-            if docs:
-                # 最新の回答を取得
-                latest_response = docs[0].to_dict()
-                user_status = UserStatus(
-                    userId=user_id,
-                    hasResponse=True,
-                    lastResponseId=docs[0].id,
-                    lastResponseDate=latest_response.get('createdAt'),
-                    responseCount=len(docs)
-                )
-            else:
-                user_status = UserStatus(
-                    userId=user_id,
-                    hasResponse=False,
-                    responseCount=0
-                )
+        if latest_response is not None:
+            user_status = UserStatus(
+                userId=user_id,
+                hasResponse=True,
+                lastResponseId=latest_response.get('id'),
+                lastResponseDate=latest_response.get('createdAt'),
+                responseCount=response_count
+            )
         else:
-            # モックストレージでユーザーの回答を検索
-            user_responses = [r for r in mock_storage if r.get('userId') == user_id]
-            
-            if user_responses:
-                # 最新の回答を取得（createdAtでソート）
-                latest_response = max(user_responses, key=lambda x: x.get('createdAt', ''))
-                user_status = UserStatus(
+            user_status = UserStatus(
+                userId=user_id,
+                hasResponse=False,
+                responseCount=0
+            )
+
+        return ApiResponse(
+            success=True,
+            message="ユーザー状態を取得しました",
+            data=user_status.model_dump()
+        )
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error checking user status: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="ユーザー状態の確認に失敗しました"
+        )
+
+# LIFFアプリ起動時の初期データ取得
+@app.post("/user/bootstrap", response_model=ApiResponse)
+async def bootstrap_user(user_request: UserStatusRequest, current_user: LineUser = Depends(rate_limited_user)):
+    """ユーザーの回答状態と最新回答を1回のIDToken検証・user_latestの取得でまとめて取得
+
+    /user/status と /user/{user_id}/latest-response を順に呼ぶ代わりに、
+    LIFFアプリの起動時に1往復で必要なデータを返す。
+    """
+    try:
+        user_id = current_user.userId
+        latest_response, response_count = await load_user_summary(user_id)
+
+        if latest_response is not None:
+            bootstrap = UserBootstrap(
+                status=UserStatus(
                     userId=user_id,
                     hasResponse=True,
                     lastResponseId=latest_response.get('id'),
                     lastResponseDate=latest_response.get('createdAt'),
-                    responseCount=len(user_responses)
-                )
-            else:
-                user_status = UserStatus(
+                    responseCount=response_count
+                ),
+                latestResponse=SurveyResponse(**latest_response)
+            )
+        else:
+            bootstrap = UserBootstrap(
+                status=UserStatus(
                     userId=user_id,
                     hasResponse=False,
                     responseCount=0
                 )
+            )
 
         return ApiResponse(
             success=True,
-            message="ユーザー状態を取得しました",
-            data=user_status.model_dump()
+            message="ユーザー情報を取得しました",
+            data=bootstrap.model_dump()
         )
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"Error checking user status: {str(e)}")
+        print(f"Error bootstrapping user: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="ユーザー状態の確認に失敗しました"
+            detail="ユーザー情報の取得に失敗しました"
         )
 
 # ユーザーの最新回答取得
 @app.get("/user/{user_id}/latest-response", response_model=ApiResponse)
 async def get_user_latest_response(user_id: str, current_user: LineUser = Depends(verify_line_id_token)):
-    """ユーザーの最新回答を取得"""
+    """ユーザーの最新回答を取得
+
+    /user/status と同時に呼ばれることが多いため、同じ user_latest の取得を共有する。
+    """
     try:
         # 認証されたユーザーのみが自分の回答を取得可能
         if user_id != current_user.userId:
@@ -268,41 +842,22 @@ async def get_user_latest_response(user_id: str, current_user: LineUser = Depend
                 detail="他のユーザーの回答は取得できません"
             )
         
-        if FIRESTORE_AVAILABLE:
-            # Firestoreから最新の回答を取得
-            query = db.collection('survey_responses').where('userId', '==', user_id).order_by('createdAt', direction=firestore.Query.DESCENDING).limit(1)
-            docs = list(query.stream())
-            
-            if docs:
-                data = docs[0].to_dict()
-                data['id'] = docs[0].id
-                response = SurveyResponse(**data)
-                return ApiResponse(
-                    success=True,
-                    data=response.model_dump()
-                )
-            else:
-                return ApiResponse(
-                    success=False,
-                    message="回答が見つかりませんでした"
-                )
+        latest_response, _ = await load_user_summary(user_id)
+        
+        if latest_response is not None:
+            response = SurveyResponse(**latest_response)
+            return ApiResponse(
+                success=True,
+                data=response.model_dump()
+            )
         else:
-            # モックストレージから最新の回答を取得
-            user_responses = [r for r in mock_storage if r.get('userId') == user_id]
-            
-            if user_responses:
-                latest_response = max(user_responses, key=lambda x: x.get('createdAt', ''))
-                response = SurveyResponse(**latest_response)
-                return ApiResponse(
-                    success=True,
-                    data=response.model_dump()
-                )
-            else:
-                return ApiResponse(
-                    success=False,
-                    message="回答が見つかりませんでした"
-                )
+            return ApiResponse(
+                success=False,
+                message="回答が見つかりませんでした"
+            )
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error fetching user latest response: {str(e)}")
         raise HTTPException(
@@ -311,8 +866,120 @@ async def get_user_latest_response(user_id: str, current_user: LineUser = Depend
         )
 
 # アンケート回答の送信
+class DuplicateResponseError(Exception):
+    """RESPONSE_POLICY=rejectで、ユーザーが回答済みの場合"""
+
+    def __init__(self, response_id: str):
+        super().__init__(f"user has already responded: {response_id}")
+        self.response_id = response_id
+
+def save_response_once(response_data: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """RESPONSE_POLICYに従ってFirestoreに保存し、(回答ID, 置き換えた回答) を返す
+
+    user_latest/{userId} をトランザクション内で読み書きするため、同じユーザーの同時送信は
+    Firestoreにより直列化される（競合したトランザクションは再実行される）。
+    """
+    partition = write_partition(response_data['createdAt'])
+    responses_ref = response_collection(partition)
+    collections = response_collections()
+    latest_ref = db.collection(USER_LATEST_COLLECTION).document(response_data['userId'])
+
+    @firestore.transactional
+    def save(transaction):
+        snapshot = latest_ref.get(transaction=transaction, timeout=storage_timeout())
+        latest = snapshot.to_dict() if snapshot.exists else None
+        previous_ref = None
+        previous = None
+        if latest is not None:
+            previous_ref = response_collection(latest.get('partition')).document(latest['responseId'])
+            previous_snapshot = previous_ref.get(transaction=transaction, timeout=storage_timeout())
+            previous = previous_snapshot.to_dict() if previous_snapshot.exists else None
+        if latest is None or (previous is None and RESPONSE_PARTITIONING != "none" and latest.get('partition') is None):
+            # user_latestの導入前に保存された回答（パーティションへ移行した回答を含む）がある場合は最新の回答を対象とする
+            for collection in collections:
+                query = collection.where('userId', '==', response_data['userId']) \
+                    .order_by('createdAt', direction=firestore.Query.DESCENDING).limit(1)
+                for doc in query.stream(transaction=transaction, timeout=storage_timeout()):
+                    previous_ref = collection.document(doc.id)
+                    previous = doc.to_dict()
+                if previous is not None:
+                    break
+
+        if previous is not None:
+            if RESPONSE_POLICY == "reject":
+                raise DuplicateResponseError(previous_ref.id)
+            transaction.delete(previous_ref)
+
+        doc_ref = responses_ref.document()
+        transaction.set(doc_ref, response_data)
+        # 置き換えた場合は件数が変わらない（導入前の形式で件数がない場合は1件とみなす）
+        response_count = latest.get('responseCount', 1) if latest else 0
+        if previous is None:
+            response_count += 1
+        transaction.set(latest_ref, {
+            **user_latest_entry(doc_ref.id, response_data, partition),
+            "responseCount": max(response_count, 1)
+        })
+        return doc_ref.id, ({**previous, "id": previous_ref.id} if previous is not None else None)
+
+    return save(db.transaction())
+
+def save_response(response_data: Dict[str, Any]) -> str:
+    """Firestoreに回答と user_latest/{userId} を1回のバッチで保存し、回答IDを返す（RESPONSE_POLICY=allow）"""
+    partition = write_partition(response_data['createdAt'])
+    doc_ref = response_collection(partition).document()
+    batch = db.batch()
+    batch.set(doc_ref, response_data)
+    batch.set(
+        db.collection(USER_LATEST_COLLECTION).document(response_data['userId']),
+        {**user_latest_entry(doc_ref.id, response_data, partition), "responseCount": firestore.Increment(1)},
+        merge=True
+    )
+    batch.commit(timeout=storage_timeout())
+    return doc_ref.id
+
+async def save_mock_response(response_data: Dict[str, Any], replaces: Optional[str] = None) -> str:
+    """Firestoreを使わない場合のストアに保存する（replacesの回答を置き換える）"""
+    if isinstance(mock_storage, SQLiteStore):
+        # 同時に送信された回答とまとめてコミットする（イベントループはブロックしない）
+        return await mock_storage.insert(response_data, replaces)
+
+    if replaces is None:
+        response_data["id"] = f"mock_{len(mock_storage) + 1}"
+        mock_storage.append(response_data)
+    else:
+        # 置き換えでは件数が変わらず件数からの採番が重複するため、ランダムなIDとする
+        response_data["id"] = f"mock_{uuid.uuid4().hex}"
+        if isinstance(mock_storage, AppendOnlyLog):
+            mock_storage.append(response_data, replaces)
+        else:
+            mock_storage[:] = [r for r in mock_storage if r.get('id') != replaces]
+            mock_storage.append(response_data)
+    return response_data["id"]
+
+async def save_mock_response_once(response_data: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """RESPONSE_POLICYに従ってFirestoreを使わない場合のストアに保存する
+
+    SQLiteでは確認と保存を書き込みスレッドの1つのトランザクションで行い、
+    それ以外はユーザー単位のロックで直列化する（プロセス内でのみ有効）。
+    """
+    if isinstance(mock_storage, SQLiteStore):
+        try:
+            return await mock_storage.insert_once(response_data, RESPONSE_POLICY)
+        except DuplicateUserResponse as e:
+            raise DuplicateResponseError(e.response_id)
+
+    async with user_submit_locks.hold(response_data['userId']):
+        # SQLite・ローカルストレージの読み取りでイベントループをブロックしないようスレッドプールで実行
+        user_responses = await run_in_threadpool(fetch_user_responses, response_data['userId'])
+        previous = user_responses[0] if user_responses else None
+        if previous is not None and RESPONSE_POLICY == "reject":
+            raise DuplicateResponseError(previous['id'])
+        doc_id = await save_mock_response(response_data, previous['id'] if previous else None)
+        return doc_id, previous
+
 @app.post("/survey/submit", response_model=ApiResponse)
-async def submit_survey(survey_data: SurveyRequest, current_user: LineUser = Depends(verify_line_id_token)):
+async def submit_survey(survey_data: SurveyRequest, current_user: LineUser = Depends(rate_limited_user)):
     """アンケート回答を保存"""
     try:
         # データの準備（認証されたユーザー情報を使用）
@@ -325,15 +992,42 @@ async def submit_survey(survey_data: SurveyRequest, current_user: LineUser = Dep
             "createdAt": timestamp
         }
 
-        if FIRESTORE_AVAILABLE:
-            # Firestoreに保存
-            doc_ref = db.collection('survey_responses').add(response_data)
-            doc_id = doc_ref[1].id
+        # 置き換えた回答（RESPONSE_POLICY=overwrite）
+        previous = None
+        if RESPONSE_POLICY != "allow":
+            if FIRESTORE_AVAILABLE:
+                doc_id, previous = await within_deadline(run_in_threadpool(save_response_once, response_data))
+            else:
+                doc_id, previous = await within_deadline(save_mock_response_once(response_data))
+        elif FIRESTORE_AVAILABLE:
+            # Firestoreに保存（イベントループをブロックしないようスレッドプールで実行）
+            doc_id = await within_deadline(run_in_threadpool(save_response, response_data))
         else:
             # モックストレージに保存
-            doc_id = f"mock_{len(mock_storage) + 1}"
-            response_data["id"] = doc_id
-            mock_storage.append(response_data)
+            doc_id = await within_deadline(save_mock_response(response_data))
+
+        # 自由記述を検索インデックスに追加（他インスタンスの送信分は定期的にFirestoreから取り込む）
+        feedback_index.add(doc_id, response_data.get("feedback"), timestamp)
+        if previous is not None:
+            feedback_index.remove(previous["id"], previous.get("feedback"))
+
+        try:
+            if previous is not None:
+                await record_rollups(previous, sign=-1)
+                satisfaction_tracker.add(
+                    rollup_bucket_keys(previous["timestamp"])["day"], int(previous["satisfaction"]), -1
+                )
+            await record_rollups(response_data)
+            await record_user_sketch(response_data)
+            satisfaction_tracker.add(rollup_bucket_keys(timestamp)["day"], int(response_data["satisfaction"]))
+        except Exception as e:
+            # 回答自体は保存済みのため失敗扱いにしない（rebuild_rollups.pyで再集計可能）
+            print(f"Error updating statistics rollups: {str(e)}")
+
+        # ダッシュボードへ統計差分を配信
+        if previous is not None:
+            statistics_broadcaster.publish("delta", statistics_delta(previous, sign=-1))
+        statistics_broadcaster.publish("delta", statistics_delta(response_data))
 
         return ApiResponse(
             success=True,
@@ -341,6 +1035,13 @@ async def submit_survey(survey_data: SurveyRequest, current_user: LineUser = Dep
             data={"id": doc_id}
         )
 
+    except DuplicateResponseError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="既に回答済みです"
+        )
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error saving survey response: {str(e)}")
         raise HTTPException(
@@ -348,10 +1049,101 @@ async def submit_survey(survey_data: SurveyRequest, current_user: LineUser = Dep
             detail="サーバーエラーが発生しました"
         )
 
+def fetch_partitioned_docs(
+    limit: int,
+    offset: int,
+    projection: Optional[List[str]],
+    filters: List[ResponseFilter]
+) -> List[Any]:
+    """パーティションをまたいで回答のドキュメントを新しい順に取得する"""
+    # パーティションは新しい月から順に、offset + limit件に達するまで読む
+    # オフセットで読み飛ばした分もFirestoreでは読み取りとして課金されるため、読み飛ばしはこちらで行う
+    docs = []
+    for collection in response_collections(*created_at_range(filters)):
+        query = collection.order_by('createdAt', direction=firestore.Query.DESCENDING)
+        for field, op, value in filters:
+            query = query.where(field, op, value)
+        if projection:
+            query = query.select([name for name in projection if name != 'id'])
+        docs.extend(query.limit(offset + limit - len(docs)).stream(timeout=storage_timeout()))
+        if len(docs) >= offset + limit:
+            break
+    return docs[offset:]
+
+def load_survey_results(
+    limit: int,
+    offset: int,
+    projection: Optional[List[str]],
+    filters: List[ResponseFilter]
+) -> Union[SurveyResultsResponse, Dict[str, Any]]:
+    """アンケート結果の取得と統計計算（スレッドプールで実行される）"""
+    if FIRESTORE_AVAILABLE:
+        responses = []
+        for doc in fetch_partitioned_docs(limit, offset, projection, filters):
+            data = doc.to_dict()
+            if projection:
+                responses.append(SurveyRow(data, doc.id))
+                continue
+            data['id'] = doc.id
+            responses.append(SurveyResponse(**data))
+    elif isinstance(mock_storage, SQLiteStore):
+        # 絞り込み・並べ替え・ページングをSQLで実行する
+        rows = mock_storage.query(filters, limit, offset, projection)
+        if projection:
+            responses = [SurveyRow(row) for row in rows]
+        else:
+            responses = [SurveyResponse(**row) for row in rows]
+    else:
+        # モックストレージから取得
+        start_idx = offset
+        end_idx = offset + limit
+        matched = [r for r in mock_storage if matches_filters(r, filters)] if filters else mock_storage
+        mock_responses = matched[start_idx:end_idx]
+        if projection:
+            responses = [SurveyRow(response) for response in mock_responses]
+        else:
+            responses = [SurveyResponse(**response) for response in mock_responses]
+
+    # 統計データを計算
+    stats = calculate_statistics(responses)
+    pagination = {
+        "limit": limit,
+        "offset": offset,
+        "total": len(responses)
+    }
+
+    if projection:
+        return {
+            "responses": [row.to_dict(projection) for row in responses],
+            "statistics": stats,
+            "pagination": pagination
+        }
+
+    return SurveyResultsResponse(
+        responses=responses,
+        statistics=stats,
+        pagination=pagination
+    )
+
 # アンケート結果の取得
 @app.get("/survey/results", response_model=ApiResponse)
-async def get_survey_results(limit: int = 100, offset: int = 0):
-    """アンケート結果を取得（管理者用）"""
+async def get_survey_results(
+    limit: int = 100,
+    offset: int = 0,
+    fields: Optional[str] = None,
+    age: Optional[str] = None,
+    gender: Optional[str] = Query(None, pattern="^(male|female|other)$"),
+    frequency: Optional[str] = Query(None, pattern="^(daily|weekly|monthly|rarely)$"),
+    satisfaction: Optional[str] = Query(None, pattern="^[1-5]$"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """アンケート結果を取得（管理者用）
+
+    fieldsを指定した場合はFirestoreの射影クエリで必要なフィールドのみ取得し、
+    行ごとのPydanticモデル構築を省略する。
+    属性・期間の絞り込み条件はFirestoreのwhere句として実行する。
+    """
     try:
         # パラメータのバリデーション
         if limit < 1 or limit > 1000:
@@ -365,52 +1157,740 @@ async def get_survey_results(limit: int = 100, offset: int = 0):
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail="offsetは0以上で指定してください"
             )
+
+        projection = parse_result_fields(fields)
+        filters = build_response_filters(age, gender, frequency, satisfaction, start_date, end_date)
         
+        # 同じ条件の同時リクエストは1回の読み取り・集計を共有する
+        key = ("survey_results", limit, offset, tuple(projection or ()), tuple(filters))
+        data = await within_deadline(
+            read_coalescer.do(key, lambda: load_survey_results(limit, offset, projection, filters))
+        )
+
+        return ApiResponse(
+            success=True,
+            data=data
+        )
+
+    except HTTPException:
+        # HTTPExceptionは再度raiseして適切な処理に委ねる
+        raise
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error fetching survey results: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="データの取得に失敗しました"
+        )
+
+EXPORT_PAGE_SIZE = 1000
+
+def iter_export_pages(filters: List[ResponseFilter]) -> Iterator[List[Dict[str, Any]]]:
+    """絞り込み条件に一致する回答をページ単位で返す（/survey/results と同じ順序）"""
+    if FIRESTORE_AVAILABLE:
+        for collection in response_collections(*created_at_range(filters)):
+            query = collection.order_by('createdAt', direction=firestore.Query.DESCENDING)
+            for field, op, value in filters:
+                query = query.where(field, op, value)
+
+            last = None
+            while True:
+                page_query = query.limit(EXPORT_PAGE_SIZE)
+                if last is not None:
+                    page_query = page_query.start_after(last)
+                docs = list(page_query.stream(timeout=storage_timeout()))
+                if docs:
+                    yield [{**doc.to_dict(), "id": doc.id} for doc in docs]
+                if len(docs) < EXPORT_PAGE_SIZE:
+                    break
+                last = docs[-1]
+    elif isinstance(mock_storage, SQLiteStore):
+        offset = 0
+        while True:
+            rows = mock_storage.query(filters, EXPORT_PAGE_SIZE, offset)
+            if rows:
+                yield rows
+            if len(rows) < EXPORT_PAGE_SIZE:
+                return
+            offset += EXPORT_PAGE_SIZE
+    else:
+        matched = [r for r in mock_storage if matches_filters(r, filters)] if filters else list(mock_storage)
+        for i in range(0, len(matched), EXPORT_PAGE_SIZE):
+            yield matched[i:i + EXPORT_PAGE_SIZE]
+
+# アンケート結果のエクスポート
+@app.get("/survey/results/export")
+async def export_survey_results(
+    age: Optional[str] = None,
+    gender: Optional[str] = Query(None, pattern="^(male|female|other)$"),
+    frequency: Optional[str] = Query(None, pattern="^(daily|weekly|monthly|rarely)$"),
+    satisfaction: Optional[str] = Query(None, pattern="^[1-5]$"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """絞り込み条件に一致する全ての回答をNDJSONでストリーミング出力（管理者用）
+
+    ページ単位で読み込んで書き出すため、件数によらずメモリ使用量は一定。
+    圧縮はページごとにフラッシュしながら行われる（CompressionMiddleware）。
+    """
+    filters = build_response_filters(age, gender, frequency, satisfaction, start_date, end_date)
+
+    def lines():
+        # 同期ジェネレーターのためスレッドプールで読み込まれ、イベントループをブロックしない
+        for page in iter_export_pages(filters):
+            yield "".join(json.dumps(response, ensure_ascii=False, default=str) + "\n" for response in page)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="survey_responses.ndjson"'}
+    )
+
+def sync_feedback_index() -> int:
+    """watermark以降の回答の自由記述をインデックスに取り込む（スレッドプールで実行される）"""
+    global feedback_index_synced_at
+    watermark = feedback_index.watermark
+
+    if FIRESTORE_AVAILABLE:
+        since = None
+        if watermark is not None:
+            since = (datetime.fromisoformat(watermark) - timedelta(seconds=FEEDBACK_INDEX_SAFETY_LAG_SECONDS)).isoformat()
+        # watermark（の少し前）以降の月のみを古い順に読む
+        collections = list(reversed(response_collections(since=since)))
+
+        def documents():
+            for collection in collections:
+                query = collection
+                if since is not None:
+                    query = query.where('createdAt', '>', since)
+                docs = query.order_by('createdAt').select(['feedback', 'createdAt']).stream(timeout=storage_timeout())
+                for doc in docs:
+                    data = doc.to_dict()
+                    yield doc.id, data.get('feedback'), data.get('createdAt')
+    elif isinstance(mock_storage, AppendOnlyLog) and feedback_index_synced_at is not None:
+        # 追記専用ログは1プロセスのみが書き込み、送信時にインデックスへ追加済みのため、
+        # ログの走査（全回答の読み取り）は起動後の初回のみとする
+        def documents():
+            return iter(())
+    elif isinstance(mock_storage, SQLiteStore):
+        # createdAtのインデックスでwatermark以降の回答のみを読む
+        def documents():
+            for r in mock_storage.since(watermark, ('id', 'feedback', 'createdAt')):
+                yield r['id'], r.get('feedback'), r.get('createdAt')
+    else:
+        def documents():
+            for r in sorted(mock_storage, key=lambda x: x.get('createdAt', '')):
+                if watermark is None or r.get('createdAt', '') > watermark:
+                    yield r['id'], r.get('feedback'), r.get('createdAt')
+
+    added = feedback_index.add_many(documents())
+    if FIRESTORE_AVAILABLE and RESPONSE_PARTITIONING != "none":
+        # アーカイブ済みの月の回答は読み取りの対象外（TTLの経過後に削除される）のため除く
+        feedback_index.remove_months(response_partitions.archived())
+    feedback_index_synced_at = time.monotonic()
+    return added
+
+async def refresh_feedback_index() -> None:
+    """前回の取り込みからFEEDBACK_INDEX_SYNC_INTERVAL秒以上経過していれば差分を取り込む"""
+    if feedback_index_synced_at is None or time.monotonic() - feedback_index_synced_at >= FEEDBACK_INDEX_SYNC_INTERVAL:
+        await within_deadline(read_coalescer.do(("feedback_index_sync",), sync_feedback_index))
+
+def fetch_responses_by_id(doc_ids: List[str]) -> List[Dict[str, Any]]:
+    """回答IDの一覧から回答を取得（指定順）"""
+    if FIRESTORE_AVAILABLE:
+        # パーティションを使う場合は新しい月から順に、見つかっていない回答のみを取得する
+        found = {}
+        for collection in response_collections():
+            missing = [doc_id for doc_id in doc_ids if doc_id not in found]
+            if not missing:
+                break
+            for snapshot in db.get_all([collection.document(doc_id) for doc_id in missing], timeout=storage_timeout()):
+                if snapshot.exists:
+                    found[snapshot.id] = {**snapshot.to_dict(), "id": snapshot.id}
+    elif isinstance(mock_storage, SQLiteStore):
+        # 回答IDの一意インデックスで該当する回答のみを読み取る
+        found = mock_storage.get_many(doc_ids)
+    elif isinstance(mock_storage, AppendOnlyLog):
+        # ローカルストレージは回答IDの索引から読み取る
+        found = {}
+        for doc_id in doc_ids:
+            response = mock_storage.get(doc_id)
+            if response is not None:
+                found[doc_id] = response
+    else:
+        wanted = set(doc_ids)
+        found = {r['id']: r for r in mock_storage if r.get('id') in wanted}
+    return [found[doc_id] for doc_id in doc_ids if doc_id in found]
+
+# 自由記述の検索
+@app.get("/survey/feedback/search", response_model=ApiResponse)
+async def search_feedback(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """自由記述にクエリを含む回答を新しい順に取得（管理者用）
+
+    日本語は文字bigram単位（1文字のクエリはその文字）で照合するため、クエリの全てのbigramを含む回答が該当する。
+    """
+    try:
+        await refresh_feedback_index()
+        doc_ids = feedback_index.search(q, limit)
+        responses = await within_deadline(run_in_threadpool(fetch_responses_by_id, doc_ids)) if doc_ids else []
+        # 他インスタンスで置き換えられた回答など、取得できなかった回答はインデックスから除く
+        found = {response['id'] for response in responses}
+        for doc_id in doc_ids:
+            if doc_id not in found:
+                feedback_index.remove(doc_id)
+
+        return ApiResponse(
+            success=True,
+            data={
+                "query": q,
+                "responses": [SurveyResponse(**response).model_dump() for response in responses]
+            }
+        )
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error searching feedback: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="自由記述の検索に失敗しました"
+        )
+
+# 自由記述の頻出キーワード
+@app.get("/survey/feedback/keywords", response_model=ApiResponse)
+async def get_feedback_keywords(limit: int = Query(20, ge=1, le=100)):
+    """自由記述に出現する回答数の多いキーワードを取得（管理者用）"""
+    try:
+        await refresh_feedback_index()
+        return ApiResponse(
+            success=True,
+            data={
+                "total_responses": len(feedback_index),
+                "keywords": [{"keyword": keyword, "count": count} for keyword, count in feedback_index.top_keywords(limit)]
+            }
+        )
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error fetching feedback keywords: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="キーワードの集計に失敗しました"
+        )
+
+def get_compiled_survey(survey_id: str) -> CompiledSurvey:
+    """登録済みのアンケート定義を取得（未登録の場合は404）"""
+    compiled = survey_registry.get(survey_id)
+    if compiled is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="アンケートが見つかりません"
+        )
+    return compiled
+
+def survey_mock_storage(survey_id: str) -> List[Dict[str, Any]]:
+    """アンケートの回答を保存するモックストレージ"""
+    if survey_id == DEFAULT_SURVEY_ID:
+        return mock_storage
+    return mock_survey_storage.setdefault(survey_id, [])
+
+# アンケート定義の一覧
+@app.get("/surveys", response_model=ApiResponse)
+async def list_surveys():
+    """登録済みのアンケート定義を取得"""
+    return ApiResponse(
+        success=True,
+        data=[definition.model_dump() for definition in survey_registry.definitions()]
+    )
+
+# アンケート定義の取得
+@app.get("/surveys/{survey_id}", response_model=ApiResponse)
+async def get_survey(survey_id: str):
+    """アンケート定義を取得"""
+    return ApiResponse(
+        success=True,
+        data=get_compiled_survey(survey_id).definition.model_dump()
+    )
+
+# アンケートIDを指定した回答の送信
+@app.post("/surveys/{survey_id}/submit", response_model=ApiResponse)
+async def submit_survey_by_id(survey_id: str, answers: Dict[str, Any], current_user: LineUser = Depends(rate_limited_user)):
+    """アンケート定義のバリデータで検証し、アンケートごとのコレクションに保存"""
+    compiled = get_compiled_survey(survey_id)
+    try:
+        validated = compiled.validate(answers)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+    if survey_id == DEFAULT_SURVEY_ID:
+        # 既定のアンケートはロールアップ等の集計を含めて従来の処理で保存する
+        return await submit_survey(SurveyRequest(**validated), current_user)
+
+    try:
+        timestamp = datetime.now().isoformat()
+        response_data = {
+            **validated,
+            "surveyId": survey_id,
+            "userId": current_user.userId,
+            "displayName": current_user.displayName,
+            "timestamp": timestamp,
+            "createdAt": timestamp
+        }
+
         if FIRESTORE_AVAILABLE:
-            # Firestoreから取得
-            query = db.collection('survey_responses').order_by('createdAt', direction=firestore.Query.DESCENDING)
-            docs = query.limit(limit).offset(offset).stream()
-            
-            responses = []
+            doc_ref = await within_deadline(run_in_threadpool(
+                lambda: db.collection(survey_collection(survey_id)).add(response_data, timeout=storage_timeout())
+            ))
+            doc_id = doc_ref[1].id
+        else:
+            storage = survey_mock_storage(survey_id)
+            # 件数からの採番は同時送信で重複しうるため、ランダムなIDとする
+            doc_id = f"mock_{survey_id}_{uuid.uuid4().hex}"
+            response_data["id"] = doc_id
+            storage.append(response_data)
+
+        return ApiResponse(
+            success=True,
+            message="アンケート回答を保存しました",
+            data={"id": doc_id}
+        )
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error saving survey response for {survey_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="サーバーエラーが発生しました"
+        )
+
+def load_survey_results_by_id(compiled: CompiledSurvey, limit: int, offset: int) -> Dict[str, Any]:
+    """アンケートごとのコレクションから回答を取得し、コンパイル済みの集計プランで統計を計算"""
+    survey_id = compiled.definition.id
+    if FIRESTORE_AVAILABLE:
+        if survey_id == DEFAULT_SURVEY_ID:
+            # 既定のアンケートは月単位のパーティションに保存されている
+            docs = fetch_partitioned_docs(limit, offset, None, [])
+        else:
+            query = db.collection(survey_collection(survey_id)).order_by('createdAt', direction=firestore.Query.DESCENDING)
+            docs = query.limit(limit).offset(offset).stream(timeout=storage_timeout())
+        responses = []
+        for doc in docs:
+            data = doc.to_dict()
+            data['id'] = doc.id
+            responses.append(data)
+    elif survey_id == DEFAULT_SURVEY_ID and isinstance(mock_storage, SQLiteStore):
+        # スライスでは全件を読み取るため、ページングをSQLで実行する
+        responses = mock_storage.query([], limit, offset)
+    else:
+        responses = survey_mock_storage(survey_id)[offset:offset + limit]
+
+    return {
+        "responses": responses,
+        "statistics": compiled.plan.compute(responses),
+        "pagination": {
+            "limit": limit,
+            "offset": offset,
+            "total": len(responses)
+        }
+    }
+
+# アンケートIDを指定した結果の取得
+@app.get("/surveys/{survey_id}/results", response_model=ApiResponse)
+async def get_survey_results_by_id(
+    survey_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """アンケートごとの回答と統計を取得（管理者用）"""
+    compiled = get_compiled_survey(survey_id)
+    try:
+        # アンケートごとに読み取りを集約し、他のアンケートの読み取りとは共有しない
+        key = ("survey_results_by_id", survey_id, limit, offset)
+        data = await within_deadline(
+            read_coalescer.do(key, lambda: load_survey_results_by_id(compiled, limit, offset))
+        )
+
+        return ApiResponse(
+            success=True,
+            data=data
+        )
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error fetching survey results for {survey_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="データの取得に失敗しました"
+        )
+
+def _firestore_increments(counters: Dict[str, Any]) -> Dict[str, Any]:
+    """カウンタの加算値をFirestoreのIncrementに変換"""
+    return {
+        key: _firestore_increments(value) if isinstance(value, dict) else firestore.Increment(value)
+        for key, value in counters.items()
+    }
+
+async def record_rollups(response_data: Dict[str, Any], sign: int = 1) -> None:
+    """回答を時間・日単位のロールアップに加算する（sign=-1で置き換えた回答を減算する）"""
+    increments = merge_rollup({}, rollup_increments(response_data), sign)
+    buckets = rollup_bucket_keys(response_data["timestamp"])
+
+    if FIRESTORE_AVAILABLE:
+        # 時間・日のロールアップを1回のバッチで更新
+        batch = db.batch()
+        for granularity in ROLLUP_GRANULARITIES:
+            bucket = buckets[granularity]
+            doc_ref = db.collection(ROLLUP_COLLECTION).document(rollup_document_id(granularity, bucket))
+            batch.set(doc_ref, {
+                "granularity": granularity,
+                "bucket": bucket,
+                **_firestore_increments(increments)
+            }, merge=True)
+        # 回答の保存後の集計のため、リクエストの残り時間ではなくFIRESTORE_TIMEOUTで打ち切る
+        # （イベントループをブロックしないようスレッドプールで実行）
+        await run_in_threadpool(batch.commit, timeout=FIRESTORE_TIMEOUT)
+    else:
+        for granularity in ROLLUP_GRANULARITIES:
+            bucket = buckets[granularity]
+            rollup = mock_rollups.setdefault(
+                rollup_document_id(granularity, bucket),
+                {"granularity": granularity, "bucket": bucket}
+            )
+            merge_rollup(rollup, increments)
+
+def fetch_rollups(doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """バケット数分のロールアップを1回のバッチ読み取りで取得する"""
+    collection = db.collection(ROLLUP_COLLECTION)
+    snapshots = db.get_all([collection.document(doc_id) for doc_id in doc_ids], timeout=storage_timeout())
+    return {snapshot.id: snapshot.to_dict() for snapshot in snapshots if snapshot.exists}
+
+def user_sketch_document_id(day: str, user_id: str) -> str:
+    """ユーザーを振り分けるスケッチのドキュメントID（同じユーザーは常に同じ分割先）"""
+    return f"{day}_{zlib.crc32(user_id.encode('utf-8')) % USER_SKETCH_SHARDS:02d}"
+
+async def record_user_sketch(response_data: Dict[str, Any]) -> None:
+    """回答者を日単位のユニークユーザー数スケッチに追加する"""
+    day = rollup_bucket_keys(response_data["timestamp"])["day"]
+    user_id = response_data["userId"]
+
+    if not FIRESTORE_AVAILABLE:
+        mock_user_sketches.setdefault(day, HyperLogLog()).add(user_id)
+        return
+
+    doc_ref = db.collection(USER_SKETCH_COLLECTION).document(user_sketch_document_id(day, user_id))
+
+    @firestore.transactional
+    def update_sketch(transaction):
+        snapshot = doc_ref.get(transaction=transaction, timeout=FIRESTORE_TIMEOUT)
+        registers = snapshot.to_dict().get("registers") if snapshot.exists else None
+        sketch = HyperLogLog.from_bytes(registers) if registers else HyperLogLog()
+        # 既存ユーザーなどレジスタが変化しない場合は書き込みを省略
+        if sketch.add(user_id):
+            transaction.set(doc_ref, {"date": day, "registers": sketch.to_bytes()})
+
+    # トランザクションの読み取りと再試行でイベントループをブロックしないようスレッドプールで実行
+    await run_in_threadpool(update_sketch, db.transaction())
+
+def fetch_user_sketches(days: List[str]) -> HyperLogLog:
+    """期間内の日単位のスケッチ（分割したドキュメントと分割前の {day} のドキュメント）をマージする"""
+    merged = HyperLogLog()
+    wanted = set(days)
+    query = (
+        db.collection(USER_SKETCH_COLLECTION)
+        .where('date', '>=', min(days))
+        .where('date', '<=', max(days))
+    )
+    for snapshot in query.stream(timeout=storage_timeout()):
+        data = snapshot.to_dict()
+        if data.get("date") in wanted and data.get("registers"):
+            merged.merge(HyperLogLog.from_bytes(data["registers"]))
+    return merged
+
+async def count_unique_users(days: List[str]) -> int:
+    """日単位のスケッチをマージして期間内のユニークユーザー数を推定"""
+    if not days:
+        return 0
+
+    if FIRESTORE_AVAILABLE:
+        merged = await within_deadline(run_in_threadpool(fetch_user_sketches, days))
+    else:
+        merged = HyperLogLog()
+        for day in days:
+            if day in mock_user_sketches:
+                merged.merge(mock_user_sketches[day])
+
+    return merged.count()
+
+def timeseries_bucket_keys(start: str, end: str, granularity: str) -> List[str]:
+    """期間内のバケットキーを古い順に列挙"""
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d")
+        end_date = datetime.strptime(end, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="start・endはYYYY-MM-DD形式で指定してください"
+        )
+
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="endはstart以降の日付を指定してください"
+        )
+
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+    stop = end_date + timedelta(days=1)
+    if (stop - start_date) // step > MAX_TIMESERIES_BUCKETS[granularity]:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"期間が長すぎます（{granularity}単位では最大{MAX_TIMESERIES_BUCKETS[granularity]}件）"
+        )
+
+    keys = []
+    current = start_date
+    while current < stop:
+        keys.append(current.strftime("%Y-%m-%dT%H" if granularity == "hour" else "%Y-%m-%d"))
+        current += step
+    return keys
+
+def load_overall_statistics() -> Statistics:
+    """全回答を走査して統計を計算（集計に必要なフィールドのみ射影して取得）
+
+    アーカイブ済みのパーティションは走査せず、アーカイブ時に保存した集計結果を合算する
+    （その場合のunique_usersはHyperLogLogによる推定値）。
+    """
+    fields = ['age', 'gender', 'frequency', 'satisfaction', 'userId', 'timestamp']
+    if FIRESTORE_AVAILABLE:
+        collections = response_collections()
+        docs = (doc for collection in collections for doc in collection.select(fields).stream(timeout=storage_timeout()))
+        archived = response_partitions.archived_summaries() if RESPONSE_PARTITIONING != "none" else []
+        if archived:
+            accumulator = StatisticsAccumulator()
             for doc in docs:
-                data = doc.to_dict()
-                data['id'] = doc.id
-                responses.append(SurveyResponse(**data))
+                accumulator.add(doc.to_dict())
+            for summary in archived:
+                accumulator.merge(StatisticsAccumulator.from_dict(summary))
+            return Statistics(**accumulator.to_statistics())
+        rows = [SurveyRow(doc.to_dict(), doc.id) for doc in docs]
+    elif isinstance(mock_storage, SQLiteStore):
+        # 回答を読み込まずにGROUP BYで集計する
+        return Statistics(**mock_storage.statistics())
+    else:
+        rows = [SurveyRow(response) for response in mock_storage]
+    return calculate_statistics(rows)
+
+# 全体統計の取得
+@app.get("/survey/statistics", response_model=ApiResponse)
+async def get_overall_statistics():
+    """全回答の統計を取得（管理者用）
+
+    マテリアライズドビューが利用可能な場合はメモリ上のカウンタから応答する。
+    """
+    try:
+        if materialized_view.ready:
+            stats = Statistics(**materialized_view.statistics())
         else:
-            # モックストレージから取得
-            start_idx = offset
-            end_idx = offset + limit
-            mock_responses = mock_storage[start_idx:end_idx]
-            responses = [SurveyResponse(**response) for response in mock_responses]
+            stats = await within_deadline(read_coalescer.do(("overall_statistics",), load_overall_statistics))
+
+        return ApiResponse(
+            success=True,
+            data=stats
+        )
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error fetching overall statistics: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="統計データの取得に失敗しました"
+        )
+
+# マテリアライズドビューの再同期
+@app.post("/admin/materialized-view/resync", response_model=ApiResponse)
+async def resync_materialized_view():
+    """マテリアライズドビューを初期化してスナップショットリスナーを張り直す（管理者用）"""
+    if not (MATERIALIZED_VIEW_ENABLED and FIRESTORE_AVAILABLE) or RESPONSE_PARTITIONING != "none":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="マテリアライズドビューは無効です"
+        )
+
+    materialized_view.resync(response_collection())
+    return ApiResponse(
+        success=True,
+        message="マテリアライズドビューの再同期を開始しました",
+        data=materialized_view.metrics()
+    )
+
+# リクエストのプロファイル
+@app.get("/admin/profiles", response_model=ApiResponse)
+async def list_profiles():
+    """保持しているプロファイルの一覧（新しい順、管理者用）"""
+    return ApiResponse(
+        success=True,
+        data={
+            "sampleRate": request_profiler.sample_rate,
+            "debugHeaderEnabled": bool(request_profiler.debug_secret),
+            "profiles": request_profiler.summaries()
+        }
+    )
+
+@app.get("/admin/profiles/collapsed", response_class=PlainTextResponse)
+async def get_merged_profile(request: Optional[str] = None):
+    """保持している全てのプロファイル（requestで "GET /survey/results" などに絞り込み可）を合算したcollapsed形式のスタック"""
+    profiles = [p for p in request_profiler.profiles if request is None or p["request"] == request]
+    return PlainTextResponse(request_profiler.collapsed(profiles))
+
+@app.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: int):
+    """1リクエスト分のcollapsed形式のスタック（flamegraph.pl・speedscopeで表示できる）"""
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="プロファイルが見つかりません"
+        )
+    return PlainTextResponse(request_profiler.collapsed([profile]))
+
+def load_satisfaction_tracker() -> None:
+    """日単位のロールアップから満足度の集計を復元する（他インスタンスへの送信分を含める）"""
+    global satisfaction_tracker, satisfaction_tracker_loaded_at
+    tracker = SatisfactionTracker(window_days=satisfaction_tracker.window_days)
+
+    if FIRESTORE_AVAILABLE:
+        query = db.collection(ROLLUP_COLLECTION).where('granularity', '==', 'day').select(['bucket', 'satisfaction'])
+        rollups = (doc.to_dict() for doc in query.stream(timeout=storage_timeout()))
+    else:
+        rollups = (rollup for rollup in mock_rollups.values() if rollup["granularity"] == "day")
+
+    for rollup in sorted(rollups, key=lambda r: r["bucket"]):
+        tracker.add_distribution(rollup["bucket"], rollup.get("satisfaction") or {})
 
-        # 統計データを計算
-        stats = calculate_statistics(responses)
+    satisfaction_tracker = tracker
+    satisfaction_tracker_loaded_at = time.monotonic()
+
+# 満足度の分位点・NPS・直近7日間の平均
+@app.get("/survey/statistics/satisfaction", response_model=ApiResponse)
+async def get_satisfaction_statistics():
+    """満足度の分位点（p25・p50・p75・p90）、NPS、直近7日間の平均を取得（管理者用）
+
+    NPSは満足度5を推奨者、1〜3を批判者として (推奨者 - 批判者) / 回答数 × 100 で求める。
+    """
+    try:
+        if satisfaction_tracker_loaded_at is None or time.monotonic() - satisfaction_tracker_loaded_at >= SATISFACTION_REFRESH_INTERVAL:
+            await within_deadline(read_coalescer.do(("satisfaction_tracker",), load_satisfaction_tracker))
 
         return ApiResponse(
             success=True,
-            data=SurveyResultsResponse(
-                responses=responses,
-                statistics=stats,
-                pagination={
-                    "limit": limit,
-                    "offset": offset,
-                    "total": len(responses)
-                }
+            data=satisfaction_tracker.summary(datetime.now().strftime("%Y-%m-%d"))
+        )
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error fetching satisfaction statistics: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="満足度の統計の取得に失敗しました"
+        )
+
+# 統計のライブ配信
+@app.get("/survey/statistics/stream")
+async def stream_statistics(request: Request):
+    """回答の送信ごとに統計の差分をServer-Sent Eventsで配信（管理者用）
+
+    各イベントのdataはStatisticsの差分（total_responses、各分布、satisfaction_sum、responses_by_date）。
+    受信が遅れてバッファが溢れた接続には dropped イベントを送って切断する。
+    """
+    subscription = statistics_broadcaster.subscribe()
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="接続数が上限に達しています",
+            headers={"Retry-After": "5"}
+        )
+
+    return StreamingResponse(
+        statistics_broadcaster.stream(subscription, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 時系列統計の取得（ロールアップの合算）
+@app.get("/survey/statistics/timeseries", response_model=ApiResponse)
+async def get_statistics_timeseries(start: str, end: str, granularity: str = "day"):
+    """期間内の統計を時間・日単位のロールアップから取得（管理者用）"""
+    try:
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="granularityはhourまたはdayを指定してください"
             )
+
+        buckets = timeseries_bucket_keys(start, end, granularity)
+        doc_ids = [rollup_document_id(granularity, bucket) for bucket in buckets]
+
+        if FIRESTORE_AVAILABLE:
+            rollups = await within_deadline(run_in_threadpool(fetch_rollups, doc_ids))
+        else:
+            rollups = {doc_id: mock_rollups[doc_id] for doc_id in doc_ids if doc_id in mock_rollups}
+
+        total = {}
+        series = []
+        responses_by_date = {}
+        for bucket, doc_id in zip(buckets, doc_ids):
+            rollup = rollups.get(doc_id) or {}
+            merge_rollup(total, rollup)
+
+            count = rollup.get("total", 0)
+            series.append({
+                "bucket": bucket,
+                "total_responses": count,
+                "average_satisfaction": round(rollup.get("satisfaction_sum", 0) / count, 2) if count else 0.0
+            })
+            if count:
+                date_key = bucket.split('T')[0]
+                responses_by_date[date_key] = responses_by_date.get(date_key, 0) + count
+
+        return ApiResponse(
+            success=True,
+            data={
+                "granularity": granularity,
+                "start": start,
+                "end": end,
+                "series": series,
+                "statistics": Statistics(
+                    **rollup_statistics(total, responses_by_date),
+                    unique_users=await count_unique_users(list(dict.fromkeys(bucket.split('T')[0] for bucket in buckets)))
+                )
+            }
         )
 
     except HTTPException:
-        # HTTPExceptionは再度raiseして適切な処理に委ねる
+        raise
+    except DeadlineExceeded:
         raise
     except Exception as e:
-        print(f"Error fetching survey results: {str(e)}")
+        print(f"Error fetching statistics timeseries: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="データの取得に失敗しました"
+            detail="統計データの取得に失敗しました"
         )
 
-def calculate_statistics(responses: List[SurveyResponse]) -> Statistics:
-    """統計データを計算"""
+def calculate_statistics(responses: List[Union[SurveyResponse, SurveyRow]]) -> Statistics:
+    """統計データを計算
+
+    射影クエリの行（SurveyRow）では取得していないフィールドがNoneになるため、
+    該当する集計はスキップする。
+    """
     if not responses:
         return Statistics(
             total_responses=0,
@@ -419,7 +1899,8 @@ def calculate_statistics(responses: List[SurveyResponse]) -> Statistics:
             frequency_distribution={},
             satisfaction_distribution={},
             average_satisfaction=0.0,
-            responses_by_date={}
+            responses_by_date={},
+            unique_users=0
         )
 
     age_dist = {}
@@ -428,29 +1909,41 @@ def calculate_statistics(responses: List[SurveyResponse]) -> Statistics:
     satisfaction_dist = {}
     responses_by_date = {}
     satisfaction_sum = 0
+    satisfaction_count = 0
+    user_ids = set()
 
     for response in responses:
         # 年齢分布
-        age_dist[response.age] = age_dist.get(response.age, 0) + 1
+        if response.age is not None:
+            age_dist[response.age] = age_dist.get(response.age, 0) + 1
         
         # 性別分布
-        gender_dist[response.gender] = gender_dist.get(response.gender, 0) + 1
+        if response.gender is not None:
+            gender_dist[response.gender] = gender_dist.get(response.gender, 0) + 1
         
         # 利用頻度分布
-        frequency_dist[response.frequency] = frequency_dist.get(response.frequency, 0) + 1
+        if response.frequency is not None:
+            frequency_dist[response.frequency] = frequency_dist.get(response.frequency, 0) + 1
         
-        # 満足度分布
-        satisfaction_dist[response.satisfaction] = satisfaction_dist.get(response.satisfaction, 0) + 1
-        
-        # 満足度合計
-        satisfaction_sum += int(response.satisfaction)
+        if response.satisfaction is not None:
+            # 満足度分布
+            satisfaction_dist[response.satisfaction] = satisfaction_dist.get(response.satisfaction, 0) + 1
+            
+            # 満足度合計
+            satisfaction_sum += int(response.satisfaction)
+            satisfaction_count += 1
         
         # 日付別回答数
-        date_key = response.timestamp.split('T')[0]  # YYYY-MM-DD
-        responses_by_date[date_key] = responses_by_date.get(date_key, 0) + 1
+        if response.timestamp is not None:
+            date_key = response.timestamp.split('T')[0]  # YYYY-MM-DD
+            responses_by_date[date_key] = responses_by_date.get(date_key, 0) + 1
+
+        # ユニークユーザー
+        if response.userId is not None:
+            user_ids.add(response.userId)
 
     # 平均満足度を計算
-    avg_satisfaction = round(satisfaction_sum / len(responses), 2) if responses else 0.0
+    avg_satisfaction = round(satisfaction_sum / satisfaction_count, 2) if satisfaction_count else 0.0
 
     return Statistics(
         total_responses=len(responses),
@@ -459,7 +1952,9 @@ def calculate_statistics(responses: List[SurveyResponse]) -> Statistics:
         frequency_distribution=frequency_dist,
         satisfaction_distribution=satisfaction_dist,
         average_satisfaction=avg_satisfaction,
-        responses_by_date=responses_by_date
+        responses_by_date=responses_by_date,
+        unique_users=len(user_ids) if user_ids else None,
+        **satisfaction_summary(ScoreHistogram(counts=satisfaction_dist))
     )
 
 # エラーハンドラー
@@ -471,7 +1966,16 @@ async def http_exception_handler(request, exc):
             success=False,
             error=exc.detail,
             message=exc.detail
-        ).model_dump()
+        ).model_dump(),
+        headers=getattr(exc, "headers", None)
+    )
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc):
+    message = "リクエストの処理が時間内に完了しませんでした"
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content=ApiResponse(success=False, error=message, message=message).model_dump()
     )
 
 @app.exception_handler(Exception)
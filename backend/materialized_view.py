@@ -0,0 +1,179 @@
+"""survey_responses のプロセス内マテリアライズドビュー
+
+Firestoreのスナップショットリスナー（on_snapshot）で変更を受け取り、
+ユーザー別の回答インデックスと全体の統計カウンタをメモリ上で最新に保つ。
+読み取りの多いエンドポイントはFirestoreへ問い合わせずにメモリから応答できる。
+
+- ウォームアップ: リスナー開始時の初回スナップショットで全件を読み込み、完了後にready=Trueとなる。
+- 再同期: resync()でリスナーを張り直し、ビューを初期化して読み込み直す。
+- メモリ上限: 保持件数がmax_documentsを超えた場合はビューを無効化し（ready=False）、
+  呼び出し元はFirestoreへの問い合わせにフォールバックする。
+- 障害: 変更の反映に失敗した（形式の異なるドキュメントなど）・リスナーが停止した場合は
+  ビューを無効化してフォールバックし、retry_delay秒後（失敗が続くと倍に延ばす）にリスナーを張り直す。
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from analytics import merge_rollup, rollup_bucket_keys, rollup_increments, rollup_statistics
+
+
+class MaterializedView:
+    """ユーザー別の最新回答インデックスと統計カウンタ"""
+
+    def __init__(self, max_documents: int = 100000, retry_delay: float = 5.0, max_retry_delay: float = 300.0):
+        self.max_documents = max_documents
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._lock = threading.Lock()
+        self._watch = None
+        self._collection_ref = None
+        self._retry: Optional[threading.Timer] = None
+        self._next_retry_delay = retry_delay
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._clear()
+
+    def _clear(self) -> None:
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._by_user: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._rollup: Dict[str, Any] = {}
+        self._responses_by_date: Dict[str, int] = {}
+        self._ready = False
+        self.overflowed = False
+        self.failed = False
+        self.last_update: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        """メモリから応答できるか（リスナーが停止していれば張り直しを予約してFalse）"""
+        if self._ready and self._watch is not None and not getattr(self._watch, "is_active", True):
+            self._fail(RuntimeError("snapshot listener stopped"))
+        return self._ready
+
+    # --- 変更の適用 ---
+
+    def _apply(self, doc_id: str, data: Dict[str, Any], sign: int) -> None:
+        merge_rollup(self._rollup, rollup_increments(data), sign)
+        day = rollup_bucket_keys(data["timestamp"])["day"]
+        self._responses_by_date[day] = self._responses_by_date.get(day, 0) + sign
+        if not self._responses_by_date[day]:
+            del self._responses_by_date[day]
+
+        user_docs = self._by_user.setdefault(data.get("userId"), {})
+        if sign > 0:
+            self._docs[doc_id] = data
+            user_docs[doc_id] = data
+        else:
+            del self._docs[doc_id]
+            del user_docs[doc_id]
+            if not user_docs:
+                del self._by_user[data.get("userId")]
+
+    def apply_change(self, change_type: str, doc_id: str, data: Optional[Dict[str, Any]]) -> None:
+        """1件の変更（ADDED / MODIFIED / REMOVED）を反映する"""
+        with self._lock:
+            if self.overflowed or self.failed:
+                return
+
+            previous = self._docs.get(doc_id)
+            if previous is not None:
+                self._apply(doc_id, previous, -1)
+            if change_type != "REMOVED" and data is not None:
+                self._apply(doc_id, {**data, "id": doc_id}, 1)
+
+            if len(self._docs) > self.max_documents:
+                # 上限超過時は誤った応答を避けるためビューを無効化する
+                print(f"Materialized view exceeded {self.max_documents} documents; disabling")
+                self._clear()
+                self.overflowed = True
+            self.last_update = time.time()
+
+    def on_snapshot(self, col_snapshot, changes, read_time) -> None:
+        """Firestoreのスナップショットリスナーのコールバック"""
+        try:
+            for change in changes:
+                self.apply_change(change.type.name, change.document.id, change.document.to_dict())
+        except Exception as e:
+            # 途中まで反映したビューは正しくないため、無効化して張り直す
+            self._fail(e)
+            return
+        with self._lock:
+            if not (self.overflowed or self.failed):
+                # 初回スナップショット（全件）の反映でウォームアップ完了
+                self._ready = True
+                self._next_retry_delay = self.retry_delay
+
+    def _fail(self, error: Exception) -> None:
+        """ビューを無効化し、リスナーの張り直しを予約する"""
+        with self._lock:
+            if self.failed:
+                return
+            self._clear()
+            self.failed = True
+            self.failures += 1
+            self.last_error = repr(error)
+            delay = self._next_retry_delay
+            self._next_retry_delay = min(delay * 2, self.max_retry_delay)
+            # コールバックのスレッドからはリスナーを停止できないため、別スレッドで張り直す
+            self._retry = threading.Timer(delay, self._resubscribe)
+            self._retry.daemon = True
+            self._retry.start()
+        print(f"Materialized view failed ({error!r}); resubscribing in {delay:.0f}s")
+
+    def _resubscribe(self) -> None:
+        with self._lock:
+            collection_ref, self._retry = self._collection_ref, None
+        if collection_ref is not None:
+            self.resync(collection_ref)
+
+    # --- リスナーの管理 ---
+
+    def start(self, collection_ref) -> None:
+        """スナップショットリスナーを開始する"""
+        self._collection_ref = collection_ref
+        self._watch = collection_ref.on_snapshot(self.on_snapshot)
+
+    def stop(self) -> None:
+        with self._lock:
+            retry, self._retry = self._retry, None
+        if retry is not None:
+            retry.cancel()
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def resync(self, collection_ref) -> None:
+        """ビューを初期化してリスナーを張り直す"""
+        self.stop()
+        with self._lock:
+            self._clear()
+        self.start(collection_ref)
+
+    # --- 読み取り ---
+
+    def user_responses(self, user_id: str) -> List[Dict[str, Any]]:
+        """ユーザーの回答を新しい順に返す"""
+        with self._lock:
+            docs = list(self._by_user.get(user_id, {}).values())
+        return sorted(docs, key=lambda x: x.get("createdAt", ""), reverse=True)
+
+    def statistics(self) -> Dict[str, Any]:
+        """全回答の統計（Statisticsモデルの形式）"""
+        with self._lock:
+            stats = rollup_statistics(self._rollup, dict(self._responses_by_date))
+            stats["unique_users"] = len(self._by_user)
+        return stats
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self._ready,
+                "overflowed": self.overflowed,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "documents": len(self._docs),
+                "users": len(self._by_user),
+                "max_documents": self.max_documents,
+                "last_update": self.last_update,
+            }
@@ -0,0 +1,110 @@
+"""回答の月単位パーティション
+
+RESPONSE_PARTITIONING=monthly の場合、回答は survey_partitions/{YYYY-MM}/responses
+（回答月ごとのサブコレクション）に保存する。サブコレクション名を共通にしているため、
+複合インデックスはコレクショングループ responses に1組定義すれば全ての月に適用される。
+
+survey_partitions/{YYYY-MM} はパーティションの台帳を兼ね、アーカイブ済みの月は
+status と集計結果（StatisticsAccumulator.to_dict()）を持つ。読み取りは台帳で有効な月
+（と当月）のみを対象とし、期間の絞り込みがあれば範囲外の月は読まない。
+main.py に依存しないため、アーカイブジョブからも利用できる。
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+PARTITION_COLLECTION = "survey_partitions"
+PARTITION_SUBCOLLECTION = "responses"
+
+# 台帳のstatus（未設定は有効）
+STATUS_ACTIVE = "active"
+STATUS_ARCHIVED = "archived"  # エクスポート済み（TTLの経過後に回答を削除する）
+STATUS_DELETED = "deleted"  # 回答を削除済み
+
+
+def partition_key(created_at: str) -> str:
+    """createdAt（ISO 8601）の回答月（YYYY-MM）"""
+    return created_at[:7]
+
+
+def partition_path(key: str) -> str:
+    """パーティションの回答を保存するコレクションのパス"""
+    return f"{PARTITION_COLLECTION}/{key}/{PARTITION_SUBCOLLECTION}"
+
+
+def shift_month(key: str, months: int) -> str:
+    """YYYY-MMをmonthsか月ずらした月"""
+    year, month = int(key[:4]), int(key[5:7])
+    index = year * 12 + (month - 1) + months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class PartitionRegistry:
+    """パーティションの台帳（survey_partitions）のキャッシュ
+
+    台帳の読み込みはrefresh_intervalごとに1回とする。他のインスタンスが作成した当月の
+    パーティションを見落とさないよう、live()は台帳になくても当月を含める。
+    """
+
+    def __init__(self, refresh_interval: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.refresh_interval = refresh_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._registered: Set[str] = set()
+        self._loaded_at: Optional[float] = None
+
+    @property
+    def stale(self) -> bool:
+        return self._loaded_at is None or self._clock() - self._loaded_at >= self.refresh_interval
+
+    def load(self, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """台帳のドキュメント（ID, 内容）で置き換える"""
+        entries = {key: data for key, data in documents}
+        with self._lock:
+            self._entries = entries
+            self._registered |= set(entries)
+            self._loaded_at = self._clock()
+
+    def register(self, key: str) -> bool:
+        """書き込み先の月を記録し、台帳への追加が必要な（このプロセスで初めての）場合はTrue"""
+        with self._lock:
+            if key in self._registered:
+                return False
+            self._registered.add(key)
+            return True
+
+    def forget(self, key: str) -> None:
+        """台帳への追加に失敗した月を未記録に戻す"""
+        with self._lock:
+            self._registered.discard(key)
+
+    def live(self, current: str, since: Optional[str] = None, until: Optional[str] = None) -> List[str]:
+        """読み取り対象の月を新しい順に返す（since・untilはcreatedAtの範囲）"""
+        with self._lock:
+            keys = {
+                key for key, data in self._entries.items()
+                if data.get("status", STATUS_ACTIVE) == STATUS_ACTIVE
+            }
+        keys.add(current)
+        if since is not None:
+            keys = {key for key in keys if key >= partition_key(since)}
+        if until is not None:
+            keys = {key for key in keys if key <= partition_key(until)}
+        return sorted(keys, reverse=True)
+
+    def archived(self) -> List[str]:
+        """アーカイブ済み（削除済みを含む）の月"""
+        with self._lock:
+            return sorted(
+                key for key, data in self._entries.items()
+                if data.get("status", STATUS_ACTIVE) != STATUS_ACTIVE
+            )
+
+    def archived_summaries(self) -> List[Dict[str, Any]]:
+        """アーカイブ済みの月の集計結果"""
+        with self._lock:
+            return [
+                data["summary"] for _, data in sorted(self._entries.items())
+                if data.get("status", STATUS_ACTIVE) != STATUS_ACTIVE and data.get("summary")
+            ]
@@ -0,0 +1,242 @@
+"""リクエスト単位のサンプリングプロファイラー
+
+一定の割合のリクエスト、または署名付きのデバッグヘッダーを持つリクエストについて、
+処理中に別スレッドから一定間隔でスタックを採取し、flamegraph.pl・speedscopeで読み込める
+collapsed形式（"frame;frame;frame 件数"）で件数上限付きのリングバッファに保持する。
+
+イベントループのスレッドのスタックは、ミドルウェアのフレームを含む場合のみそのリクエストに
+計上する。スレッドプールで実行中のアプリケーションのコードは "[thread]" の下に計上する
+（同時に処理中の他のリクエストの分も含まれうる）。どちらでもない間は "[await]"（I/O待ち）となる。
+サンプリングしないリクエストは乱数の判定とヘッダーの参照のみで素通りする。
+"""
+import hashlib
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+DEBUG_HEADER = "x-debug-profile"
+MAX_STACK_DEPTH = 128
+
+
+def sign_debug_token(secret: str, ttl: int = 300, now: Optional[float] = None) -> str:
+    """デバッグヘッダーの値（"<有効期限のUNIX時刻>.<HMAC-SHA256>"）を作成"""
+    expires = int((now if now is not None else time.time()) + ttl)
+    digest = hmac.new(secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{digest}"
+
+
+def verify_debug_token(secret: str, token: str, now: Optional[float] = None) -> bool:
+    """デバッグヘッダーの署名と有効期限を検証"""
+    expires, _, digest = token.partition(".")
+    if not expires.isdigit():
+        return False
+    if int(expires) < (now if now is not None else time.time()):
+        return False
+    expected = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, digest)
+
+
+class _ActiveProfile:
+    """処理中のサンプリング対象のリクエスト"""
+
+    def __init__(self, profile_id: int, label: str, trigger: str, frame, thread_id: int):
+        self.profile_id = profile_id
+        self.label = label
+        self.trigger = trigger
+        self.frame = frame
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = datetime.now().isoformat()
+        self.started = time.perf_counter()
+
+
+class RequestProfiler:
+    """サンプリング対象のリクエストを処理中の間だけスタックを採取するプロファイラー
+
+    採取用のスレッドは最初のサンプリング時に起動し、対象のリクエストがない間は待機する。
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        debug_secret: Optional[str] = None,
+        interval: float = 0.005,
+        buffer_size: int = 50,
+        root: Optional[str] = None
+    ):
+        self.sample_rate = sample_rate
+        self.debug_secret = debug_secret
+        self.interval = interval
+        self.profiles: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        # この配下のファイルのフレームをアプリケーションのコードとみなす（スレッドプールの判定用）
+        self.root = root or os.path.dirname(os.path.abspath(__file__))
+        self._active: Dict[int, _ActiveProfile] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[Any, str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or bool(self.debug_secret)
+
+    def should_sample(self, headers: Headers) -> Optional[str]:
+        """サンプリングの契機（"header"・"sampled"、対象外はNone）"""
+        if self.debug_secret:
+            token = headers.get(DEBUG_HEADER)
+            if token and verify_debug_token(self.debug_secret, token):
+                return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def begin(self, label: str, trigger: str, frame) -> _ActiveProfile:
+        active = _ActiveProfile(next(self._ids), label, trigger, frame, threading.get_ident())
+        with self._lock:
+            self._active[active.profile_id] = active
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return active
+
+    def end(self, active: _ActiveProfile, status_code: Optional[int]) -> None:
+        with self._lock:
+            self._active.pop(active.profile_id, None)
+            if not self._active:
+                self._wakeup.clear()
+        self.profiles.append({
+            "id": active.profile_id,
+            "request": active.label,
+            "trigger": active.trigger,
+            "status": status_code,
+            "startedAt": active.started_at,
+            "durationMs": round((time.perf_counter() - active.started) * 1000, 2),
+            "samples": active.samples,
+            "intervalMs": self.interval * 1000,
+            "stacks": dict(active.stacks),
+        })
+
+    def get(self, profile_id: int) -> Optional[Dict[str, Any]]:
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return profile
+        return None
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """新しい順のプロファイルの一覧（スタックを除く）"""
+        return [{k: v for k, v in profile.items() if k != "stacks"} for profile in reversed(self.profiles)]
+
+    @staticmethod
+    def collapsed(profiles: List[Dict[str, Any]]) -> str:
+        """collapsed形式のテキスト（複数のプロファイルは合算する）"""
+        merged: Counter = Counter()
+        for profile in profiles:
+            merged.update(profile["stacks"])
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(merged.items()))
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def _is_app_frame(self, frame) -> bool:
+        filename = frame.f_code.co_filename
+        return filename.startswith(self.root) and "site-packages" not in filename
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                active = list(self._active.values())
+            if active:
+                self._sample(active, own)
+            time.sleep(self.interval)
+
+    def _sample(self, active: List[_ActiveProfile], own: int) -> None:
+        frames = sys._current_frames()
+        loop_threads = {profile.thread_id for profile in active}
+        on_loop: Dict[int, List[str]] = {}
+        threaded: List[List[str]] = []
+
+        for thread_id, frame in frames.items():
+            if thread_id == own:
+                continue
+            codes = []
+            markers = {}
+            has_app_frame = False
+            depth = 0
+            while frame is not None and depth < MAX_STACK_DEPTH:
+                codes.append(frame.f_code)
+                markers[id(frame)] = len(codes)
+                has_app_frame = has_app_frame or self._is_app_frame(frame)
+                frame = frame.f_back
+                depth += 1
+
+            if thread_id in loop_threads:
+                for profile in active:
+                    position = markers.get(id(profile.frame))
+                    if profile.thread_id == thread_id and position is not None:
+                        # ミドルウェアより内側のフレームのみを根元から順に並べる
+                        on_loop[profile.profile_id] = [self._label(code) for code in reversed(codes[:position - 1])]
+            elif has_app_frame:
+                threaded.append([self._label(code) for code in reversed(codes)])
+
+        for profile in active:
+            profile.samples += 1
+            stack = on_loop.get(profile.profile_id)
+            if stack is not None:
+                profile.stacks[";".join([profile.label, *stack])] += 1
+            elif threaded:
+                for thread_stack in threaded:
+                    profile.stacks[";".join([profile.label, "[thread]", *thread_stack])] += 1
+            else:
+                profile.stacks[f"{profile.label};[await]"] += 1
+
+
+class ProfilingMiddleware:
+    """サンプリング対象のリクエストの処理中にRequestProfilerでスタックを採取するASGIミドルウェア"""
+
+    def __init__(self, app: ASGIApp, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profiler = self.profiler
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        trigger = profiler.should_sample(Headers(scope=scope))
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = None
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        # 処理中のスタックにこのフレームが含まれるかで、このリクエストの処理かを判定する
+        active = profiler.begin(f"{scope['method']} {scope['path']}", trigger, sys._getframe())
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profiler.end(active, status_code)
@@ -0,0 +1,108 @@
+"""レート制限とアドミッション制御
+
+トークンバケットによるキー単位（ユーザーID・クライアントIP）のレート制限と、
+同時実行数の上限による負荷制限（ロードシェディング）をまとめる。
+バケットの状態はRateLimitBackendに保持し、複数インスタンスで共有する場合は
+共有ストアを使う実装に差し替える。
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+
+class RateLimitBackend(ABC):
+    """トークンバケットの状態を保持するバックエンドのインターフェース"""
+
+    @abstractmethod
+    def acquire(self, key: str, rate: float, burst: int) -> float:
+        """トークンを1つ消費する。許可した場合は0、拒否した場合は再試行までの秒数を返す"""
+
+    @abstractmethod
+    def reset(self) -> None:
+        """全てのバケットを初期化する"""
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """プロセス内メモリのトークンバケット
+
+    状態はプロセスごとに持つため、server.pyのマルチワーカー構成では各ワーカーが別々のバケットを持ち、
+    実質的な上限はワーカー数倍になる（複数インスタンスの場合はさらにインスタンス数倍）。
+    max_keysを超えた場合は最も長く使われていないバケットを破棄する
+    （破棄されたキーは満タンのバケットから再開する）。
+    """
+
+    def __init__(self, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, rate: float, burst: int) -> float:
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / rate
+
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class RateLimiter:
+    """キー単位のレート制限（rate: 1秒あたりの補充数、burst: バケット容量）"""
+
+    def __init__(self, backend: RateLimitBackend, name: str, rate: float, burst: int):
+        self.backend = backend
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.limited = 0
+
+    def check(self, key: str) -> float:
+        """許可した場合は0、制限した場合は再試行までの秒数を返す"""
+        retry_after = self.backend.acquire(f"{self.name}:{key}", self.rate, self.burst)
+        if retry_after:
+            self.limited += 1
+        return retry_after
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"rate": self.rate, "burst": self.burst, "limited": self.limited}
+
+
+class ConcurrencyLimiter:
+    """同時実行数の上限（超過分は即座に拒否する）"""
+
+    def __init__(self, max_inflight: int):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.inflight >= self.max_inflight:
+                self.shed += 1
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.inflight -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"max_inflight": self.max_inflight, "inflight": self.inflight, "shed": self.shed}
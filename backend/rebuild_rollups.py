@@ -0,0 +1,86 @@
+"""統計ロールアップの再集計ジョブ
+
+survey_responses を走査して時間・日単位のロールアップと、日単位のユニークユーザー数スケッチを作り直す。
+送信時の加算に失敗した場合の補正や、既存データのバックフィルに使用する。
+再集計中の送信分は上書きで失われるため、アクセスの少ない時間帯に実行すること。
+
+使い方:
+    python rebuild_rollups.py --since 2025-08-01
+"""
+import argparse
+from typing import Any, Dict, Tuple
+
+from analytics import (
+    ROLLUP_GRANULARITIES,
+    merge_rollup,
+    rollup_bucket_keys,
+    rollup_document_id,
+    rollup_increments,
+)
+from sketches import HyperLogLog
+import main
+
+# Firestoreの1バッチあたりの書き込み上限
+BATCH_SIZE = 500
+
+
+def rebuild_rollups(since: str) -> int:
+    """since（YYYY-MM-DD）以降の回答からロールアップとスケッチを再計算して上書きする"""
+    rollups: Dict[str, Dict[str, Any]] = {}
+    # スケッチのドキュメントID → (日, スケッチ)
+    sketches: Dict[str, Tuple[str, HyperLogLog]] = {}
+
+    if main.FIRESTORE_AVAILABLE:
+        responses = (
+            doc.to_dict()
+            for collection in main.response_collections(since=since)
+            for doc in collection.where('createdAt', '>=', since).stream()
+        )
+    else:
+        responses = (r for r in main.mock_storage if r.get('createdAt', '') >= since)
+
+    count = 0
+    for response in responses:
+        buckets = rollup_bucket_keys(response["timestamp"])
+        increments = rollup_increments(response)
+        for granularity in ROLLUP_GRANULARITIES:
+            bucket = buckets[granularity]
+            rollup = rollups.setdefault(
+                rollup_document_id(granularity, bucket),
+                {"granularity": granularity, "bucket": bucket}
+            )
+            merge_rollup(rollup, increments)
+        if response.get("userId"):
+            day = buckets["day"]
+            doc_id = main.user_sketch_document_id(day, response["userId"]) if main.FIRESTORE_AVAILABLE else day
+            sketches.setdefault(doc_id, (day, HyperLogLog()))[1].add(response["userId"])
+        count += 1
+
+    if main.FIRESTORE_AVAILABLE:
+        collection = main.db.collection(main.ROLLUP_COLLECTION)
+        items = list(rollups.items())
+        for i in range(0, len(items), BATCH_SIZE):
+            batch = main.db.batch()
+            for doc_id, rollup in items[i:i + BATCH_SIZE]:
+                batch.set(collection.document(doc_id), rollup)
+            batch.commit()
+        collection = main.db.collection(main.USER_SKETCH_COLLECTION)
+        items = list(sketches.items())
+        for i in range(0, len(items), BATCH_SIZE):
+            batch = main.db.batch()
+            for doc_id, (day, sketch) in items[i:i + BATCH_SIZE]:
+                batch.set(collection.document(doc_id), {"date": day, "registers": sketch.to_bytes()})
+            batch.commit()
+    else:
+        main.mock_rollups.update(rollups)
+        main.mock_user_sketches.update((day, sketch) for day, sketch in sketches.values())
+
+    print(f"Rebuilt {len(rollups)} rollup documents and {len(sketches)} user sketches from {count} responses")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="統計ロールアップを再集計する")
+    parser.add_argument("--since", required=True, help="再集計の開始日 (YYYY-MM-DD)")
+    args = parser.parse_args()
+    rebuild_rollups(args.since)
@@ -0,0 +1,123 @@
+"""エクスポートした回答の並列集計（月次レポート用）
+
+NDJSON（1行1回答）またはCSV（ヘッダー行付き）のエクスポートをチャンク単位で読み込み、
+ProcessPoolExecutorで部分統計（StatisticsAccumulator）を集計してから合算する。
+集計はCPUバウンドのため、プロセスを分けることでコア数に応じてスケールする。
+main.py（Firestoreクライアント）には依存しない。
+
+使い方:
+    python report.py responses.ndjson --workers 8 [--output report.json]
+    python report.py responses.csv --format csv --workers 8
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional
+
+from analytics import StatisticsAccumulator
+
+# 1チャンクあたりの回答数（プロセス間の受け渡しコストと並列度のバランス）
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def aggregate_ndjson_lines(lines: List[str]) -> StatisticsAccumulator:
+    """NDJSONの行をパースして部分統計を求める（ワーカープロセスで実行される）"""
+    accumulator = StatisticsAccumulator()
+    loads = json.loads
+    for line in lines:
+        if line.strip():
+            accumulator.add(loads(line))
+    return accumulator
+
+
+def aggregate_rows(rows: List[Dict[str, Any]]) -> StatisticsAccumulator:
+    """パース済みの行から部分統計を求める（ワーカープロセスで実行される）"""
+    accumulator = StatisticsAccumulator()
+    for row in rows:
+        accumulator.add(row)
+    return accumulator
+
+
+def read_chunks(path: str, file_format: str, chunk_size: int) -> Iterator[List[Any]]:
+    """エクスポートをチャンク単位で読み込む
+
+    NDJSONは行のままワーカーへ渡してパースも並列化する。CSVは引用符内の改行を
+    正しく扱うため読み込み側でパースする。拡張子が.gzのファイル（archive_partitions.py の
+    アーカイブなど）は展開しながら読み込む。
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        if file_format == "csv":
+            # 空欄はNoneとして扱う（NDJSONのnullと同じ集計結果にする）
+            rows = ({key: value or None for key, value in row.items()} for row in csv.DictReader(f))
+        else:
+            rows = f
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def aggregate_file(
+    path: str,
+    file_format: str = "ndjson",
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Dict[str, Any]:
+    """エクスポートを集計してStatisticsモデルの形式で返す"""
+    func = aggregate_rows if file_format == "csv" else aggregate_ndjson_lines
+    result = StatisticsAccumulator()
+
+    if workers <= 1:
+        for chunk in read_chunks(path, file_format, chunk_size):
+            result.merge(func(chunk))
+        return result.to_statistics()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in read_chunks(path, file_format, chunk_size):
+            # 読み込みが先行しすぎないよう、実行中のチャンク数をワーカー数の2倍までに抑える
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result.merge(future.result())
+            pending.add(executor.submit(func, chunk))
+        for future in pending:
+            result.merge(future.result())
+
+    return result.to_statistics()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="エクスポートした回答を並列集計する")
+    parser.add_argument("path", help="エクスポートファイル（NDJSONまたはCSV）")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="ファイル形式（未指定時は拡張子から判定）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="ワーカープロセス数")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1チャンクあたりの回答数")
+    parser.add_argument("--output", help="結果のJSONの出力先（未指定時は標準出力）")
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ("csv" if args.path.removesuffix(".gz").endswith(".csv") else "ndjson")
+    started = time.perf_counter()
+    statistics = aggregate_file(args.path, file_format, args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - started
+
+    output = json.dumps(statistics, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    print(f"Aggregated {statistics['total_responses']} responses with {args.workers} workers in {elapsed:.2f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
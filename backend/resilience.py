@@ -0,0 +1,140 @@
+"""外部サービス呼び出しの耐障害性ユーティリティ
+
+サーキットブレーカー、レイテンシの分位点計測、ヘッジリクエストをまとめる。
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """サーキットが開いているため呼び出しを拒否した"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"circuit open (retry after {retry_after:.1f}s)")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """連続失敗で呼び出しを遮断するサーキットブレーカー
+
+    closed: 通常状態。連続失敗がfailure_thresholdに達するとopenへ。
+    open: reset_timeoutの間は即座に拒否する。経過後half_openへ。
+    half_open: half_open_max_calls件の試行のみ通し、成功でclosed、失敗でopenへ戻る。
+    before_call()を通過した呼び出しは、record_success()・record_failure()・release()の
+    いずれかで必ず結果を確定させる（確定しない試行はhalf_openの枠を占有し続ける）。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def before_call(self) -> None:
+        """呼び出し前に実行可否を判定する（拒否時はCircuitOpenError）"""
+        state = self.state
+        if state == self.OPEN:
+            self.rejected += 1
+            raise CircuitOpenError(self.reset_timeout - (self._clock() - self._opened_at))
+        if state == self.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                # 試行中の呼び出しの結果が出るまで拒否する
+                self.rejected += 1
+                raise CircuitOpenError(self.reset_timeout)
+            self._half_open_calls += 1
+
+    def release(self) -> None:
+        """成否を記録せずに試行を終える（呼び出し元の期限切れやキャンセルなど）
+
+        half_openの試行枠を返すのみで、連続失敗数と状態は変えない。
+        """
+        if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record_success(self) -> None:
+        self._state = self.CLOSED
+        self._failures = 0
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyTracker:
+    """直近の呼び出しレイテンシを保持し、分位点を求める"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float, default: float) -> float:
+        """q分位点（サンプル不足の場合はdefault）"""
+        if len(self._samples) < self.min_samples:
+            return default
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: float) -> T:
+    """delay秒以内に完了しない場合、2回目の呼び出しを並行して送る
+
+    先に成功した結果を返し、残りの呼び出しはキャンセルする。
+    両方失敗した場合は最後の例外を送出する。冪等な呼び出しにのみ使用すること。
+    """
+    tasks = {asyncio.ensure_future(call())}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.add(asyncio.ensure_future(call()))
+
+        error: Optional[BaseException] = None
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                tasks.discard(task)
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
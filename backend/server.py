@@ -0,0 +1,123 @@
+"""本番用のサーバー起動（マルチワーカー）
+
+gunicornのマスタープロセスでアプリケーションを読み込んでからワーカーをフォークし（preload）、
+読み込み済みのモジュールをコピーオンライトで共有する。ワーカーはuvloop・httptoolsを使う
+uvicornワーカーで、ワーカー数はコンテナのCPUクォータ（cgroup）から決める。
+
+SIGTERMを受けると新規の接続の受け付けを止め、処理中のリクエストの完了を GRACEFUL_TIMEOUT 秒まで
+待ってから、各ワーカーのlifespan終了処理（ローカルストレージの書き込みキューの反映・
+検索インデックスの保存など）を実行する。
+
+使い方:
+    python server.py
+"""
+import gc
+import math
+import os
+import warnings
+from typing import Any, Dict, Optional
+
+from gunicorn.app.base import BaseApplication
+
+with warnings.catch_warnings():
+    # uvicorn-worker パッケージへの移行を促す警告（機能は同じ）
+    warnings.simplefilter("ignore", DeprecationWarning)
+    from uvicorn.workers import UvicornWorker
+
+
+def cpu_quota() -> Optional[float]:
+    """cgroupで制限されたCPU数（制限がない場合はNone）"""
+    try:
+        # cgroup v2: "<quota> <period>" または "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def worker_count() -> int:
+    """ワーカー数（WEB_CONCURRENCY、未指定時はCPUクォータ・利用可能なCPU数）"""
+    if os.getenv("WEB_CONCURRENCY"):
+        return max(1, int(os.environ["WEB_CONCURRENCY"]))
+    available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = cpu_quota()
+    # 非同期ワーカーはI/O待ちの間も他のリクエストを処理するため、CPUあたり1ワーカーとする
+    return max(1, min(available, math.ceil(quota)) if quota else available)
+
+
+class ProductionUvicornWorker(UvicornWorker):
+    """uvloop・httptoolsを使い、処理中のリクエストの完了をgraceful_timeoutまで待つワーカー"""
+
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = self.cfg.graceful_timeout
+
+
+def storage_workers(workers: int, firestore_available: bool) -> int:
+    """保存先に応じたワーカー数（Firestore以外は1ワーカー）
+
+    メモリ上のストア・SQLite・追記専用ログはプロセスごとに状態（回答・同じユーザーの送信を
+    直列化するロック・検索インデックス・統計の配信）を持つため、複数のワーカーに分けない。
+    """
+    if workers > 1 and not firestore_available:
+        print(f"Warning: storage other than Firestore supports a single worker; starting 1 worker instead of {workers}")
+        return 1
+    return workers
+
+
+def post_fork(server, worker) -> None:
+    import main
+    main.init_worker()
+
+
+def server_options(workers: int) -> Dict[str, Any]:
+    return {
+        "bind": f"0.0.0.0:{os.getenv('PORT', '8080')}",
+        "workers": workers,
+        "worker_class": ProductionUvicornWorker,
+        "preload_app": True,
+        "post_fork": post_fork,
+        # ロードバランサーのアイドルタイムアウト（Cloud Runなどは60秒）より長く保持する
+        "keepalive": int(os.getenv("KEEPALIVE_TIMEOUT", "75")),
+        "backlog": int(os.getenv("BACKLOG", "2048")),
+        "graceful_timeout": int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        "timeout": int(os.getenv("WORKER_TIMEOUT", "60")),
+        "accesslog": "-",
+    }
+
+
+class ProductionServer(BaseApplication):
+    def __init__(self, app, options: Dict[str, Any]):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+if __name__ == "__main__":
+    # マスタープロセスで読み込み、フォーク後のワーカーと共有する
+    import main
+
+    workers = storage_workers(worker_count(), main.FIRESTORE_AVAILABLE)
+    main.prepare_fork()
+    # 読み込み済みのオブジェクトをGCの走査対象から外し、参照カウント以外でページがコピーされないようにする
+    gc.freeze()
+    ProductionServer(main.app, server_options(workers)).run()
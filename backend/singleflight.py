@@ -0,0 +1,102 @@
+"""同一キーの同時読み取りをまとめるシングルフライト
+
+同じキーの読み取りが実行中であれば、後続の呼び出しは新たにバックエンドへ
+問い合わせず、実行中の結果を共有する。Firestoreクライアントは同期APIのため、
+読み取り処理はスレッドプールで実行しイベントループをブロックしない。
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Tuple, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """キーごとに実行中の読み取りを1つに集約する
+
+    結果のオブジェクトは全ての呼び出し元で共有されるため、呼び出し元で変更しないこと。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        """funcを実行する（同じキーが実行中であればその結果を待つ）
+
+        読み取りは呼び出し元とは別のタスクで実行するため、呼び出し元がキャンセル
+        （期限切れなど）しても、同じ結果を待つ他の呼び出し元には影響しない。
+        """
+        loop = asyncio.get_running_loop()
+        # タスクは生成したイベントループでしか待てないため、ループごとに集約する
+        flight_key = (id(loop), key)
+        self.calls += 1
+
+        task = self._inflight.get(flight_key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # 最初の呼び出し元のコンテキスト（リクエストの期限など）を引き継ぐ
+            task = loop.create_task(run_in_threadpool(func))
+            self._inflight[flight_key] = task
+            self.executions += 1
+            task.add_done_callback(lambda t: self._finish(flight_key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, flight_key: Tuple[int, Hashable], task: asyncio.Task) -> None:
+        if self._inflight.get(flight_key) is task:
+            del self._inflight[flight_key]
+        # 呼び出し元が全てキャンセルした場合に例外未取得の警告を出さない
+        if not task.cancelled():
+            task.exception()
+
+    def metrics(self) -> Dict[str, Any]:
+        """集約状況のメトリクス"""
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+class KeyedLock:
+    """キーごとの非同期ロック（同じキーの処理のみを直列化する）
+
+    待機中の呼び出し元がいなくなったキーのロックは破棄するため、キーの数だけ
+    メモリが増え続けることはない。ロックは同じイベントループ内でのみ有効。
+    """
+
+    def __init__(self):
+        # キーごとの [ロック, 保持・待機中の呼び出し元の数]
+        self._locks: Dict[Hashable, List[Any]] = {}
+        self.acquisitions = 0
+        self.contended = 0
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        elif entry[0].locked():
+            self.contended += 1
+        entry[1] += 1
+        self.acquisitions += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "held": len(self._locks),
+        }
@@ -0,0 +1,352 @@
+"""SQLiteによる survey_responses の保存（GCPを使わないセルフホスト向け）
+
+WALモードで開き、読み取りはコネクションプール（呼び出し元のスレッドプールから使用する）、
+書き込みは専用のスレッドで行う。同時に送信された回答はまとめて1つのトランザクションで
+コミット（グループコミット）し、コミット回数を減らす。
+
+インデックスは firestore.indexes.json と同じ (userId, createdAt DESC)・(属性, createdAt DESC)
+を作成し、統計は GROUP BY で集計する。main.mock_storage と同じく回答のリストとして扱える。
+"""
+import asyncio
+import queue
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from analytics import ResponseFilter, satisfaction_summary
+from sketches import ScoreHistogram
+
+TABLE = "survey_responses"
+COLUMNS = (
+    "id", "age", "gender", "frequency", "satisfaction", "feedback",
+    "userId", "displayName", "timestamp", "createdAt",
+)
+# firestore.indexes.json の複合インデックスに対応
+INDEXES = {
+    "idx_user_created": ("userId", "createdAt DESC"),
+    "idx_age_created": ("age", "createdAt DESC"),
+    "idx_gender_created": ("gender", "createdAt DESC"),
+    "idx_frequency_created": ("frequency", "createdAt DESC"),
+    "idx_satisfaction_created": ("satisfaction", "createdAt DESC"),
+    "idx_age_frequency_created": ("age", "frequency", "createdAt DESC"),
+    "idx_created": ("createdAt DESC",),
+}
+# 分布を集計するフィールド
+DISTRIBUTION_FIELDS = ("age", "gender", "frequency", "satisfaction")
+# フィルタ条件で使用できる比較演算子（Firestoreのwhere演算子と対応）
+_OPERATORS = {"==": "=", ">=": ">=", ">": ">", "<=": "<=", "<": "<"}
+
+_SCHEMA = (
+    f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+    "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "id TEXT NOT NULL UNIQUE, "
+    + ", ".join(f"{name} TEXT" for name in COLUMNS[1:])
+    + ")"
+)
+_INSERT = (
+    f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})"
+)
+_DELETE = f"DELETE FROM {TABLE} WHERE id = ?"
+_LATEST_FOR_USER = f"SELECT * FROM {TABLE} WHERE userId = ? ORDER BY createdAt DESC LIMIT 1"
+# 同じユーザーの2回目以降の回答の扱い（insert_once）
+ONCE_POLICIES = ("reject", "overwrite")
+# 1回のクエリで渡すパラメータ数の上限
+_MAX_PARAMS = 500
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    return {name: row[name] for name in row.keys() if name != "seq"}
+
+
+class DuplicateUserResponse(Exception):
+    """insert_once(policy="reject")で、同じユーザーの回答が既にある"""
+
+    def __init__(self, response_id: str):
+        super().__init__(f"user has already responded: {response_id}")
+        self.response_id = response_id
+
+
+# 書き込みキューの要素: (回答, 置き換える回答ID, Future, 同じユーザーの回答の扱い)
+_Write = Tuple[Dict[str, Any], Optional[str], Future, Optional[str]]
+
+
+class SQLiteStore:
+    """SQLiteによる回答ストア
+
+    pool_size: 読み取り用のコネクション数（使用中のコネクションが空くまで待つ）
+    batch_size: 1回のコミットにまとめる書き込みの上限
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, batch_size: int = 256):
+        self.path = path
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.commits = 0
+        self.committed_rows = 0
+
+        self._writer_conn = self._connect()
+        with self._writer_conn:
+            self._writer_conn.execute(_SCHEMA)
+            for name, columns in INDEXES.items():
+                self._writer_conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} ({', '.join(columns)})")
+
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._connections = [self._connect() for _ in range(pool_size)]
+        for conn in self._connections:
+            self._pool.put(conn)
+
+        self._writes: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WALではコミットごとのfsyncを省略してもDBは壊れない（電源断時は直近のコミットが失われうる）
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    # --- 書き込み（グループコミット） ---
+
+    def submit(self, record: Dict[str, Any], replaces: Optional[str] = None, once: Optional[str] = None) -> Future:
+        """回答を書き込みキューに追加し、コミット後に回答IDを返すFutureを返す
+
+        idがない場合はランダムなIDを割り当てる。replacesを指定した場合は、
+        同じトランザクションでそのIDの回答を削除する。
+        onceを指定した場合は、同じトランザクションで同じユーザーの最新の回答を読み、
+        "reject"ならDuplicateUserResponse、"overwrite"なら置き換える。
+        Futureは (回答ID, 置き換えた回答) を返す。
+        """
+        if once is not None and once not in ONCE_POLICIES:
+            raise ValueError(f"once must be one of {ONCE_POLICIES}: {once}")
+        record.setdefault("id", uuid.uuid4().hex)
+        future: Future = Future()
+        self._writes.put((record, replaces, future, once))
+        return future
+
+    async def insert(self, record: Dict[str, Any], replaces: Optional[str] = None) -> str:
+        """イベントループをブロックせずに回答を保存する"""
+        return await asyncio.wrap_future(self.submit(record, replaces))
+
+    async def insert_once(self, record: Dict[str, Any], policy: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """同じユーザーの回答の確認と保存を1つのトランザクションで行い、(回答ID, 置き換えた回答) を返す
+
+        確認は書き込みスレッドのBEGIN IMMEDIATE内で行うため、同じDBを開いた他のプロセスからの
+        同時送信に対しても重複しない。
+        """
+        return await asyncio.wrap_future(self.submit(record, once=policy))
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._writes.get()
+            if item is None:
+                return
+            # 待っている間にたまった書き込みをまとめてコミットする
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._commit(batch)
+                    return
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: List[_Write]) -> None:
+        # 呼び出し元が待つのをやめた（キャンセルした）書き込みは行わない
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # 書き込みごとの結果（回答ID・(回答ID, 置き換えた回答)・DuplicateUserResponse）
+        outcomes: List[Any] = []
+        try:
+            with self._writer_conn:
+                self._writer_conn.execute("BEGIN IMMEDIATE")
+                for record, replaces, _, once in batch:
+                    previous = None
+                    if once is not None:
+                        # 同じバッチの先行する書き込みを含めて、同じユーザーの最新の回答を確認する
+                        row = self._writer_conn.execute(_LATEST_FOR_USER, (record.get("userId"),)).fetchone()
+                        previous = _row_to_dict(row) if row is not None else None
+                        if previous is not None and once == "reject":
+                            outcomes.append(DuplicateUserResponse(previous["id"]))
+                            continue
+                        replaces = previous["id"] if previous is not None else None
+                    if replaces is not None:
+                        self._writer_conn.execute(_DELETE, (replaces,))
+                    self._writer_conn.execute(_INSERT, tuple(record.get(name) for name in COLUMNS))
+                    outcomes.append(record["id"] if once is None else (record["id"], previous))
+        except Exception as e:
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+        self.commits += 1
+        for (_, _, future, _), outcome in zip(batch, outcomes):
+            if isinstance(outcome, DuplicateUserResponse):
+                future.set_exception(outcome)
+            else:
+                self.committed_rows += 1
+                future.set_result(outcome)
+
+    # --- 読み取り ---
+
+    def user_responses(self, user_id: str) -> List[Dict[str, Any]]:
+        """ユーザーの回答を新しい順に取得"""
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM {TABLE} WHERE userId = ? ORDER BY createdAt DESC", (user_id,)
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def get_many(self, ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """回答IDの一覧に該当する回答を id の一意インデックスで取得（回答ID → 回答）"""
+        found: Dict[str, Dict[str, Any]] = {}
+        ids = list(dict.fromkeys(ids))
+        with self._connection() as conn:
+            # SQLiteのパラメータ数の上限（既定999）を超えないよう分けて取得する
+            for i in range(0, len(ids), _MAX_PARAMS):
+                chunk = ids[i:i + _MAX_PARAMS]
+                rows = conn.execute(
+                    f"SELECT * FROM {TABLE} WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+                ).fetchall()
+                found.update((row["id"], _row_to_dict(row)) for row in rows)
+        return found
+
+    def query(
+        self,
+        filters: Sequence[ResponseFilter] = (),
+        limit: int = 100,
+        offset: int = 0,
+        fields: Optional[Sequence[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """条件に一致する回答をcreatedAtの新しい順に取得（fields指定時はその列のみ）"""
+        columns = [name for name in (fields or COLUMNS) if name in COLUMNS]
+        where, params = self._where(filters)
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(columns)} FROM {TABLE}{where} ORDER BY createdAt DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def since(self, watermark: Optional[str], fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """createdAtがwatermarkより後の回答をcreatedAtの古い順に取得（idx_createdで範囲を読む）"""
+        columns = [name for name in (fields or COLUMNS) if name in COLUMNS]
+        where, params = self._where([("createdAt", ">", watermark)] if watermark is not None else [])
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(columns)} FROM {TABLE}{where} ORDER BY createdAt", params
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    @staticmethod
+    def _where(filters: Sequence[ResponseFilter]) -> Tuple[str, List[Any]]:
+        clauses = []
+        params = []
+        for field, op, value in filters:
+            if field not in COLUMNS or op not in _OPERATORS:
+                raise ValueError(f"unsupported filter: {field} {op}")
+            clauses.append(f"{field} {_OPERATORS[op]} ?")
+            params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def statistics(self) -> Dict[str, Any]:
+        """全回答の統計をGROUP BYで集計（Statisticsモデルの形式）"""
+        with self._connection() as conn:
+            # 一連の集計を同じスナップショットから読み取る
+            conn.execute("BEGIN")
+            try:
+                total, satisfaction_sum, satisfaction_count, unique_users = conn.execute(
+                    f"SELECT COUNT(*), SUM(CAST(satisfaction AS INTEGER)), COUNT(satisfaction), "
+                    f"COUNT(DISTINCT userId) FROM {TABLE}"
+                ).fetchone()
+                distributions = {
+                    name: dict(conn.execute(
+                        f"SELECT {name}, COUNT(*) FROM {TABLE} WHERE {name} IS NOT NULL GROUP BY {name}"
+                    ).fetchall())
+                    for name in DISTRIBUTION_FIELDS
+                }
+                responses_by_date = dict(conn.execute(
+                    f"SELECT substr(timestamp, 1, 10), COUNT(*) FROM {TABLE} "
+                    f"WHERE timestamp IS NOT NULL GROUP BY 1"
+                ).fetchall())
+            finally:
+                conn.execute("COMMIT")
+
+        return {
+            "total_responses": total,
+            "age_distribution": distributions["age"],
+            "gender_distribution": distributions["gender"],
+            "frequency_distribution": distributions["frequency"],
+            "satisfaction_distribution": distributions["satisfaction"],
+            "average_satisfaction": round(satisfaction_sum / satisfaction_count, 2) if satisfaction_count else 0.0,
+            "responses_by_date": responses_by_date,
+            # calculate_statisticsと同様に、ユーザーIDを含まない回答のみの場合はNone
+            "unique_users": unique_users or (None if total else 0),
+            **satisfaction_summary(ScoreHistogram(counts=distributions["satisfaction"])),
+        }
+
+    # --- リストとしての操作（既存のモックストレージの処理から使用する） ---
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self.submit(record).result()
+
+    def extend(self, records) -> None:
+        futures = [self.submit(record) for record in records]
+        for future in futures:
+            future.result()
+
+    def __len__(self) -> int:
+        with self._connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        with self._connection() as conn:
+            rows = conn.execute(f"SELECT * FROM {TABLE} ORDER BY seq").fetchall()
+        return iter([_row_to_dict(row) for row in rows])
+
+    def __getitem__(self, key: Union[int, slice]):
+        if isinstance(key, slice):
+            return list(self)[key]
+        with self._connection() as conn:
+            if key < 0:
+                row = conn.execute(f"SELECT * FROM {TABLE} ORDER BY seq DESC LIMIT 1 OFFSET ?", (-key - 1,)).fetchone()
+            else:
+                row = conn.execute(f"SELECT * FROM {TABLE} ORDER BY seq LIMIT 1 OFFSET ?", (key,)).fetchone()
+        if row is None:
+            raise IndexError("SQLiteStore index out of range")
+        return _row_to_dict(row)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "pool_size": len(self._connections),
+            "pool_available": self._pool.qsize(),
+            "pending_writes": self._writes.qsize(),
+            "commits": self.commits,
+            "committed_rows": self.committed_rows,
+            "rows_per_commit": round(self.committed_rows / self.commits, 2) if self.commits else 0.0,
+        }
+
+    def close(self) -> None:
+        """書き込みキューを処理し終えてからコネクションを閉じる"""
+        self._writes.put(None)
+        self._writer.join()
+        self._writer_conn.close()
+        for conn in self._connections:
+            conn.close()
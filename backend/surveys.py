@@ -0,0 +1,188 @@
+"""アンケート定義のレジストリ
+
+キャンペーンごとのアンケート定義（質問と選択肢）を登録し、定義ごとに1回だけ
+回答のバリデータ（Pydanticモデル）と統計の集計プランをコンパイルしてキャッシュする。
+回答は定義ごとのコレクションに保存し、あるキャンペーンへの集中が他のアンケートの
+クエリに影響しないようにする。
+"""
+import json
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple, Type
+
+from pydantic import BaseModel, Field, create_model
+
+# 既存の /survey/submit・/survey/results が扱うアンケートのID
+DEFAULT_SURVEY_ID = "default"
+# Firestoreのコレクション名に使用するため英小文字・数字・ハイフン・アンダースコアに限定する
+SURVEY_ID_PATTERN = "^[a-z0-9][a-z0-9_-]{0,63}$"
+# 回答に付与されるためアンケートの質問名として使用できないフィールド
+RESERVED_FIELDS = frozenset({"id", "surveyId", "userId", "displayName", "timestamp", "createdAt"})
+
+
+class Question(BaseModel):
+    """アンケートの質問"""
+    name: str = Field(..., pattern="^[A-Za-z][A-Za-z0-9_]{0,63}$", description="回答のフィールド名")
+    type: Literal["choice", "rating", "text"] = Field(..., description="質問形式")
+    label: Optional[str] = Field(None, description="表示用の質問文")
+    required: bool = True
+    options: Optional[List[str]] = Field(None, description="選択肢（choiceのみ）")
+    min: int = Field(1, description="評価の最小値（ratingのみ）")
+    max: int = Field(5, description="評価の最大値（ratingのみ）")
+    max_length: Optional[int] = Field(None, description="最大文字数（textのみ）")
+    aggregate: Optional[bool] = Field(None, description="分布を集計するか（未指定時はchoice・ratingのみ集計）")
+
+    @property
+    def aggregated(self) -> bool:
+        return self.aggregate if self.aggregate is not None else self.type != "text"
+
+
+class SurveyDefinition(BaseModel):
+    """アンケート定義"""
+    id: str = Field(..., pattern=SURVEY_ID_PATTERN, description="アンケートID")
+    title: str = Field(..., description="アンケート名")
+    version: int = Field(1, description="定義のバージョン（変更時に更新する）")
+    questions: List[Question]
+
+
+class StatisticsPlan:
+    """アンケート定義から導出した集計プラン（分布・平均を求める質問）"""
+
+    __slots__ = ("distribution_fields", "rating_fields")
+
+    def __init__(self, questions: Iterable[Question]):
+        questions = list(questions)
+        self.distribution_fields: Tuple[str, ...] = tuple(q.name for q in questions if q.aggregated)
+        self.rating_fields: Tuple[str, ...] = tuple(q.name for q in questions if q.type == "rating")
+
+    def compute(self, responses: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """回答の一覧から統計を計算"""
+        total = 0
+        distributions: Dict[str, Dict[str, int]] = {name: {} for name in self.distribution_fields}
+        rating_sums = {name: [0, 0] for name in self.rating_fields}
+        responses_by_date: Dict[str, int] = {}
+
+        for response in responses:
+            total += 1
+            for name in self.distribution_fields:
+                value = response.get(name)
+                if value is None:
+                    continue
+                counts = distributions[name]
+                counts[value] = counts.get(value, 0) + 1
+                if name in rating_sums:
+                    rating_sums[name][0] += int(value)
+                    rating_sums[name][1] += 1
+
+            timestamp = response.get("timestamp")
+            if timestamp is not None:
+                date_key = timestamp.split('T')[0]  # YYYY-MM-DD
+                responses_by_date[date_key] = responses_by_date.get(date_key, 0) + 1
+
+        return {
+            "total_responses": total,
+            "distributions": distributions,
+            "averages": {
+                name: round(value_sum / count, 2) if count else 0.0
+                for name, (value_sum, count) in rating_sums.items()
+            },
+            "responses_by_date": responses_by_date,
+        }
+
+
+def _question_field(question: Question) -> Tuple[Any, Any]:
+    """質問をPydanticのフィールド定義に変換"""
+    if question.type == "choice":
+        pattern = "^(" + "|".join(re.escape(option) for option in question.options) + ")$"
+        field = Field(... if question.required else None, pattern=pattern, description=question.label)
+    elif question.type == "rating":
+        values = "|".join(str(value) for value in range(question.min, question.max + 1))
+        field = Field(... if question.required else None, pattern=f"^({values})$", description=question.label)
+    else:
+        field = Field(... if question.required else None, max_length=question.max_length, description=question.label)
+    return (str if question.required else Optional[str], field)
+
+
+class CompiledSurvey:
+    """コンパイル済みのアンケート定義"""
+
+    __slots__ = ("definition", "model", "plan")
+
+    def __init__(self, definition: SurveyDefinition):
+        names = [question.name for question in definition.questions]
+        duplicated = {name for name in names if names.count(name) > 1}
+        reserved = RESERVED_FIELDS.intersection(names)
+        if duplicated or reserved:
+            raise ValueError(f"invalid question names in survey {definition.id}: {sorted(duplicated | reserved)}")
+        for question in definition.questions:
+            if question.type == "choice" and not question.options:
+                raise ValueError(f"choice question {question.name} in survey {definition.id} has no options")
+            if question.type == "rating" and question.min > question.max:
+                raise ValueError(f"rating question {question.name} in survey {definition.id} has min > max")
+
+        self.definition = definition
+        self.model: Type[BaseModel] = create_model(
+            f"SurveyRequest_{definition.id.replace('-', '_')}_v{definition.version}",
+            **{question.name: _question_field(question) for question in definition.questions}
+        )
+        self.plan = StatisticsPlan(definition.questions)
+
+    def validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """回答を検証し、定義に含まれるフィールドのみを返す（不正な場合はValidationError）"""
+        return self.model.model_validate(data).model_dump()
+
+
+def survey_collection(survey_id: str) -> str:
+    """アンケートの回答を保存するコレクション名"""
+    if survey_id == DEFAULT_SURVEY_ID:
+        return "survey_responses"
+    return f"survey_responses_{survey_id}"
+
+
+class SurveyRegistry:
+    """アンケート定義のレジストリ（定義ごとのコンパイル結果をキャッシュする）"""
+
+    def __init__(self):
+        self._surveys: Dict[str, CompiledSurvey] = {}
+        self._lock = threading.Lock()
+        self.compilations = 0
+
+    def register(self, definition: SurveyDefinition) -> CompiledSurvey:
+        """定義を登録する（同じIDとバージョンが登録済みの場合はキャッシュを返す）"""
+        with self._lock:
+            current = self._surveys.get(definition.id)
+            if current is not None and current.definition.version == definition.version:
+                return current
+
+            compiled = CompiledSurvey(definition)
+            self.compilations += 1
+            self._surveys[definition.id] = compiled
+            return compiled
+
+    def get(self, survey_id: str) -> Optional[CompiledSurvey]:
+        return self._surveys.get(survey_id)
+
+    def definitions(self) -> List[SurveyDefinition]:
+        return [compiled.definition for compiled in self._surveys.values()]
+
+    def load_file(self, path: str) -> int:
+        """JSONファイル（定義の配列）から登録し、登録件数を返す"""
+        with open(path, encoding="utf-8") as f:
+            definitions = json.load(f)
+        for data in definitions:
+            self.register(SurveyDefinition(**data))
+        return len(definitions)
+
+
+# 既存の SurveyRequest と同じ質問構成のアンケート
+DEFAULT_SURVEY = SurveyDefinition(
+    id=DEFAULT_SURVEY_ID,
+    title="サービス満足度アンケート",
+    questions=[
+        Question(name="age", type="text", label="年齢層", aggregate=True),
+        Question(name="gender", type="choice", label="性別", options=["male", "female", "other"]),
+        Question(name="frequency", type="choice", label="利用頻度", options=["daily", "weekly", "monthly", "rarely"]),
+        Question(name="satisfaction", type="rating", label="満足度", min=1, max=5),
+        Question(name="feedback", type="text", label="自由記述", required=False),
+    ],
+)
@@ -0,0 +1,262 @@
+"""規模試験用の合成回答データの生成と投入
+
+シード値から決定的に survey_responses の回答を生成する。一部のユーザーが繰り返し回答する
+偏ったユーザー分布、日中・夜に多い数か月分の回答時刻、満足度に応じた日本語の自由記述を再現する。
+生成した回答はメモリ上のストア（main.mock_storage）、Firestore（エミュレータ）へのバッチ書き込み、
+SQLite（SQLITE_STORAGE_PATH）・ローカルストレージ（LOCAL_STORAGE_PATH）のファイル、
+NDJSONファイル（report.py の入力）に投入できる。
+
+Firestoreへの投入は送信時の処理を通らないため、投入後にロールアップ・スケッチの再集計
+（rebuild_rollups.py）と user_latest のバックフィル（backfill_user_latest.py）を続けて実行する。
+SQLite・ローカルストレージのロールアップとスケッチはプロセスのメモリ上にのみあるため、
+投入した回答は /survey/statistics/timeseries の集計に含まれない（回答・統計・ユーザーの状態は反映される）。
+
+使い方:
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python synthetic_data.py --count 100000 --target firestore
+    python synthetic_data.py --count 1000000 --target sqlite --output survey.db
+    python synthetic_data.py --count 1000000 --target ndjson --output responses.ndjson
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+AGES = ["10-19", "20-29", "30-39", "40-49", "50-59", "60+"]
+AGE_WEIGHTS = [5, 25, 28, 20, 13, 9]
+GENDERS = ["male", "female", "other"]
+GENDER_WEIGHTS = [47, 50, 3]
+FREQUENCIES = ["daily", "weekly", "monthly", "rarely"]
+FREQUENCY_WEIGHTS = [15, 40, 30, 15]
+# 利用頻度ごとの満足度（1〜5）の重み（頻繁に使うユーザーほど満足度が高い）
+SATISFACTION_WEIGHTS = {
+    "daily": [2, 3, 10, 40, 45],
+    "weekly": [3, 7, 20, 40, 30],
+    "monthly": [6, 12, 30, 35, 17],
+    "rarely": [15, 20, 30, 25, 10],
+}
+# 時間帯ごとの回答の多さ（0時〜23時）
+HOURLY_WEIGHTS = [2, 1, 1, 1, 1, 2, 4, 7, 9, 8, 7, 8, 10, 9, 7, 7, 8, 9, 11, 12, 12, 10, 7, 4]
+
+SUBJECTS = ["スタッフ", "接客", "アプリ", "店内", "料金", "商品", "予約", "ポイント", "LINE連携", "サービス", "待ち時間", "品揃え"]
+POSITIVE = ["がとても良かったです", "が丁寧でした", "が便利です", "に満足しています", "が分かりやすい"]
+NEUTRAL = ["は普通でした", "は特に問題ありません", "がもう少し良くなると嬉しいです"]
+NEGATIVE = ["が分かりにくい", "に不満があります", "が遅いと感じました", "を改善してほしい"]
+
+# Firestoreの1バッチあたりの書き込み上限
+BATCH_SIZE = 500
+
+
+def _mix64(value: int) -> int:
+    """splitmix64（ユーザー番号から一様な64bit値を得る）"""
+    value = (value + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 31)
+
+
+def _pick(values: List[str], weights: List[int], bits: int) -> str:
+    """16bitの一様な値で重み付きの選択を行う"""
+    point = bits * sum(weights) >> 16
+    for value, weight in zip(values, weights):
+        if point < weight:
+            return value
+        point -= weight
+    return values[-1]
+
+
+def _user_profile(user: int, seed: int) -> Dict[str, str]:
+    """ユーザーごとに固定の属性（回答のたびに変わらないよう、ユーザー番号のハッシュから決める）"""
+    h = _mix64(seed << 32 ^ user)
+    return {
+        "userId": f"U{h:016x}{_mix64(h):016x}",
+        "displayName": f"ユーザー{user}",
+        "age": _pick(AGES, AGE_WEIGHTS, h & 0xFFFF),
+        "gender": _pick(GENDERS, GENDER_WEIGHTS, h >> 16 & 0xFFFF),
+        "frequency": _pick(FREQUENCIES, FREQUENCY_WEIGHTS, h >> 32 & 0xFFFF),
+    }
+
+
+def _feedback(rng: random.Random, satisfaction: int) -> str:
+    predicates = POSITIVE if satisfaction >= 4 else NEUTRAL if satisfaction == 3 else NEGATIVE
+    parts = [f"{rng.choice(SUBJECTS)}{rng.choice(predicates)}" for _ in range(rng.randint(1, 3))]
+    return "。".join(parts) + "。"
+
+
+def generate_responses(
+    count: int,
+    seed: int = 42,
+    users: Optional[int] = None,
+    start: str = "2025-01-01",
+    days: int = 180,
+    feedback_rate: float = 0.4,
+    skew: float = 2.0
+) -> Iterator[Dict[str, Any]]:
+    """合成回答をcreatedAtの古い順に生成する（同じ引数なら同じ回答列になる）
+
+    ユーザー番号は一様乱数のskew乗で選ぶため、番号の小さいユーザーほど繰り返し回答する。
+    回答時刻は時間帯の重みに比例した到着率で、start から約days日間に分布する。
+    """
+    rng = random.Random(seed)
+    users = users or max(1, count // 3)
+    current = datetime.fromisoformat(start)
+    mean_gap = days * 86400 / max(1, count)
+    mean_weight = sum(HOURLY_WEIGHTS) / len(HOURLY_WEIGHTS)
+
+    for number in range(count):
+        # 時間帯の重みが大きいほど回答の間隔が短くなる
+        current += timedelta(seconds=rng.expovariate(HOURLY_WEIGHTS[current.hour] / mean_weight / mean_gap))
+        profile = _user_profile(int(users * rng.random() ** skew), seed)
+
+        satisfaction = rng.choices((1, 2, 3, 4, 5), SATISFACTION_WEIGHTS[profile["frequency"]])[0]
+        timestamp = current.isoformat()
+        yield {
+            "id": f"synthetic_{seed}_{number}",
+            "age": profile["age"],
+            "gender": profile["gender"],
+            "frequency": profile["frequency"],
+            "satisfaction": str(satisfaction),
+            "feedback": _feedback(rng, satisfaction) if rng.random() < feedback_rate else None,
+            "userId": profile["userId"],
+            "displayName": profile["displayName"],
+            "timestamp": timestamp,
+            "createdAt": timestamp,
+        }
+
+
+def _chunks(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def load_memory(storage: List[Dict[str, Any]], responses: Iterable[Dict[str, Any]]) -> int:
+    """メモリ上のストア（main.mock_storage など）に追加する"""
+    before = len(storage)
+    storage.extend(responses)
+    return len(storage) - before
+
+
+def load_firestore(
+    db,
+    responses: Iterable[Dict[str, Any]],
+    collection: str = "survey_responses",
+    batch_size: int = BATCH_SIZE,
+    concurrency: int = 8
+) -> int:
+    """バッチ書き込み（1バッチ最大500件）を並行してコミットし、書き込み件数を返す
+
+    ドキュメントIDは生成した回答のidを使うため、同じシードで再実行しても重複しない。
+    """
+    collection_ref = db.collection(collection)
+
+    def commit(chunk: List[Dict[str, Any]]) -> int:
+        batch = db.batch()
+        for response in chunk:
+            data = {key: value for key, value in response.items() if key != "id"}
+            batch.set(collection_ref.document(response["id"]), data)
+        batch.commit()
+        return len(chunk)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # 生成が先行しすぎないよう、同時に保持するバッチ数を制限しながら投入する
+        written = 0
+        pending = []
+        for chunk in _chunks(responses, batch_size):
+            pending.append(executor.submit(commit, chunk))
+            if len(pending) >= concurrency * 2:
+                written += pending.pop(0).result()
+        for future in pending:
+            written += future.result()
+    return written
+
+
+def load_sqlite(path: str, responses: Iterable[Dict[str, Any]], batch_size: int = BATCH_SIZE) -> int:
+    """SQLiteStoreに書き込みスレッドのグループコミットで投入し、書き込み件数を返す
+
+    投入済みのidの回答は書き込まないため、同じシードで再実行しても重複しない。
+    """
+    from sqlite_storage import SQLiteStore
+
+    store = SQLiteStore(path, batch_size=batch_size)
+    written = 0
+    try:
+        for chunk in _chunks(responses, batch_size):
+            existing = store.get_many([response["id"] for response in chunk])
+            new = [response for response in chunk if response["id"] not in existing]
+            store.extend(new)
+            written += len(new)
+    finally:
+        store.close()
+    return written
+
+
+def load_local(path: str, responses: Iterable[Dict[str, Any]]) -> int:
+    """ローカルストレージ（追記専用ログ）に投入し、書き込み件数を返す（投入済みのidの回答は書き込まない）"""
+    from local_storage import AppendOnlyLog
+
+    log = AppendOnlyLog(path)
+    try:
+        return load_memory(log, (response for response in responses if log.get(response["id"]) is None))
+    finally:
+        log.close()
+
+
+def write_ndjson(path: str, responses: Iterable[Dict[str, Any]]) -> int:
+    """NDJSONファイルに書き出す（report.py・export_responses.py の検証用）"""
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for response in responses:
+            f.write(json.dumps(response, ensure_ascii=False) + "\n")
+            written += 1
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="合成回答データを生成して投入する")
+    parser.add_argument("--count", type=int, required=True, help="生成する回答数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--users", type=int, help="ユーザー母数（未指定時は回答数の1/3）")
+    parser.add_argument("--start", default="2025-01-01", help="回答期間の開始日 (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=180, help="回答期間の日数")
+    parser.add_argument("--target", choices=["firestore", "sqlite", "local", "ndjson"], required=True)
+    parser.add_argument("--output", help="出力先のファイル（--target sqlite / local / ndjson）")
+    parser.add_argument("--concurrency", type=int, default=8, help="並行してコミットするバッチ数")
+    parser.add_argument("--allow-production", action="store_true",
+                        help="FIRESTORE_EMULATOR_HOST未設定でもFirestoreに書き込む")
+    args = parser.parse_args()
+
+    responses = generate_responses(args.count, args.seed, args.users, args.start, args.days)
+    started = time.perf_counter()
+    if args.target != "firestore" and not args.output:
+        parser.error(f"--target {args.target} には --output が必要です")
+    if args.target == "ndjson":
+        written = write_ndjson(args.output, responses)
+    elif args.target == "sqlite":
+        written = load_sqlite(args.output, responses)
+    elif args.target == "local":
+        written = load_local(args.output, responses)
+    else:
+        if not os.getenv("FIRESTORE_EMULATOR_HOST") and not args.allow_production:
+            parser.error("本番のFirestoreへの書き込みを防ぐため、FIRESTORE_EMULATOR_HOSTを設定してください")
+        import main
+        if not main.FIRESTORE_AVAILABLE:
+            parser.error("Firestoreクライアントを初期化できませんでした")
+        written = load_firestore(main.db, responses, concurrency=args.concurrency)
+
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {written} responses to {args.target} in {elapsed:.1f}s ({written / elapsed:.0f}/s)")
+
+    if args.target == "firestore":
+        # 送信時に書き込むロールアップ・スケッチ・user_latestを投入した回答から作り直す
+        from backfill_user_latest import backfill_user_latest
+        from rebuild_rollups import rebuild_rollups
+        rebuild_rollups(args.start)
+        backfill_user_latest()
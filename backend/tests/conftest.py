@@ -3,6 +3,7 @@ from unittest.mock import Mock, patch, MagicMock
 from fastapi.testclient import TestClient
 import os
 import json
+import threading
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -12,93 +13,239 @@ def mock_environment():
         yield
 
 
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """レート制限の状態をテストごとに初期化"""
+    import main
+    main.set_rate_limit_backend(main.InMemoryRateLimitBackend())
+    yield
+
+
+@pytest.fixture(autouse=True)
+def reset_feedback_index():
+    """自由記述インデックスをテストごとに初期化"""
+    import main
+    with patch("main.feedback_index", main.FeedbackIndex()), \
+         patch("main.feedback_index_synced_at", None):
+        yield
+
+
 @pytest.fixture(autouse=True)
 def mock_firestore():
     """Firestoreのモック"""
     
+    # Incrementのモック
+    class MockIncrement:
+        def __init__(self, value):
+            self.value = value
+
+    def apply_merge(target, data):
+        """merge=Trueのset: ネストした辞書をマージし、Incrementを加算する"""
+        for key, value in data.items():
+            if isinstance(value, MockIncrement):
+                target[key] = target.get(key, 0) + value.value
+            elif isinstance(value, dict):
+                apply_merge(target.setdefault(key, {}), value)
+            else:
+                target[key] = value
+        return target
+
     # ドキュメント参照のモック
     class MockDocumentRef:
         def __init__(self, doc_id, data=None):
             self.id = doc_id
             self._data = data or {}
             
-        def get(self):
+        def get(self, transaction=None, timeout=None):
             mock_doc = Mock()
             mock_doc.exists = bool(self._data)
             mock_doc.to_dict.return_value = self._data
             mock_doc.id = self.id
             return mock_doc
             
-        def set(self, data):
-            self._data = data
+        def set(self, data, merge=False, timeout=None):
+            if merge:
+                apply_merge(self._data, data)
+            else:
+                self._data = apply_merge({}, data)
             return self
             
         def update(self, data):
             self._data.update(data)
             return self
     
-    # クエリのモック
+    # バッチ書き込みのモック
+    class MockWriteBatch:
+        def __init__(self):
+            self._writes = []
+
+        def set(self, doc_ref, data, merge=False):
+            self._writes.append((doc_ref, data, merge))
+
+        def delete(self, doc_ref):
+            self._writes.append((doc_ref, None, False))
+
+        def commit(self, timeout=None):
+            for doc_ref, data, merge in self._writes:
+                if data is None:
+                    doc_ref._data = {}
+                else:
+                    doc_ref.set(data, merge=merge)
+            self._writes = []
+    
+    # トランザクションのモック（ロックで直列化し、書き込みはコミット時に反映）
+    transaction_lock = threading.RLock()
+
+    class MockTransaction(MockWriteBatch):
+        def update(self, doc_ref, data):
+            self._writes.append((doc_ref, data, True))
+
+    def transactional(func):
+        def wrapper(transaction, *args, **kwargs):
+            with transaction_lock:
+                result = func(transaction, *args, **kwargs)
+                transaction.commit()
+                return result
+        return wrapper
+
+    # クエリのモック（条件を保持し、stream時に評価する）
+    operators = {
+        '==': lambda a, b: a == b,
+        '>=': lambda a, b: a >= b,
+        '>': lambda a, b: a > b,
+        '<=': lambda a, b: a <= b,
+        '<': lambda a, b: a < b,
+    }
+
     class MockQuery:
-        def __init__(self, docs=None):
-            self._docs = docs or []
+        def __init__(self, collection, filters=(), orders=(), projection=None, limit_count=None, offset_count=0, cursor=None):
+            self._collection = collection
+            self._cursor = cursor
+            self._filters = tuple(filters)
+            self._orders = tuple(orders)
+            self._projection = projection
+            self._limit = limit_count
+            self._offset = offset_count
+
+        def _copy(self, **changes):
+            params = dict(
+                filters=self._filters,
+                orders=self._orders,
+                projection=self._projection,
+                limit_count=self._limit,
+                offset_count=self._offset,
+                cursor=self._cursor
+            )
+            params.update(changes)
+            return MockQuery(self._collection, **params)
             
         def where(self, field, op, value):
-            return MockQuery(self._docs)
+            return self._copy(filters=self._filters + ((field, op, value),))
             
         def order_by(self, field, direction=None):
-            return MockQuery(self._docs)
+            return self._copy(orders=self._orders + ((field, direction),))
             
         def limit(self, count):
-            return MockQuery(self._docs[:count])
+            return self._copy(limit_count=count)
+
+        def start_after(self, snapshot):
+            # カーソル: 指定したドキュメントの次から取得する
+            return self._copy(cursor=snapshot.id)
             
         def offset(self, count):
-            return MockQuery(self._docs[count:])
+            return self._copy(offset_count=count)
+            
+        def select(self, field_paths):
+            return self._copy(projection=list(field_paths))
             
-        def stream(self):
-            for doc_data in self._docs:
+        def stream(self, transaction=None, timeout=None):
+            # インデックス利用チェック用に実行したクエリの形を記録
+            self._collection.executed_queries.append({
+                "filters": [(field, op) for field, op, _ in self._filters],
+                "orders": [(field, direction) for field, direction in self._orders]
+            })
+
+            docs = [
+                (doc_id, doc) for doc_id, doc in self._collection._documents()
+                if all(field in doc and operators[op](doc[field], value) for field, op, value in self._filters)
+            ]
+            for field, direction in reversed(self._orders):
+                docs.sort(key=lambda item: item[1].get(field, ''), reverse=direction == 'DESCENDING')
+            if self._cursor is not None:
+                ids = [doc_id for doc_id, _ in docs]
+                docs = docs[ids.index(self._cursor) + 1:] if self._cursor in ids else []
+            docs = docs[self._offset:]
+            if self._limit is not None:
+                docs = docs[:self._limit]
+
+            for doc_id, doc_data in docs:
+                doc_id = doc_data.get('id', doc_id)
+                if self._projection is not None:
+                    # 射影: 指定フィールドのみ残す
+                    doc_data = {k: v for k, v in doc_data.items() if k in self._projection or k == 'id'}
                 mock_doc = Mock()
                 mock_doc.to_dict.return_value = doc_data
-                mock_doc.id = doc_data.get('id', 'mock_id')
+                mock_doc.id = doc_id
                 yield mock_doc
     
     # コレクション参照のモック
     class MockCollectionRef:
         def __init__(self):
             self._docs = []
+            self._refs = {}
+            self._doc_ids = {}
+            self.executed_queries = []
             
-        def add(self, data):
+        def add(self, data, timeout=None):
             doc_id = f"mock_doc_{len(self._docs)}"
             doc_ref = MockDocumentRef(doc_id, data)
             self._docs.append(data)
+            self._refs[doc_id] = doc_ref
+            self._doc_ids[id(data)] = doc_id
             # addメソッドは (WriteResult, DocumentReference) のタプルを返す
             write_result = Mock()
             return (write_result, doc_ref)
             
-        def document(self, doc_id):
-            return MockDocumentRef(doc_id)
+        def _documents(self):
+            """add()で追加したドキュメントと、document().set()で書き込んだドキュメント"""
+            added = []
+            for doc in self._docs:
+                doc_id = self._doc_ids.get(id(doc), 'mock_id')
+                ref = self._refs.get(doc_id)
+                # 削除・上書きされたドキュメントは除く
+                if ref is None or ref._data is doc:
+                    added.append((doc_id, doc))
+            written = [
+                (doc_id, ref._data) for doc_id, ref in self._refs.items()
+                if ref._data and id(ref._data) not in self._doc_ids
+            ]
+            return added + written
+
+        def document(self, doc_id=None):
+            if doc_id is None:
+                # IDを指定しない場合は自動採番
+                doc_id = f"mock_auto_{len(self._refs)}"
+            if doc_id not in self._refs:
+                self._refs[doc_id] = MockDocumentRef(doc_id)
+            return self._refs[doc_id]
             
         def where(self, field, op, value):
-            filtered_docs = []
-            for doc in self._docs:
-                if field in doc and doc[field] == value:
-                    filtered_docs.append(doc)
-            return MockQuery(filtered_docs)
+            return MockQuery(self).where(field, op, value)
             
         def order_by(self, field, direction=None):
-            return MockQuery(self._docs)
+            return MockQuery(self).order_by(field, direction)
             
         def limit(self, count):
-            return MockQuery(self._docs[:count])
+            return MockQuery(self).limit(count)
             
         def offset(self, count):
-            return MockQuery(self._docs[count:])
+            return MockQuery(self).offset(count)
             
-        def stream(self):
-            for doc_data in self._docs:
-                mock_doc = Mock()
-                mock_doc.to_dict.return_value = doc_data
-                mock_doc.id = doc_data.get('id', 'mock_id')
-                yield mock_doc
+        def select(self, field_paths):
+            return MockQuery(self).select(field_paths)
+            
+        def stream(self, timeout=None):
+            return MockQuery(self).stream()
     
     # Firestoreクライアントのモック
     class MockFirestoreClient:
@@ -109,16 +256,42 @@ def mock_firestore():
             if name not in self._collections:
                 self._collections[name] = MockCollectionRef()
             return self._collections[name]
+
+        def batch(self):
+            return MockWriteBatch()
+
+        def transaction(self):
+            return MockTransaction()
+
+        def get_all(self, doc_refs, timeout=None):
+            for doc_ref in doc_refs:
+                yield doc_ref.get()
     
     # mainモジュールのグローバル変数をモック
     mock_client = MockFirestoreClient()
     
     with patch('main.db', mock_client), \
          patch('main.FIRESTORE_AVAILABLE', True), \
-         patch('main.firestore'):
+         patch('main.firestore') as mock_firestore_module:
+        mock_firestore_module.Increment = MockIncrement
+        mock_firestore_module.transactional = transactional
+        mock_firestore_module.Query.ASCENDING = 'ASCENDING'
+        mock_firestore_module.Query.DESCENDING = 'DESCENDING'
         yield mock_client
 
 
+@pytest.fixture
+def seed_responses(mock_firestore):
+    """合成回答をモックFirestoreに投入する（規模試験用の再現可能なデータ）"""
+    from synthetic_data import generate_responses, load_firestore
+
+    def seed(count, **kwargs):
+        responses = list(generate_responses(count, **kwargs))
+        load_firestore(mock_firestore, responses)
+        return responses
+    return seed
+
+
 @pytest.fixture
 def mock_db(mock_firestore):
     """テスト用のFirestoreクライアントモック"""
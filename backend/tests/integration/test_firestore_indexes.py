@@ -0,0 +1,140 @@
+"""Firestore複合インデックスの利用チェック"""
+import itertools
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from tests.config import TEST_PROJECT_ID
+
+INDEXES_PATH = Path(__file__).resolve().parents[3] / "firestore.indexes.json"
+
+# /survey/results の絞り込みパラメータとテスト用の値
+FILTER_PARAMS = {
+    "age": "20-29",
+    "gender": "male",
+    "frequency": "weekly",
+    "satisfaction": "4",
+}
+DATE_PARAMS = {"start_date": "2025-01-01", "end_date": "2025-12-31"}
+
+
+def load_composite_indexes(collection_group="survey_responses"):
+    """firestore.indexes.json から (等価フィールド集合, 並び順フィールド) の一覧を取得"""
+    with open(INDEXES_PATH, encoding="utf-8") as f:
+        indexes = json.load(f)["indexes"]
+
+    composites = []
+    for index in indexes:
+        if index["collectionGroup"] != collection_group:
+            continue
+        *equality, order = index["fields"]
+        composites.append((frozenset(field["fieldPath"] for field in equality), (order["fieldPath"], order["order"])))
+    return composites
+
+
+def query_is_covered(query, composites):
+    """実行したクエリが複合インデックス（またはインデックスのマージ）で処理できるか判定"""
+    equality = frozenset(field for field, op in query["filters"] if op == "==")
+    orders = query["orders"]
+    if not equality:
+        # 単一フィールドのみのクエリは自動インデックスで処理される
+        return True
+
+    order = (orders[-1][0], orders[-1][1]) if orders else None
+    candidates = [fields for fields, index_order in composites if index_order == order]
+    if equality in candidates:
+        return True
+    # 等価条件はフィールドごとの複合インデックスをマージして処理できる
+    return all(frozenset([field]) in candidates for field in equality)
+
+
+def filter_combinations():
+    """絞り込みパラメータの全組み合わせ（期間指定あり・なし）"""
+    names = list(FILTER_PARAMS)
+    for size in range(len(names) + 1):
+        for combo in itertools.combinations(names, size):
+            params = {name: FILTER_PARAMS[name] for name in combo}
+            yield params
+            yield {**params, **DATE_PARAMS}
+
+
+class TestFirestoreIndexUsage:
+    """絞り込みクエリがインデックス定義でカバーされていることの確認"""
+
+    def test_all_filter_combinations_are_indexed(self, client: TestClient, mock_firestore):
+        """全ての絞り込みの組み合わせが複合インデックスでカバーされること"""
+        composites = load_composite_indexes()
+        collection = mock_firestore.collection('survey_responses')
+
+        for params in filter_combinations():
+            response = client.get("/survey/results", params=params)
+            assert response.status_code == 200, params
+
+            executed = collection.executed_queries[-1]
+            assert query_is_covered(executed, composites), f"インデックス未定義のクエリ: {executed}"
+
+    def test_user_queries_are_indexed(self, client: TestClient, mock_firestore):
+        """ユーザー単位のクエリが複合インデックスでカバーされること"""
+        composites = load_composite_indexes()
+        collection = mock_firestore.collection('survey_responses')
+
+        client.post("/user/status", json={"userId": "U_mock_user_123"})
+        client.get("/user/U_mock_user_123/latest-response")
+
+        assert collection.executed_queries
+        for executed in collection.executed_queries:
+            assert query_is_covered(executed, composites), f"インデックス未定義のクエリ: {executed}"
+
+    def test_partition_queries_are_indexed(self, client: TestClient, mock_firestore):
+        """月単位のパーティションへのクエリがコレクショングループ responses のインデックスでカバーされること"""
+        from partitions import PartitionRegistry, partition_key, partition_path
+
+        composites = load_composite_indexes("responses")
+        collection = mock_firestore.collection(partition_path(partition_key(datetime.now().isoformat())))
+
+        with patch('main.RESPONSE_PARTITIONING', 'monthly'), patch('main.response_partitions', PartitionRegistry()):
+            for params in filter_combinations():
+                if "start_date" in params:
+                    # 期間外の当月は読まない
+                    continue
+                assert client.get("/survey/results", params=params).status_code == 200
+            client.post("/user/status", json={"userId": "U_mock_user_123"})
+
+        assert collection.executed_queries
+        for executed in collection.executed_queries:
+            assert query_is_covered(executed, composites), f"インデックス未定義のクエリ: {executed}"
+
+
+@pytest.mark.skipif(not os.getenv("FIRESTORE_EMULATOR_HOST"), reason="Firestoreエミュレータが必要です")
+class TestFirestoreEmulatorQueries:
+    """エミュレータに対して絞り込みクエリを実行する
+
+    エミュレータは複合インデックスの有無を検証しないため、インデックスのカバー判定は
+    記録したクエリ形状と firestore.indexes.json の照合で行い、ここではクエリが実行できることを確認する。
+    """
+
+    def test_filter_queries_execute(self):
+        """全ての絞り込みの組み合わせがエミュレータで実行できること"""
+        from google.cloud import firestore
+        from main import build_response_filters
+
+        db = firestore.Client(project=TEST_PROJECT_ID)
+        composites = load_composite_indexes()
+
+        for params in filter_combinations():
+            filters = build_response_filters(**params)
+            query = db.collection('survey_responses').order_by('createdAt', direction=firestore.Query.DESCENDING)
+            for field, op, value in filters:
+                query = query.where(field, op, value)
+            list(query.limit(1).stream())
+
+            shape = {
+                "filters": [(field, op) for field, op, _ in filters],
+                "orders": [("createdAt", "DESCENDING")]
+            }
+            assert query_is_covered(shape, composites), f"インデックス未定義のクエリ: {shape}"
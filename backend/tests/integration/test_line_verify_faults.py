@@ -0,0 +1,235 @@
+"""LINE IDToken検証の障害注入テスト
+
+ローカルに遅延・失敗を注入できるスタブサーバーを立て、
+サーキットブレーカー・タイムアウト・ヘッジリクエストの動作を確認する。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from resilience import CircuitBreaker, CircuitOpenError, LatencyTracker
+
+AUTH_HEADERS = {"Authorization": "Bearer test-id-token"}
+
+
+class StubLineServer:
+    """LINE検証エンドポイントのスタブ
+
+    responsesに (遅延秒, ステータス) を順に積むと、リクエストごとに1件ずつ使用する。
+    空の場合はdefaultを使用する。
+    """
+
+    def __init__(self):
+        self.default = (0.0, 200)
+        self.responses = []
+        self.hits = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                with stub._lock:
+                    stub.hits += 1
+                    delay, status_code = stub.responses.pop(0) if stub.responses else stub.default
+                time.sleep(delay)
+                body = json.dumps({"sub": "U_stub_user", "name": "Stub User"}).encode()
+                try:
+                    self.send_response(status_code)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # タイムアウトやヘッジで切断されたリクエスト
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/oauth2/v2.1/verify"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stub_line():
+    """スタブサーバーを向いた検証設定（ブレーカーはテストごとに初期化）"""
+    stub = StubLineServer()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.3)
+    with patch("main.LINE_ID_TOKEN_VERIFY_URL", stub.url), \
+         patch("main.LINE_VERIFY_TIMEOUT", 0.3), \
+         patch("main.line_verify_breaker", breaker), \
+         patch("main.line_verify_latency", LatencyTracker()):
+        yield stub
+    stub.close()
+
+
+class TestCircuitBreaker:
+    """サーキットブレーカー単体のテストクラス"""
+
+    def test_release_frees_half_open_slot(self):
+        """成否を記録せずに終えた試行は、half_openの枠を返すこと"""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1.0, clock=lambda: now[0])
+        breaker.before_call()
+        breaker.record_failure()
+        now[0] = 1.0
+
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.release()
+
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        # closedでのreleaseは何もしない
+        breaker.release()
+        assert breaker.metrics()["consecutive_failures"] == 0
+
+
+def post_status(client: TestClient):
+    return client.post("/user/status", json={"userId": "U_stub_user"}, headers=AUTH_HEADERS)
+
+
+class TestLineVerifyFaults:
+    """IDToken検証の障害時動作のテストクラス"""
+
+    def test_verified_user(self, client: TestClient, mock_firestore, stub_line):
+        """正常応答時は検証済みユーザーで処理されること"""
+        response = post_status(client)
+
+        assert response.status_code == 200
+        assert response.json()["data"]["userId"] == "U_stub_user"
+
+    def test_invalid_token_does_not_trip_breaker(self, client: TestClient, mock_firestore, stub_line):
+        """無効なトークン（4xx）は401となり、ブレーカーの失敗に数えないこと"""
+        stub_line.default = (0.0, 400)
+
+        for _ in range(5):
+            assert post_status(client).status_code == 401
+
+        import main
+        assert main.line_verify_breaker.state == CircuitBreaker.CLOSED
+
+    def test_slow_upstream_times_out(self, client: TestClient, mock_firestore, stub_line):
+        """応答が遅い場合は呼び出しの上限時間で503を返すこと"""
+        stub_line.default = (2.0, 200)
+
+        started = time.monotonic()
+        response = post_status(client)
+        elapsed = time.monotonic() - started
+
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+        assert elapsed < 1.5
+
+    def test_breaker_opens_and_fails_fast(self, client: TestClient, mock_firestore, stub_line):
+        """連続失敗でブレーカーが開き、上流を呼ばずに即座に503を返すこと"""
+        stub_line.default = (0.0, 500)
+
+        for _ in range(3):
+            assert post_status(client).status_code == 503
+        hits = stub_line.hits
+
+        response = post_status(client)
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+        assert stub_line.hits == hits
+
+    def test_half_open_probe_closes_breaker(self, client: TestClient, mock_firestore, stub_line):
+        """リセット時間経過後の試行が成功するとブレーカーが閉じること"""
+        stub_line.default = (0.0, 500)
+        for _ in range(3):
+            post_status(client)
+
+        stub_line.default = (0.0, 200)
+        time.sleep(0.35)
+
+        assert post_status(client).status_code == 200
+        assert post_status(client).status_code == 200
+
+        import main
+        assert main.line_verify_breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_probe_failure_reopens(self, client: TestClient, mock_firestore, stub_line):
+        """試行が失敗するとブレーカーが再び開くこと"""
+        stub_line.default = (0.0, 500)
+        for _ in range(3):
+            post_status(client)
+
+        time.sleep(0.35)
+        assert post_status(client).status_code == 503
+        hits = stub_line.hits
+
+        assert post_status(client).status_code == 503
+        assert stub_line.hits == hits
+
+    def test_hedged_request_avoids_slow_attempt(self, client: TestClient, mock_firestore, stub_line):
+        """ヘッジ有効時、最初の呼び出しが遅くても2回目の応答で完了すること"""
+        # 1回目は遅延、2回目は即応答
+        stub_line.responses = [(1.0, 200), (0.0, 200)]
+
+        with patch("main.LINE_VERIFY_HEDGE", True), \
+             patch("main.LINE_VERIFY_TIMEOUT", 2.0), \
+             patch("main.LINE_VERIFY_HEDGE_DELAY", 0.1):
+            started = time.monotonic()
+            response = post_status(client)
+            elapsed = time.monotonic() - started
+
+        assert response.status_code == 200
+        assert stub_line.hits == 2
+        assert elapsed < 0.8
+
+    def test_request_deadline_bounds_verification(self, client: TestClient, mock_firestore, stub_line):
+        """リクエストの期限がLINE_VERIFY_TIMEOUTより短い場合は期限で打ち切り、504としてブレーカーに数えないこと"""
+        stub_line.default = (2.0, 200)
+
+        with patch("main.LINE_VERIFY_TIMEOUT", 5.0):
+            started = time.monotonic()
+            response = client.post(
+                "/user/status", json={"userId": "U_stub_user"},
+                headers={**AUTH_HEADERS, "X-Request-Timeout": "0.3"}
+            )
+            elapsed = time.monotonic() - started
+
+        assert response.status_code == 504
+        assert elapsed < 1.0
+
+        import main
+        assert main.line_verify_breaker.metrics()["consecutive_failures"] == 0
+
+    def test_deadline_during_half_open_probe_releases_slot(self, client: TestClient, mock_firestore, stub_line):
+        """half_openの試行がリクエストの期限で打ち切られても、ブレーカーが回復すること"""
+        stub_line.default = (0.0, 500)
+        for _ in range(3):
+            post_status(client)
+        time.sleep(0.35)
+
+        stub_line.default = (2.0, 200)
+        with patch("main.LINE_VERIFY_TIMEOUT", 5.0):
+            response = client.post(
+                "/user/status", json={"userId": "U_stub_user"},
+                headers={**AUTH_HEADERS, "X-Request-Timeout": "0.2"}
+            )
+        assert response.status_code == 504
+
+        import main
+        assert main.line_verify_breaker.state == CircuitBreaker.HALF_OPEN
+
+        stub_line.default = (0.0, 200)
+        for _ in range(3):
+            assert post_status(client).status_code == 200
+        assert main.line_verify_breaker.state == CircuitBreaker.CLOSED
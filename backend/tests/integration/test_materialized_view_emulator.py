@@ -0,0 +1,53 @@
+"""マテリアライズドビューのエミュレータ統合テスト"""
+import os
+import time
+import uuid
+
+import pytest
+
+from tests.config import MULTIPLE_TEST_DATA, TEST_PROJECT_ID
+
+
+def wait_until(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+@pytest.mark.skipif(not os.getenv("FIRESTORE_EMULATOR_HOST"), reason="Firestoreエミュレータが必要です")
+class TestMaterializedViewEmulator:
+    """スナップショットリスナー経由でビューが更新されることを確認する"""
+
+    def test_view_follows_collection(self):
+        """初回スナップショットで全件を読み込み、以降の追加・削除に追従すること"""
+        from datetime import datetime
+        from google.cloud import firestore
+        from materialized_view import MaterializedView
+
+        db = firestore.Client(project=TEST_PROJECT_ID)
+        collection = db.collection(f'survey_responses_view_{uuid.uuid4().hex[:8]}')
+        user_id = f"U_view_{uuid.uuid4().hex[:8]}"
+        now = datetime.now().isoformat()
+
+        refs = []
+        for test_data in MULTIPLE_TEST_DATA:
+            ref = collection.document()
+            ref.set({**test_data, "userId": user_id, "timestamp": now, "createdAt": now})
+            refs.append(ref)
+
+        view = MaterializedView()
+        view.start(collection)
+        try:
+            assert wait_until(lambda: view.ready)
+            assert view.statistics()["total_responses"] == len(MULTIPLE_TEST_DATA)
+            assert len(view.user_responses(user_id)) == len(MULTIPLE_TEST_DATA)
+
+            refs[0].delete()
+            assert wait_until(lambda: view.statistics()["total_responses"] == len(MULTIPLE_TEST_DATA) - 1)
+        finally:
+            view.stop()
+            for ref in refs:
+                ref.delete()
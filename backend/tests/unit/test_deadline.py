@@ -0,0 +1,108 @@
+"""リクエストの期限（デッドライン）の伝播のユニットテスト"""
+import asyncio
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from deadline import DeadlineExceeded, DeadlineMiddleware, call_timeout, deadline_scope, within_deadline
+
+USER_ID = "U_mock_user_123"
+
+
+class SlowStorage:
+    """呼び出しごとに遅延し、渡されたタイムアウトを記録するストレージのスタブ"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+        self.timeouts = []
+
+    def fetch_user_responses(self, user_id):
+        import main
+        self.calls += 1
+        # スレッドプールで実行されるFirestoreの呼び出しと同じくタイムアウトを求める
+        self.timeouts.append(main.storage_timeout())
+        time.sleep(self.delay)
+        return []
+
+
+@pytest.fixture
+def slow_storage():
+    storage = SlowStorage(delay=0.5)
+    with patch('main.fetch_user_responses', storage.fetch_user_responses), patch('main.RATE_LIMIT_ENABLED', False):
+        yield storage
+
+
+class TestDeadline:
+    """期限の計算のテストクラス"""
+
+    def test_call_timeout_is_capped_by_remaining(self):
+        assert call_timeout(5.0) == 5.0
+        with deadline_scope(0.2):
+            assert 0 < call_timeout(5.0) <= 0.2
+            assert call_timeout(0.05) == 0.05
+
+    def test_exhausted_budget_does_not_start_work(self):
+        """残り時間がない場合は処理を開始せずにDeadlineExceeded"""
+        started = []
+
+        async def work():
+            started.append(True)
+
+        with deadline_scope(0.01):
+            time.sleep(0.02)
+            with pytest.raises(DeadlineExceeded):
+                asyncio.run(within_deadline(work()))
+        assert started == []
+
+    def test_route_timeouts(self):
+        middleware = DeadlineMiddleware(None, default_timeout=10, route_timeouts=[(r"/stream", None), (r"/slow", 30)])
+        assert middleware.timeout_for("/survey/results") == 10
+        assert middleware.timeout_for("/slow") == 30
+        assert middleware.timeout_for("/stream", "1") is None
+        # ヘッダーは既定値より短い場合のみ採用する
+        assert middleware.timeout_for("/survey/results", "2.5") == 2.5
+        assert middleware.timeout_for("/survey/results", "60") == 10
+        assert middleware.timeout_for("/survey/results", "invalid") == 10
+        assert middleware.timeout_for("/survey/results", "-1") == 10
+
+
+class TestDeadlinePropagation:
+    """リクエストの期限がストレージの呼び出しに伝播することのテストクラス"""
+
+    def test_slow_storage_returns_504(self, client: TestClient, slow_storage):
+        started = time.monotonic()
+        response = client.post("/user/status", json={"userId": USER_ID}, headers={"X-Request-Timeout": "0.2"})
+        elapsed = time.monotonic() - started
+
+        assert response.status_code == 504
+        assert response.json()["success"] is False
+        assert response.headers["cache-control"] == "no-store"
+        assert elapsed < 0.45
+        # スレッドプールで実行される呼び出しにも残り時間がタイムアウトとして渡る
+        assert 0 < slow_storage.timeouts[0] <= 0.2
+
+    def test_default_timeout_allows_slow_storage(self, client: TestClient, slow_storage):
+        response = client.post("/user/status", json={"userId": USER_ID})
+        assert response.status_code == 200
+        assert 0.2 < slow_storage.timeouts[0] <= 5.0
+
+    def test_coalesced_caller_survives_other_callers_deadline(self, client: TestClient, slow_storage):
+        """同じ読み取りを共有する呼び出し元が期限切れになっても、他の呼び出し元は結果を受け取れること"""
+        from main import app
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await asyncio.gather(
+                    http.post("/user/status", json={"userId": USER_ID}, headers={"X-Request-Timeout": "0.1"}),
+                    http.post("/user/status", json={"userId": USER_ID}),
+                )
+
+        short, default = asyncio.run(run())
+        assert short.status_code == 504
+        assert default.status_code == 200
+        assert slow_storage.calls == 1
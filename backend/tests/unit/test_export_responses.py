@@ -0,0 +1,82 @@
+"""列指向エクスポートのユニットテスト"""
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.dataset as ds  # noqa: E402
+
+from export_responses import export_responses  # noqa: E402
+from tests.config import MULTIPLE_TEST_DATA  # noqa: E402
+
+NOW = datetime(2025, 8, 12, 12, 0, 0)
+
+
+def add_responses(mock_firestore, timestamps):
+    collection = mock_firestore.collection('survey_responses')
+    for i, timestamp in enumerate(timestamps):
+        collection.add({
+            **MULTIPLE_TEST_DATA[i % len(MULTIPLE_TEST_DATA)],
+            "userId": f"U{i}",
+            "timestamp": timestamp,
+            "createdAt": timestamp
+        })
+
+
+def read_export(output_dir, file_format="parquet"):
+    dataset = ds.dataset(output_dir, format="ipc" if file_format == "arrow" else "parquet", partitioning="hive")
+    return dataset.to_table()
+
+
+class TestExportResponses:
+    """export_responsesのテストクラス"""
+
+    def test_partitions_by_created_date(self, mock_firestore, tmp_path):
+        """createdAtの日付ごとのパーティションに全件を書き出すこと"""
+        add_responses(mock_firestore, [f"2025-08-{day:02d}T{hour:02d}:00:00" for day in (10, 11) for hour in range(5)])
+
+        written = export_responses(str(tmp_path), page_size=3, now=NOW)
+
+        assert written == {"2025-08-10": 5, "2025-08-11": 5}
+        assert sorted(os.listdir(tmp_path)) == ["_watermark.json", "date=2025-08-10", "date=2025-08-11"]
+        table = read_export(str(tmp_path))
+        assert table.num_rows == 10
+        assert pa.types.is_dictionary(table.schema.field("gender").type)
+        assert sorted(set(table.column("userId").to_pylist())) == sorted(f"U{i}" for i in range(10))
+
+        watermark = json.loads((tmp_path / "_watermark.json").read_text())
+        assert watermark["createdAt"] == "2025-08-11T04:00:00"
+
+    def test_incremental_run_appends_new_responses(self, mock_firestore, tmp_path):
+        """2回目の実行ではwatermark以降の回答のみを新しいパーツとして追記すること"""
+        add_responses(mock_firestore, ["2025-08-10T09:00:00", "2025-08-11T09:00:00"])
+        export_responses(str(tmp_path), now=NOW)
+
+        add_responses(mock_firestore, ["2025-08-11T10:00:00", "2025-08-12T09:00:00"])
+        written = export_responses(str(tmp_path), now=NOW)
+
+        assert written == {"2025-08-11": 1, "2025-08-12": 1}
+        assert len(os.listdir(tmp_path / "date=2025-08-11")) == 2
+        assert read_export(str(tmp_path)).num_rows == 4
+
+        assert export_responses(str(tmp_path), now=NOW) == {}
+
+    def test_recent_responses_wait_for_next_run(self, mock_firestore, tmp_path):
+        """直近の回答は書き込み中の回答を取りこぼさないよう次回に回すこと"""
+        add_responses(mock_firestore, ["2025-08-12T11:59:30"])
+        assert export_responses(str(tmp_path), now=NOW) == {}
+
+    def test_arrow_ipc(self, mock_firestore, tmp_path):
+        """Arrow IPC形式でもページをまたいで辞書エンコードした列を書き出すこと"""
+        add_responses(mock_firestore, [f"2025-08-10T{hour:02d}:00:00" for hour in range(7)])
+
+        export_responses(str(tmp_path), file_format="arrow", page_size=2, now=NOW)
+
+        table = read_export(str(tmp_path), "arrow")
+        assert table.num_rows == 7
+        assert pa.types.is_dictionary(table.schema.field("age").type)
+        assert sorted(table.column("age").to_pylist()) == sorted(
+            MULTIPLE_TEST_DATA[i % len(MULTIPLE_TEST_DATA)]["age"] for i in range(7)
+        )
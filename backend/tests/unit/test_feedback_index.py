@@ -0,0 +1,234 @@
+"""自由記述の転置インデックスのユニットテスト"""
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from tests.config import MULTIPLE_TEST_DATA, SAMPLE_SURVEY_DATA
+from text_index import FeedbackIndex, is_keyword, tokenize
+
+
+class TestTokenize:
+    """トークナイザのテストクラス"""
+
+    def test_japanese_bigrams(self):
+        """日本語の連続部分は文字bigramになること"""
+        assert tokenize("接客が良い") == ["接客", "客が", "が良", "良い"]
+
+    def test_ascii_words_and_normalization(self):
+        """英数字は単語単位で、全角・大文字は正規化されること"""
+        assert tokenize("ＬＩＮＥのApp、最高!") == ["line", "の", "app", "最高"]
+
+    def test_unigrams_for_indexing(self):
+        """登録用のトークンは日本語の各文字を含むこと"""
+        assert tokenize("味が良い", unigrams=True) == ["味が", "が良", "良い", "味", "が", "良", "い"]
+        assert tokenize("app", unigrams=True) == ["app"]
+
+    def test_keyword_filter(self):
+        """ひらがなのみ・1文字のトークンはキーワードにしないこと"""
+        assert is_keyword("接客")
+        assert is_keyword("app")
+        assert not is_keyword("です")
+        assert not is_keyword("の")
+
+
+class TestFeedbackIndex:
+    """FeedbackIndexのテストクラス"""
+
+    @pytest.fixture
+    def index(self):
+        index = FeedbackIndex()
+        index.add_many([
+            ("r1", "スタッフの接客が丁寧でした", "2025-08-01T10:00:00"),
+            ("r2", "アプリが使いやすい", "2025-08-02T10:00:00"),
+            ("r3", "接客が遅いと感じました", "2025-08-03T10:00:00"),
+            ("r4", None, "2025-08-04T10:00:00"),
+        ])
+        return index
+
+    def test_search_newest_first(self, index):
+        """全トークンを含む回答が新しい順に返ること"""
+        assert index.search("接客") == ["r3", "r1"]
+        assert index.search("接客 丁寧") == ["r1"]
+        assert index.search("接客", limit=1) == ["r3"]
+        assert index.search("存在しない") == []
+
+    def test_single_character_query(self, index):
+        """1文字のクエリは、その文字を含む回答に一致すること"""
+        assert index.search("客") == ["r3", "r1"]
+        assert index.search("丁") == ["r1"]
+
+    def test_remove(self, index):
+        """置き換え・削除した回答は検索とキーワード集計から除かれること"""
+        index.add("r5", "接客は最高", "2025-08-05T10:00:00")
+        assert dict(index.top_keywords(5))["接客"] == 3
+
+        # 自由記述が分かる場合はポスティングリストから取り除く
+        assert index.remove("r5", "接客は最高")
+        # 分からない場合は欠番とし、キーワード集計時に取り除く
+        assert index.remove("r3")
+        assert not index.remove("r3")
+
+        assert index.search("接客") == ["r1"]
+        assert dict(index.top_keywords(100))["接客"] == 1
+        assert "最高" not in dict(index.top_keywords(100))
+        assert len(index) == 2
+        assert index.metrics()["postings"] == sum(len(p) for p in index._postings.values())
+
+    def test_remove_months(self, index, tmp_path):
+        """除いた月の回答は検索から除かれ、以降も追加しないこと"""
+        index.add("r5", "接客は最高", "2025-09-01T10:00:00")
+        assert index.remove_months(["2025-08"]) == 3
+        assert index.remove_months(["2025-08"]) == 0
+        assert index.search("接客") == ["r5"]
+        assert not index.add("r6", "接客", "2025-08-31T10:00:00")
+
+        path = tmp_path / "feedback.idx"
+        index.save(str(path))
+        restored = FeedbackIndex.load(str(path))
+        assert restored.search("接客") == ["r5"]
+        assert len(restored) == 1
+        assert not restored.add("r6", "接客", "2025-08-31T10:00:00")
+
+    def test_add_is_idempotent(self, index):
+        """追加済みの回答・空の記述は追加しないこと"""
+        assert not index.add("r1", "接客")
+        assert not index.add("r5", "")
+        assert len(index) == 3
+        assert index.watermark == "2025-08-04T10:00:00"
+
+    def test_top_keywords(self, index):
+        """出現する回答数の多い順にキーワードを返すこと"""
+        keywords = dict(index.top_keywords(5))
+        assert keywords["接客"] == 2
+        assert "した" not in keywords
+
+        index.add("r5", "接客は最高")
+        assert index.top_keywords(1) == [("接客", 3)]
+
+    def test_persistence_roundtrip(self, index, tmp_path):
+        """圧縮したポスティングリストから同じインデックスを復元できること"""
+        for number in range(300):
+            index.add(f"bulk{number}", "接客")
+        path = tmp_path / "feedback.idx"
+        index.save(str(path))
+
+        restored = FeedbackIndex.load(str(path))
+        assert restored.watermark == index.watermark
+        assert restored.metrics() == index.metrics()
+        assert restored.search("接客", limit=500) == index.search("接客", limit=500)
+
+    def test_save_replaces_atomically(self, index, tmp_path, monkeypatch):
+        """書き込みに失敗しても既存のファイルと一時ファイルが残らないこと"""
+        path = tmp_path / "feedback.idx"
+        index.save(str(path))
+        saved = path.read_bytes()
+
+        def fail():
+            raise OSError("disk full")
+
+        monkeypatch.setattr(index, "to_bytes", fail)
+        with pytest.raises(OSError):
+            index.save(str(path))
+        assert path.read_bytes() == saved
+        assert [p.name for p in tmp_path.iterdir()] == ["feedback.idx"]
+
+
+class TestFeedbackEndpoints:
+    """自由記述の検索・キーワードエンドポイントのテストクラス"""
+
+    def test_search_submitted_feedback(self, client: TestClient):
+        """送信した回答の自由記述を検索できること"""
+        for test_data in MULTIPLE_TEST_DATA:
+            client.post("/survey/submit", json=test_data)
+
+        response = client.get("/survey/feedback/search", params={"q": "サービス"})
+        assert response.status_code == 200
+        responses = response.json()["data"]["responses"]
+        assert [r["feedback"] for r in responses] == ["素晴らしいサービスです"]
+
+    def test_sync_from_firestore(self, client: TestClient, mock_firestore):
+        """他インスタンスが保存した回答を取り込んで検索・集計できること"""
+        timestamp = datetime.now().isoformat()
+        mock_firestore.collection('survey_responses').add({
+            **SAMPLE_SURVEY_DATA,
+            "userId": "U_other_instance",
+            "timestamp": timestamp,
+            "createdAt": timestamp
+        })
+
+        response = client.get("/survey/feedback/keywords", params={"limit": 10})
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["total_responses"] == 1
+        assert {"keyword": "サー", "count": 1} in data["keywords"]
+
+        search = client.get("/survey/feedback/search", params={"q": "とても良い"})
+        assert search.json()["data"]["responses"][0]["userId"] == "U_other_instance"
+
+    def test_sync_reads_late_arrivals_before_watermark(self, client: TestClient, mock_firestore):
+        """watermarkより少し前のcreatedAtで後から見えるようになった回答も取り込むこと"""
+        now = datetime.now()
+        responses = mock_firestore.collection('survey_responses')
+
+        def add_from_other_instance(created_at, feedback):
+            responses.add({
+                **SAMPLE_SURVEY_DATA, "feedback": feedback, "userId": "U_other_instance",
+                "timestamp": created_at.isoformat(), "createdAt": created_at.isoformat()
+            })
+
+        add_from_other_instance(now, "接客が丁寧")
+        with patch('main.FEEDBACK_INDEX_SYNC_INTERVAL', 0):
+            assert client.get("/survey/feedback/keywords").json()["data"]["total_responses"] == 1
+            # 時計が遅れているインスタンスの回答（watermarkより前のcreatedAt）
+            add_from_other_instance(now - timedelta(seconds=10), "アプリが便利")
+            data = client.get("/survey/feedback/keywords").json()["data"]
+
+        assert data["total_responses"] == 2
+        assert len(client.get("/survey/feedback/search", params={"q": "アプリ"}).json()["data"]["responses"]) == 1
+
+    def test_overwritten_response_is_removed(self, client: TestClient, mock_firestore):
+        """置き換えた回答は検索・キーワード集計から除かれること"""
+        with patch('main.RESPONSE_POLICY', 'overwrite'), patch('main.RATE_LIMIT_ENABLED', False):
+            for feedback in ["接客が丁寧", "アプリが便利"]:
+                assert client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "feedback": feedback}).status_code == 200
+
+        assert client.get("/survey/feedback/search", params={"q": "接客"}).json()["data"]["responses"] == []
+        keywords = client.get("/survey/feedback/keywords", params={"limit": 100}).json()["data"]
+        assert keywords["total_responses"] == 1
+        assert "接客" not in [k["keyword"] for k in keywords["keywords"]]
+
+    def test_missing_hits_are_removed(self, client: TestClient, mock_firestore):
+        """他インスタンスで削除された回答は、検索で見つからなかった時点でインデックスから除かれること"""
+        import main
+
+        client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "feedback": "接客が丁寧"})
+        doc_id = main.feedback_index.search("接客")[0]
+        mock_firestore.collection('survey_responses').document(doc_id)._data = {}
+
+        assert client.get("/survey/feedback/search", params={"q": "接客"}).json()["data"]["responses"] == []
+        assert main.feedback_index.search("接客") == []
+        assert len(main.feedback_index) == 0
+
+    def test_archived_months_are_removed(self, client: TestClient, mock_firestore):
+        """アーカイブ済みのパーティションの回答はキーワード集計から除かれること"""
+        from partitions import PARTITION_COLLECTION, STATUS_ARCHIVED, PartitionRegistry, partition_path
+
+        mock_firestore.collection(PARTITION_COLLECTION).document("2024-01").set({"collection": partition_path("2024-01")})
+        mock_firestore.collection(partition_path("2024-01")).document("old").set({
+            **SAMPLE_SURVEY_DATA, "feedback": "接客が丁寧", "createdAt": "2024-01-05T00:00:00"
+        })
+        with patch('main.RESPONSE_PARTITIONING', 'monthly'), \
+                patch('main.response_partitions', PartitionRegistry(refresh_interval=0)), \
+                patch('main.FEEDBACK_INDEX_SYNC_INTERVAL', 0):
+            assert client.get("/survey/feedback/keywords").json()["data"]["total_responses"] == 1
+
+            mock_firestore.collection(PARTITION_COLLECTION).document("2024-01").set({"status": STATUS_ARCHIVED}, merge=True)
+            keywords = client.get("/survey/feedback/keywords").json()["data"]
+        assert keywords["total_responses"] == 0
+        assert keywords["keywords"] == []
+
+    def test_search_requires_query(self, client: TestClient):
+        """クエリ未指定は422になること"""
+        assert client.get("/survey/feedback/search").status_code == 422
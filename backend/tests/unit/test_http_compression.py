@@ -0,0 +1,131 @@
+"""レスポンスの圧縮とキャッシュ制御のユニットテスト"""
+import gzip
+import json
+from unittest.mock import patch
+
+import brotli
+import pytest
+from fastapi.testclient import TestClient
+
+from compression import negotiate_encoding
+from http_cache import etag_matches
+from sqlite_storage import SQLiteStore
+from synthetic_data import generate_responses
+
+USER_ID = "U_mock_user_123"
+
+
+@pytest.fixture(params=["list", "sqlite"])
+def local_responses(request, tmp_path):
+    """Firestoreを使わない場合の各ストアに2,500件の回答を保存する"""
+    responses = list(generate_responses(2500, seed=7))
+    if request.param == "list":
+        store = responses
+    else:
+        store = SQLiteStore(str(tmp_path / "survey.db"))
+        store.extend(responses)
+    with patch('main.FIRESTORE_AVAILABLE', False), patch('main.mock_storage', store):
+        yield responses
+    if not isinstance(store, list):
+        store.close()
+
+
+def raw_get(client: TestClient, url: str, accept_encoding: str, **headers):
+    """展開せずにレスポンスのバイト列を取得する"""
+    with client.stream("GET", url, headers={"Accept-Encoding": accept_encoding, **headers}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+class TestNegotiation:
+    """Accept-Encodingの解釈のテストクラス"""
+
+    @pytest.mark.parametrize("header, expected", [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0.5, gzip;q=0.8", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("*;q=0.1, br;q=0", "gzip"),
+        ("identity", None),
+        ("", None),
+    ])
+    def test_negotiate_encoding(self, header, expected):
+        assert negotiate_encoding(header, ("br", "gzip")) == expected
+
+
+class TestCompression:
+    """レスポンスの圧縮のテストクラス"""
+
+    def test_large_results_are_compressed(self, client: TestClient, local_responses):
+        response, body = raw_get(client, "/survey/results?limit=1000", "br, gzip")
+        assert response.headers["content-encoding"] == "br"
+        assert int(response.headers["content-length"]) == len(body)
+        assert "Accept-Encoding" in response.headers["vary"]
+        payload = json.loads(brotli.decompress(body))
+        assert len(payload["data"]["responses"]) == 1000
+
+        response, gzipped = raw_get(client, "/survey/results?limit=1000", "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert json.loads(gzip.decompress(gzipped)) == payload
+
+        response, identity = raw_get(client, "/survey/results?limit=1000", "identity")
+        assert "content-encoding" not in response.headers
+        assert len(body) < len(gzipped) < len(identity) / 4
+
+    def test_small_response_is_not_compressed(self, client: TestClient):
+        response, body = raw_get(client, "/health", "gzip")
+        assert "content-encoding" not in response.headers
+        assert json.loads(body)["success"] is True
+        assert "Accept-Encoding" in response.headers["vary"]
+
+    def test_export_streams_compressed_ndjson(self, client: TestClient, local_responses):
+        """エクスポートはページごとにフラッシュしながら圧縮し、全件を出力すること"""
+        with client.stream("GET", "/survey/results/export?gender=female", headers={"Accept-Encoding": "gzip"}) as response:
+            assert response.headers["content-encoding"] == "gzip"
+            assert "content-length" not in response.headers
+            chunks = list(response.iter_raw())
+
+        lines = gzip.decompress(b"".join(chunks)).decode("utf-8").splitlines()
+        expected = [r for r in local_responses if r["gender"] == "female"]
+        assert len(lines) == len(expected)
+        assert {json.loads(line)["id"] for line in lines} == {r["id"] for r in expected}
+
+    def test_sse_is_not_compressed(self):
+        from compression import EXCLUDED_CONTENT_TYPES
+        assert "text/event-stream".startswith(EXCLUDED_CONTENT_TYPES)
+
+
+class TestCacheControl:
+    """ルートごとのCache-Controlと条件付きリクエストのテストクラス"""
+
+    def test_route_policies(self, client: TestClient, mock_firestore):
+        assert client.get("/health").headers["cache-control"].startswith("public, max-age=")
+        assert client.get("/survey/statistics").headers["cache-control"].startswith("public, max-age=")
+        assert client.get(f"/user/{USER_ID}/latest-response").headers["cache-control"] == "private, no-cache"
+        assert client.get("/metrics").headers["cache-control"] == "no-store"
+        assert client.post("/user/status", json={"userId": USER_ID}).headers["cache-control"] == "no-store"
+
+    def test_errors_are_not_cached(self, client: TestClient):
+        response = client.get("/survey/results?limit=0")
+        assert response.status_code == 422
+        assert response.headers["cache-control"] == "no-store"
+        assert "etag" not in response.headers
+
+    def test_if_none_match_returns_not_modified(self, client: TestClient, local_responses):
+        first = client.get("/survey/statistics")
+        etag = first.headers["etag"]
+        assert etag.startswith('W/"')
+
+        response, body = raw_get(client, "/survey/statistics", "gzip", **{"If-None-Match": etag})
+        assert response.status_code == 304
+        assert body == b""
+        assert response.headers["etag"] == etag
+        assert response.headers["cache-control"] == first.headers["cache-control"]
+
+        assert client.get("/survey/statistics", headers={"If-None-Match": 'W/"other"'}).status_code == 200
+
+    def test_etag_weak_comparison(self):
+        assert etag_matches('"abc"', 'W/"abc"')
+        assert etag_matches('W/"x", W/"abc"', 'W/"abc"')
+        assert etag_matches("*", 'W/"abc"')
+        assert not etag_matches('"abd"', 'W/"abc"')
@@ -0,0 +1,179 @@
+"""ローカルストレージ（追記専用ログ）のユニットテスト"""
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from local_storage import AppendOnlyLog
+from synthetic_data import generate_responses
+from tests.config import SAMPLE_SURVEY_DATA
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "responses.log")
+
+
+@pytest.fixture
+def open_log(log_path):
+    """テスト終了時に閉じるログを開く"""
+    logs = []
+
+    def _open(**kwargs):
+        log = AppendOnlyLog(log_path, **kwargs)
+        logs.append(log)
+        return log
+
+    yield _open
+    for log in logs:
+        if not log._file.closed:
+            log.close()
+
+
+class TestAppendOnlyLog:
+    """AppendOnlyLogのテストクラス"""
+
+    def test_append_and_read(self, open_log):
+        """追記した回答をID・ユーザーID・位置で読み取れること"""
+        log = open_log()
+        log.append({"id": "r1", "userId": "U1", "feedback": "接客が丁寧でした"})
+        log.append({"id": "r2", "userId": "U2"})
+        log.append({"id": "r3", "userId": "U1"})
+
+        assert len(log) == 3
+        assert log.get("r1")["feedback"] == "接客が丁寧でした"
+        assert log.get("missing") is None
+        assert [r["id"] for r in log.by_user("U1")] == ["r1", "r3"]
+        assert log.by_user("U9") == []
+        assert [r["id"] for r in log] == ["r1", "r2", "r3"]
+        assert log[-1]["id"] == "r3"
+        assert [r["id"] for r in log[1:]] == ["r2", "r3"]
+
+    def test_recover_after_restart(self, open_log):
+        """再度開いた場合に索引が復元されること"""
+        log = open_log()
+        log.extend(generate_responses(500, seed=1))
+        log.close()
+
+        reopened = open_log()
+        assert len(reopened) == 500
+        expected = list(generate_responses(500, seed=1))
+        assert list(reopened) == expected
+        user_id = expected[0]["userId"]
+        assert reopened.by_user(user_id) == [r for r in expected if r["userId"] == user_id]
+
+        # 復元後も続けて追記できること
+        reopened.append({"id": "after", "userId": user_id})
+        assert reopened.get("after")["userId"] == user_id
+
+    def test_truncates_torn_tail(self, open_log, log_path):
+        """書き込み途中で途切れた末尾のレコードを切り詰めること"""
+        log = open_log()
+        log.append({"id": "r1", "userId": "U1"})
+        log.append({"id": "r2", "userId": "U1"})
+        log.close()
+        size = os.path.getsize(log_path)
+        with open(log_path, "r+b") as f:
+            f.truncate(size - 3)
+
+        reopened = open_log()
+        assert [r["id"] for r in reopened] == ["r1"]
+        assert reopened.truncated_bytes > 0
+        reopened.append({"id": "r3", "userId": "U1"})
+        reopened.close()
+        assert [r["id"] for r in open_log()] == ["r1", "r3"]
+
+    def test_stops_at_corrupted_record(self, open_log, log_path):
+        """CRCが一致しないレコード以降を破棄すること"""
+        log = open_log()
+        log.append({"id": "r1"})
+        log.append({"id": "r2"})
+        log.close()
+        with open(log_path, "r+b") as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(b"xx")
+
+        assert [r["id"] for r in open_log()] == ["r1"]
+
+    def test_batches_fsync(self, open_log):
+        """fsyncが件数ごとにまとめて同期スレッドで行われること"""
+        log = open_log(fsync_interval=60, fsync_batch=100)
+        with patch('local_storage.os.fsync', side_effect=os.fsync) as fsync:
+            log.extend({"id": f"r{i}"} for i in range(99))
+            time.sleep(0.05)
+            assert log.fsyncs == 0
+            assert log.metrics()["unsynced"] == 99
+
+            log.append({"id": "r99"})
+            deadline = time.monotonic() + 2
+            while log.fsyncs == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert log.fsyncs == 1
+            assert log.metrics()["unsynced"] == 0
+            # 追記したスレッドではfsyncしない
+            assert fsync.call_count == 1
+
+            log.append({"id": "r100"})
+            log.sync()
+            assert log.fsyncs == 2
+
+    def test_append_during_fsync(self, open_log):
+        """fsyncの間もロックを保持せず、追記できること"""
+        log = open_log(fsync_interval=60)
+        log.append({"id": "r0"})
+        started, release = threading.Event(), threading.Event()
+
+        def slow_fsync(fd):
+            started.set()
+            release.wait(2)
+
+        with patch('local_storage.os.fsync', side_effect=slow_fsync):
+            syncer = threading.Thread(target=log.sync)
+            syncer.start()
+            assert started.wait(2)
+            log.append({"id": "r1"})
+            assert log.metrics()["unsynced"] == 1
+            release.set()
+            syncer.join()
+        assert [r["id"] for r in log] == ["r0", "r1"]
+
+
+class TestLocalStorageApi:
+    """Firestoreを使わない場合のAPIのテストクラス"""
+
+    def test_submissions_survive_restart(self, client: TestClient, open_log):
+        """送信した回答が再起動後もユーザーの状態に反映されること"""
+        log = open_log()
+        with patch('main.FIRESTORE_AVAILABLE', False), patch('main.mock_storage', log), \
+                patch('main.mock_rollups', {}), patch('main.mock_user_sketches', {}):
+            response = client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+            assert response.status_code == 200
+        log.close()
+
+        reopened = open_log()
+        with patch('main.FIRESTORE_AVAILABLE', False), patch('main.mock_storage', reopened):
+            response = client.post("/user/status", json={"userId": "U_mock_user_123"})
+            assert response.status_code == 200
+            data = response.json()["data"]
+            assert data["hasResponse"] is True
+            assert data["lastResponseId"] == "mock_1"
+
+    def test_feedback_search_reads_by_id(self, client: TestClient, open_log):
+        """検索結果は回答IDの索引から読み、ログの走査は起動後の初回のみとすること"""
+        log = open_log()
+        log.extend({
+            **SAMPLE_SURVEY_DATA, "id": f"old{i}", "userId": "U_old", "feedback": "接客が丁寧",
+            "timestamp": f"2024-01-0{i + 1}T00:00:00", "createdAt": f"2024-01-0{i + 1}T00:00:00"
+        } for i in range(3))
+        with patch('main.FIRESTORE_AVAILABLE', False), patch('main.mock_storage', log), \
+                patch('main.mock_rollups', {}), patch('main.mock_user_sketches', {}), \
+                patch('main.FEEDBACK_INDEX_SYNC_INTERVAL', 0):
+            assert len(client.get("/survey/feedback/search", params={"q": "接客"}).json()["data"]["responses"]) == 3
+            client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "feedback": "接客が最高"})
+
+            with patch.object(AppendOnlyLog, '__iter__', side_effect=AssertionError("full scan")):
+                responses = client.get("/survey/feedback/search", params={"q": "接客"}).json()["data"]["responses"]
+        assert [r["feedback"] for r in responses] == ["接客が最高"] + ["接客が丁寧"] * 3
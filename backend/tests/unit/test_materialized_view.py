@@ -0,0 +1,203 @@
+"""マテリアライズドビューのユニットテスト"""
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from analytics import SurveyRow
+from materialized_view import MaterializedView
+from tests.config import MULTIPLE_TEST_DATA
+
+
+def make_change(change_type, doc_id, data=None):
+    """on_snapshotに渡される変更オブジェクトの代用"""
+    return SimpleNamespace(
+        type=SimpleNamespace(name=change_type),
+        document=SimpleNamespace(id=doc_id, to_dict=lambda: data)
+    )
+
+
+def make_doc(index, user_id, satisfaction="4", day="2025-08-10"):
+    base = MULTIPLE_TEST_DATA[index % len(MULTIPLE_TEST_DATA)]
+    timestamp = f"{day}T12:00:{index:02d}"
+    return {**base, "userId": user_id, "satisfaction": satisfaction, "timestamp": timestamp, "createdAt": timestamp}
+
+
+class FakeCollection:
+    """on_snapshotのコールバックを記録するコレクションの代用"""
+
+    def __init__(self):
+        self.callbacks = []
+        self.watches = []
+
+    def on_snapshot(self, callback):
+        self.callbacks.append(callback)
+        watch = SimpleNamespace(unsubscribe=lambda: None, is_active=True)
+        self.watches.append(watch)
+        return watch
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def warm_view():
+    """初回スナップショットを反映済みのビュー"""
+    view = MaterializedView()
+    docs = {
+        "d1": make_doc(1, "U1", "5"),
+        "d2": make_doc(2, "U1", "3"),
+        "d3": make_doc(3, "U2", "4", day="2025-08-11"),
+    }
+    view.on_snapshot(None, [make_change("ADDED", doc_id, data) for doc_id, data in docs.items()], None)
+    return view, docs
+
+
+class TestMaterializedView:
+    """MaterializedViewのテストクラス"""
+
+    def test_ready_after_initial_snapshot(self):
+        """初回スナップショットの反映でreadyになること"""
+        view = MaterializedView()
+        assert not view.ready
+
+        view.on_snapshot(None, [], None)
+        assert view.ready
+
+    def test_user_latest_index(self, warm_view):
+        """ユーザー別の回答が新しい順に取得できること"""
+        view, _ = warm_view
+
+        responses = view.user_responses("U1")
+        assert [r["id"] for r in responses] == ["d2", "d1"]
+        assert view.user_responses("unknown") == []
+
+    def test_statistics_match_full_scan(self, warm_view):
+        """統計カウンタが全件の計算結果と一致すること"""
+        from main import calculate_statistics
+        view, docs = warm_view
+
+        expected = calculate_statistics([SurveyRow(d, doc_id) for doc_id, d in docs.items()])
+        assert view.statistics() == expected.model_dump()
+
+    def test_modified_and_removed(self, warm_view):
+        """変更・削除が統計とインデックスに反映されること"""
+        from main import calculate_statistics
+        view, docs = warm_view
+
+        docs["d1"] = make_doc(1, "U3", "1")
+        del docs["d3"]
+        view.on_snapshot(None, [
+            make_change("MODIFIED", "d1", docs["d1"]),
+            make_change("REMOVED", "d3", None),
+        ], None)
+
+        expected = calculate_statistics([SurveyRow(d, doc_id) for doc_id, d in docs.items()])
+        assert view.statistics() == expected.model_dump()
+        assert [r["id"] for r in view.user_responses("U1")] == ["d2"]
+        assert view.user_responses("U2") == []
+
+    def test_overflow_disables_view(self):
+        """保持件数の上限を超えるとビューが無効化されること"""
+        view = MaterializedView(max_documents=2)
+        view.on_snapshot(None, [make_change("ADDED", f"d{i}", make_doc(i, f"U{i}")) for i in range(3)], None)
+
+        assert not view.ready
+        assert view.metrics()["overflowed"] is True
+        assert view.metrics()["documents"] == 0
+
+    def test_resync_reloads(self, warm_view):
+        """再同期でビューを初期化してリスナーを張り直すこと"""
+        view, _ = warm_view
+        collection = FakeCollection()
+        view.resync(collection)
+
+        assert not view.ready
+        assert view.metrics()["documents"] == 0
+        collection.callbacks[0](None, [make_change("ADDED", "d9", make_doc(9, "U9"))], None)
+        assert view.ready
+        assert view.metrics()["documents"] == 1
+
+
+    def test_listener_error_falls_back_and_resubscribes(self):
+        """変更の反映に失敗した場合はビューを無効化し、リスナーを張り直すこと"""
+        view = MaterializedView(retry_delay=0.01)
+        collection = FakeCollection()
+        view.start(collection)
+        try:
+            malformed = {k: v for k, v in make_doc(1, "U1").items() if k != "timestamp"}
+            collection.callbacks[0](None, [
+                make_change("ADDED", "d0", make_doc(0, "U0")),
+                make_change("ADDED", "d1", malformed),
+            ], None)
+
+            assert not view.ready
+            assert view.metrics()["documents"] == 0
+            assert view.metrics()["failures"] == 1
+            assert "KeyError" in view.metrics()["last_error"]
+            # 失敗後の変更は反映しない
+            collection.callbacks[0](None, [make_change("ADDED", "d2", make_doc(2, "U2"))], None)
+            assert not view.ready
+
+            assert wait_until(lambda: len(collection.callbacks) == 2)
+            collection.callbacks[1](None, [make_change("ADDED", "d0", make_doc(0, "U0"))], None)
+            assert view.ready
+            assert view.metrics()["documents"] == 1
+        finally:
+            view.stop()
+
+    def test_stopped_listener_is_resubscribed(self):
+        """リスナーが停止した場合はreadyをFalseとし、リスナーを張り直すこと"""
+        view = MaterializedView(retry_delay=0.01)
+        collection = FakeCollection()
+        view.start(collection)
+        try:
+            collection.callbacks[0](None, [], None)
+            assert view.ready
+
+            collection.watches[0].is_active = False
+            assert not view.ready
+            assert wait_until(lambda: len(collection.callbacks) == 2)
+        finally:
+            view.stop()
+
+
+class TestMaterializedViewEndpoints:
+    """マテリアライズドビューを使うエンドポイントのテストクラス"""
+
+    def test_reads_served_from_memory(self, client: TestClient, mock_firestore, warm_view):
+        """ビューがreadyの場合はFirestoreへ問い合わせないこと"""
+        view, _ = warm_view
+        collection = mock_firestore.collection('survey_responses')
+
+        with patch("main.materialized_view", view), \
+             patch("main.verify_line_id_token") as _:
+            bootstrap = client.post("/user/bootstrap", json={"userId": "U_mock_user_123"})
+            statistics = client.get("/survey/statistics")
+
+        assert bootstrap.status_code == 200
+        assert statistics.status_code == 200
+        assert statistics.json()["data"]["total_responses"] == 3
+        assert statistics.json()["data"]["unique_users"] == 2
+        assert collection.executed_queries == []
+
+    def test_fallback_without_view(self, client: TestClient, mock_firestore):
+        """ビューが無効な場合はFirestoreから計算すること"""
+        for test_data in MULTIPLE_TEST_DATA:
+            client.post("/survey/submit", json=test_data)
+
+        response = client.get("/survey/statistics")
+        assert response.status_code == 200
+        assert response.json()["data"]["total_responses"] == 3
+        assert mock_firestore.collection('survey_responses').executed_queries
+
+    def test_resync_requires_enabled_view(self, client: TestClient):
+        """ビューが無効な場合の再同期は409になること"""
+        response = client.post("/admin/materialized-view/resync")
+        assert response.status_code == 409
@@ -0,0 +1,103 @@
+"""リクエスト単位のプロファイリングのユニットテスト"""
+import time
+from collections import deque
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from profiling import sign_debug_token, verify_debug_token
+
+SECRET = "test-secret"
+
+
+def busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def busy_parse_result_fields(fields):
+    """イベントループのスレッドで実行される処理"""
+    busy(0.1)
+    return None
+
+
+def busy_load_survey_results(limit, offset, projection, filters):
+    """スレッドプールで実行される処理"""
+    busy(0.1)
+    return {"responses": [], "statistics": {}, "pagination": {"limit": limit, "offset": offset, "total": 0}}
+
+
+@pytest.fixture
+def profiler():
+    """ミドルウェアが参照するプロファイラーの設定を差し替える"""
+    from main import request_profiler
+    with patch.object(request_profiler, 'sample_rate', 0.0), patch.object(request_profiler, 'debug_secret', None), \
+            patch.object(request_profiler, 'interval', 0.002), \
+            patch.object(request_profiler, 'profiles', deque(maxlen=3)), \
+            patch('main.RATE_LIMIT_ENABLED', False):
+        yield request_profiler
+
+
+class TestDebugToken:
+    """署名付きデバッグヘッダーのテストクラス"""
+
+    def test_valid_token(self):
+        assert verify_debug_token(SECRET, sign_debug_token(SECRET, ttl=60))
+
+    def test_expired_or_forged_token(self):
+        assert not verify_debug_token(SECRET, sign_debug_token(SECRET, ttl=60, now=time.time() - 120))
+        assert not verify_debug_token(SECRET, sign_debug_token("other-secret", ttl=60))
+        assert not verify_debug_token(SECRET, "not-a-token")
+
+
+class TestRequestProfiler:
+    """プロファイラーのテストクラス"""
+
+    def test_disabled_does_not_sample(self, client: TestClient, mock_firestore, profiler):
+        assert not profiler.enabled
+        client.get("/survey/results")
+        assert list(profiler.profiles) == []
+
+    def test_sampled_request_records_collapsed_stacks(self, client: TestClient, mock_firestore, profiler):
+        profiler.sample_rate = 1.0
+        with patch('main.parse_result_fields', busy_parse_result_fields), \
+                patch('main.load_survey_results', busy_load_survey_results):
+            assert client.get("/survey/results").status_code == 200
+
+        summaries = client.get("/admin/profiles").json()["data"]["profiles"]
+        # 管理用エンドポイント自体のリクエストも記録される
+        profile = next(p for p in summaries if p["request"] == "GET /survey/results")
+        assert profile["trigger"] == "sampled"
+        assert profile["status"] == 200
+        assert profile["samples"] > 0
+
+        collapsed = client.get(f"/admin/profiles/{profile['id']}").text
+        lines = collapsed.splitlines()
+        assert all(line.startswith("GET /survey/results;") for line in lines)
+        # イベントループ上の処理はエンドポイントの下に、スレッドプールの処理は[thread]の下に計上される
+        assert any("get_survey_results" in line and "busy_parse_result_fields" in line for line in lines)
+        assert any(";[thread];" in line and "busy_load_survey_results" in line for line in lines)
+        assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) >= profile["samples"]
+
+    def test_signed_debug_header(self, client: TestClient, mock_firestore, profiler):
+        profiler.debug_secret = SECRET
+        client.get("/health")
+        client.get("/health", headers={"X-Debug-Profile": sign_debug_token("other-secret")})
+        assert list(profiler.profiles) == []
+
+        response = client.get("/health", headers={"X-Debug-Profile": sign_debug_token(SECRET)})
+        assert response.status_code == 200
+        assert [p["trigger"] for p in profiler.profiles] == ["header"]
+
+    def test_ring_buffer_is_bounded(self, client: TestClient, mock_firestore, profiler):
+        profiler.sample_rate = 1.0
+        for _ in range(5):
+            client.get("/health")
+        assert len(profiler.profiles) == 3
+        assert client.get("/admin/profiles/1").status_code == 404
+
+    def test_merged_collapsed(self, profiler):
+        profiles = [{"stacks": {"GET /a;f": 2, "GET /a;g": 1}}, {"stacks": {"GET /a;f": 3}}]
+        assert profiler.collapsed(profiles) == "GET /a;f 5\nGET /a;g 1\n"
@@ -0,0 +1,144 @@
+"""レート制限・アドミッション制御のユニットテスト"""
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from ratelimit import ConcurrencyLimiter, InMemoryRateLimitBackend, RateLimitBackend
+from tests.config import SAMPLE_SURVEY_DATA
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+    """トークンバケットのテストクラス"""
+
+    def test_burst_then_limited(self):
+        """容量分は許可し、超過分は再試行時間を返すこと"""
+        clock = FakeClock()
+        backend = InMemoryRateLimitBackend(clock=clock)
+
+        assert [backend.acquire("k", rate=2, burst=3) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert backend.acquire("k", rate=2, burst=3) == pytest.approx(0.5)
+
+        # 補充後は再び許可される
+        clock.now = 0.5
+        assert backend.acquire("k", rate=2, burst=3) == 0.0
+
+    def test_keys_are_independent(self):
+        """キーごとに独立したバケットであること"""
+        backend = InMemoryRateLimitBackend(clock=FakeClock())
+
+        assert backend.acquire("a", rate=1, burst=1) == 0.0
+        assert backend.acquire("a", rate=1, burst=1) > 0
+        assert backend.acquire("b", rate=1, burst=1) == 0.0
+
+    def test_memory_is_bounded(self):
+        """バケット数が上限を超えないこと"""
+        backend = InMemoryRateLimitBackend(max_keys=10, clock=FakeClock())
+        for i in range(100):
+            backend.acquire(f"user-{i}", rate=1, burst=1)
+
+        assert len(backend._buckets) == 10
+
+
+class TestConcurrencyLimiter:
+    """同時実行数制限のテストクラス"""
+
+    def test_sheds_over_limit(self):
+        limiter = ConcurrencyLimiter(2)
+
+        assert limiter.try_acquire()
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+
+        limiter.release()
+        assert limiter.try_acquire()
+        assert limiter.metrics() == {"max_inflight": 2, "inflight": 2, "shed": 1}
+
+
+class TestRateLimitMiddleware:
+    """エンドポイントでのレート制限のテストクラス"""
+
+    def test_user_rate_limit(self, client: TestClient, mock_firestore):
+        """検証済みユーザー単位で429とRetry-Afterを返すこと"""
+        import main
+        with patch.object(main.user_rate_limiter, "burst", 2):
+            assert client.post("/survey/submit", json=SAMPLE_SURVEY_DATA).status_code == 200
+            assert client.post("/survey/submit", json=SAMPLE_SURVEY_DATA).status_code == 200
+
+            response = client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+            assert response.status_code == 429
+            assert int(response.headers["Retry-After"]) >= 1
+            assert response.json()["success"] is False
+
+    def test_ip_rate_limit(self, client: TestClient, mock_firestore):
+        """クライアントIP単位で429を返すこと"""
+        import main
+        with patch.object(main.ip_rate_limiter, "burst", 1):
+            assert client.post("/user/status", json={"userId": "U_mock_user_123"}).status_code == 200
+
+            response = client.post("/user/status", json={"userId": "U_mock_user_123"})
+            assert response.status_code == 429
+            assert "Retry-After" in response.headers
+
+            # 対象外のエンドポイントは制限されない
+            assert client.get("/survey/results").status_code == 200
+
+    def test_spoofed_forwarded_for_is_ignored(self, client: TestClient, mock_firestore):
+        """X-Forwarded-Forの左側をクライアントが偽装しても、同じIPのバケットで制限されること"""
+        import main
+        with patch("main.TRUST_FORWARDED_FOR", True), patch.object(main.ip_rate_limiter, "burst", 1):
+            headers = {"X-Forwarded-For": "198.51.100.1, 203.0.113.7"}
+            assert client.post("/user/status", json={"userId": "U_mock_user_123"}, headers=headers).status_code == 200
+
+            spoofed = {"X-Forwarded-For": "192.0.2.99, 203.0.113.7"}
+            assert client.post("/user/status", json={"userId": "U_mock_user_123"}, headers=spoofed).status_code == 429
+
+            # プロキシが追記したクライアントIPが異なれば別のバケット
+            other = {"X-Forwarded-For": "198.51.100.1, 203.0.113.8"}
+            assert client.post("/user/status", json={"userId": "U_mock_user_123"}, headers=other).status_code == 200
+
+    def test_trusted_proxy_hops(self):
+        import main
+        request = type("FakeRequest", (), {"headers": {"x-forwarded-for": "192.0.2.99, 203.0.113.7, 10.0.0.2"}, "client": None})()
+        with patch("main.TRUST_FORWARDED_FOR", True):
+            assert main.client_ip(request) == "10.0.0.2"
+            with patch("main.TRUSTED_PROXY_HOPS", 2):
+                assert main.client_ip(request) == "203.0.113.7"
+            with patch("main.TRUSTED_PROXY_HOPS", 5):
+                assert main.client_ip(request) == "192.0.2.99"
+
+    def test_load_shedding(self, client: TestClient, mock_firestore):
+        """同時実行数の上限超過時は503を返し、ヘルスチェックは除外されること"""
+        with patch("main.inflight_limiter", ConcurrencyLimiter(0)):
+            response = client.get("/survey/results")
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "1"
+
+            assert client.get("/health").status_code == 200
+
+    def test_pluggable_backend(self, client: TestClient, mock_firestore):
+        """共有バックエンドに差し替えられること"""
+        import main
+
+        class DenyAllBackend(RateLimitBackend):
+            def acquire(self, key, rate, burst):
+                return 5.0
+
+            def reset(self):
+                pass
+
+        with pytest.raises(TypeError):
+            # reset()を実装していないバックエンドは作成できない
+            type("PartialBackend", (RateLimitBackend,), {"acquire": DenyAllBackend.acquire})()
+        main.set_rate_limit_backend(DenyAllBackend())
+
+        response = client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "5"
@@ -0,0 +1,94 @@
+"""エクスポートの並列集計のユニットテスト"""
+import csv
+import json
+import random
+
+import pytest
+
+from analytics import StatisticsAccumulator, SurveyRow
+from report import aggregate_file, main as report_main
+from tests.config import MULTIPLE_TEST_DATA
+
+
+def make_responses(count, seed=0):
+    rng = random.Random(seed)
+    responses = []
+    for number in range(count):
+        base = MULTIPLE_TEST_DATA[number % len(MULTIPLE_TEST_DATA)]
+        timestamp = f"2025-08-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00"
+        responses.append({
+            **base,
+            "id": f"r{number}",
+            "satisfaction": str(rng.randint(1, 5)),
+            "userId": f"U{rng.randrange(50)}",
+            "timestamp": timestamp,
+            "createdAt": timestamp,
+        })
+    return responses
+
+
+def expected_statistics(responses):
+    from main import calculate_statistics
+    return calculate_statistics([SurveyRow(response) for response in responses]).model_dump()
+
+
+class TestStatisticsAccumulator:
+    """StatisticsAccumulatorのテストクラス"""
+
+    def test_merged_partials_match_full_scan(self):
+        """分割して集計した部分統計の合算が全件の計算と一致すること"""
+        responses = make_responses(500)
+        partials = []
+        for i in range(0, len(responses), 64):
+            accumulator = StatisticsAccumulator()
+            for response in responses[i:i + 64]:
+                accumulator.add(response)
+            partials.append(accumulator)
+
+        merged = StatisticsAccumulator()
+        for partial in partials:
+            merged.merge(partial)
+
+        assert merged.to_statistics() == expected_statistics(responses)
+
+    def test_empty(self):
+        """回答がない場合は空の統計になること"""
+        assert StatisticsAccumulator().to_statistics() == expected_statistics([])
+
+
+class TestAggregateFile:
+    """aggregate_fileのテストクラス"""
+
+    @pytest.fixture
+    def responses(self):
+        return make_responses(300, seed=1)
+
+    @pytest.fixture
+    def ndjson_path(self, tmp_path, responses):
+        path = tmp_path / "responses.ndjson"
+        path.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in responses), encoding="utf-8")
+        return str(path)
+
+    @pytest.fixture
+    def csv_path(self, tmp_path, responses):
+        path = tmp_path / "responses.csv"
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(responses[0]))
+            writer.writeheader()
+            writer.writerows(responses)
+        return str(path)
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_ndjson(self, ndjson_path, responses, workers):
+        """NDJSONをワーカー数によらず全件の計算と同じ結果に集計すること"""
+        assert aggregate_file(ndjson_path, "ndjson", workers, chunk_size=40) == expected_statistics(responses)
+
+    def test_csv(self, csv_path, responses):
+        """CSVも同じ結果に集計すること"""
+        assert aggregate_file(csv_path, "csv", workers=2, chunk_size=40) == expected_statistics(responses)
+
+    def test_cli_output(self, ndjson_path, responses, tmp_path):
+        """CLIが集計結果をJSONで出力すること"""
+        output = tmp_path / "report.json"
+        report_main([ndjson_path, "--workers", "1", "--output", str(output)])
+        assert json.loads(output.read_text(encoding="utf-8"))["total_responses"] == len(responses)
@@ -0,0 +1,233 @@
+"""回答の月単位パーティションとアーカイブのユニットテスト"""
+import gzip
+import json
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from archive_partitions import archive_partitions, migrate_legacy
+from backfill_user_latest import backfill_user_latest
+from partitions import (
+    PARTITION_COLLECTION,
+    STATUS_ARCHIVED,
+    STATUS_DELETED,
+    PartitionRegistry,
+    partition_key,
+    partition_path,
+    shift_month,
+)
+from report import aggregate_file
+from tests.config import SAMPLE_SURVEY_DATA
+
+USER_ID = "U_mock_user_123"
+OLD_MONTHS = ("2024-01", "2024-02")
+
+
+def current_month() -> str:
+    return partition_key(datetime.now().isoformat())
+
+
+def seed_partition(db, key, count, user_id="U_other"):
+    """過去の月のパーティションに回答を投入する（台帳にも追加する）"""
+    db.collection(PARTITION_COLLECTION).document(key).set({"collection": partition_path(key)}, merge=True)
+    collection = db.collection(partition_path(key))
+    for i in range(count):
+        created_at = f"{key}-{i + 1:02d}T12:00:00"
+        collection.document(f"{key}-{i}").set({
+            **SAMPLE_SURVEY_DATA, "userId": user_id, "timestamp": created_at, "createdAt": created_at
+        })
+
+
+def documents(db, path):
+    return [data for _, data in db.collection(path)._documents()]
+
+
+@pytest.fixture
+def partitioned():
+    with patch('main.RESPONSE_PARTITIONING', 'monthly'), \
+            patch('main.response_partitions', PartitionRegistry(refresh_interval=0)), \
+            patch('main.RATE_LIMIT_ENABLED', False):
+        yield
+
+
+class TestPartitionRegistry:
+    """パーティションの台帳のテストクラス"""
+
+    def test_shift_month(self):
+        assert shift_month("2025-01", -1) == "2024-12"
+        assert shift_month("2025-11", 2) == "2026-01"
+        assert shift_month("2025-03", -14) == "2024-01"
+
+    def test_live_partitions(self):
+        registry = PartitionRegistry()
+        registry.load([
+            ("2025-01", {}),
+            ("2025-02", {"status": "active"}),
+            ("2024-12", {"status": STATUS_ARCHIVED, "summary": {"total": 1}}),
+        ])
+        # 台帳にない当月も含め、アーカイブ済みの月は除く
+        assert registry.live("2025-03") == ["2025-03", "2025-02", "2025-01"]
+        assert registry.live("2025-03", since="2025-02-10T00:00:00") == ["2025-03", "2025-02"]
+        assert registry.live("2025-03", since="2025-01-01", until="2025-01-31T23:59:59") == ["2025-01"]
+        assert registry.archived_summaries() == [{"total": 1}]
+
+    def test_register_once(self):
+        registry = PartitionRegistry()
+        assert registry.register("2025-01")
+        assert not registry.register("2025-01")
+        registry.forget("2025-01")
+        assert registry.register("2025-01")
+
+
+class TestPartitionedStorage:
+    """パーティションへの書き込みと読み取りのテストクラス"""
+
+    def test_submit_writes_current_partition(self, client: TestClient, mock_firestore, partitioned):
+        response = client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+        assert response.status_code == 200
+
+        assert len(documents(mock_firestore, partition_path(current_month()))) == 1
+        assert documents(mock_firestore, 'survey_responses') == []
+        assert mock_firestore.collection(PARTITION_COLLECTION).document(current_month()).get().exists
+
+    def test_overwrite_within_partition(self, client: TestClient, mock_firestore, partitioned):
+        with patch('main.RESPONSE_POLICY', 'overwrite'):
+            for satisfaction in ["2", "5"]:
+                assert client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "satisfaction": satisfaction}).status_code == 200
+
+        saved = documents(mock_firestore, partition_path(current_month()))
+        assert [r["satisfaction"] for r in saved] == ["5"]
+        latest = mock_firestore.collection('user_latest').document(USER_ID).get().to_dict()
+        assert latest["partition"] == current_month()
+
+    def test_recent_results_touch_only_recent_partitions(self, client: TestClient, mock_firestore, partitioned):
+        for key in OLD_MONTHS:
+            seed_partition(mock_firestore, key, 5)
+        for _ in range(3):
+            client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+        older, newer = (mock_firestore.collection(partition_path(key)) for key in OLD_MONTHS)
+
+        results = client.get("/survey/results", params={"limit": 2}).json()["data"]
+        assert len(results["responses"]) == 2
+        assert older.executed_queries == [] and newer.executed_queries == []
+
+        results = client.get("/survey/results", params={"limit": 4, "offset": 2}).json()["data"]
+        # 当月の3件目と2024-02の新しい順の3件
+        assert [r["createdAt"][:7] for r in results["responses"]] == [current_month()] + ["2024-02"] * 3
+        assert [r["createdAt"] for r in results["responses"][1:]] == \
+            ["2024-02-05T12:00:00", "2024-02-04T12:00:00", "2024-02-03T12:00:00"]
+        assert older.executed_queries == []
+
+    def test_date_filter_skips_partitions(self, client: TestClient, mock_firestore, partitioned):
+        for key in OLD_MONTHS:
+            seed_partition(mock_firestore, key, 5)
+
+        results = client.get("/survey/results", params={"start_date": "2024-01-02", "end_date": "2024-01-03"}).json()["data"]
+        assert [r["createdAt"] for r in results["responses"]] == ["2024-01-03T12:00:00", "2024-01-02T12:00:00"]
+        assert mock_firestore.collection(partition_path("2024-02")).executed_queries == []
+        assert mock_firestore.collection(partition_path(current_month())).executed_queries == []
+
+    def test_default_survey_results_span_partitions(self, client: TestClient, mock_firestore, partitioned):
+        """/surveys/default/results もパーティションから読み取ること"""
+        seed_partition(mock_firestore, "2024-02", 3)
+        client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+
+        results = client.get("/surveys/default/results", params={"limit": 3}).json()["data"]
+        assert [r["createdAt"][:7] for r in results["responses"]] == [current_month()] + ["2024-02"] * 2
+        assert results["statistics"]["total_responses"] == 3
+
+    def test_user_status_spans_partitions(self, client: TestClient, mock_firestore, partitioned):
+        """パーティション導入前の survey_responses の回答も読み取りの対象とすること"""
+        seed_partition(mock_firestore, "2024-02", 2, user_id=USER_ID)
+        seed_partition(mock_firestore, current_month(), 1, user_id=USER_ID)
+        mock_firestore.collection('survey_responses').add(
+            {**SAMPLE_SURVEY_DATA, "userId": USER_ID, "createdAt": "2023-12-01T00:00:00", "timestamp": "2023-12-01T00:00:00"}
+        )
+
+        status = client.post("/user/status", json={"userId": USER_ID}).json()["data"]
+        assert status["responseCount"] == 4
+        assert status["lastResponseDate"][:7] == current_month()
+
+
+class TestArchivePartitions:
+    """アーカイブジョブのテストクラス"""
+
+    def test_archive_then_ttl_delete(self, client: TestClient, mock_firestore, partitioned, tmp_path):
+        for key in OLD_MONTHS:
+            seed_partition(mock_firestore, key, 5)
+        for _ in range(3):
+            client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+        before = client.get("/survey/statistics").json()["data"]
+        assert before["total_responses"] == 13
+
+        now = datetime.now()
+        results = archive_partitions(str(tmp_path), live_months=1, ttl_days=30, now=now)
+        assert results == {key: STATUS_ARCHIVED for key in OLD_MONTHS}
+
+        archive = tmp_path / "survey_responses-2024-01.ndjson.gz"
+        with gzip.open(archive, "rt", encoding="utf-8") as f:
+            assert len([json.loads(line) for line in f]) == 5
+        assert aggregate_file(str(archive))["total_responses"] == 5
+
+        # アーカイブ済みの月は読み取らず、全体統計は保存した集計結果を合算する
+        assert client.get("/survey/results").json()["data"]["pagination"]["total"] == 3
+        after = client.get("/survey/statistics").json()["data"]
+        assert after["total_responses"] == 13
+        assert after["satisfaction_distribution"] == before["satisfaction_distribution"]
+        assert len(documents(mock_firestore, partition_path("2024-01"))) == 5
+
+        # TTLの経過後に回答を削除する（31日後は翌月のため、当月を残すよう2か月とする）
+        results = archive_partitions(str(tmp_path), live_months=2, ttl_days=30, now=now + timedelta(days=31))
+        assert results == {key: STATUS_DELETED for key in OLD_MONTHS}
+        assert documents(mock_firestore, partition_path("2024-01")) == []
+        assert client.get("/survey/statistics").json()["data"]["total_responses"] == 13
+
+    @pytest.mark.parametrize("damage", ["missing", "truncated"])
+    def test_ttl_keeps_responses_without_valid_archive(self, mock_firestore, partitioned, tmp_path, damage):
+        """アーカイブが失われた・件数が一致しない月は削除しないこと"""
+        seed_partition(mock_firestore, "2024-01", 5)
+        now = datetime.now()
+        archive_partitions(str(tmp_path), live_months=1, ttl_days=30, now=now)
+
+        archive = tmp_path / "survey_responses-2024-01.ndjson.gz"
+        if damage == "missing":
+            archive.unlink()
+        else:
+            with gzip.open(archive, "rt", encoding="utf-8") as f:
+                lines = f.readlines()
+            with gzip.open(archive, "wt", encoding="utf-8") as f:
+                f.writelines(lines[:3])
+
+        results = archive_partitions(str(tmp_path), live_months=2, ttl_days=30, now=now + timedelta(days=31))
+        assert results == {}
+        assert len(documents(mock_firestore, partition_path("2024-01"))) == 5
+        entry = mock_firestore.collection(PARTITION_COLLECTION).document("2024-01").get().to_dict()
+        assert entry["status"] == STATUS_ARCHIVED
+
+    def test_live_months_are_kept(self, mock_firestore, partitioned, tmp_path):
+        seed_partition(mock_firestore, shift_month(current_month(), -1), 2)
+        assert archive_partitions(str(tmp_path), live_months=2, ttl_days=0) == {}
+        with pytest.raises(ValueError):
+            archive_partitions(str(tmp_path), live_months=0)
+
+    def test_migrate_legacy(self, client: TestClient, mock_firestore, partitioned):
+        legacy = mock_firestore.collection('survey_responses')
+        for i, created_at in enumerate(["2024-01-05T00:00:00", "2024-02-05T00:00:00", "2024-02-06T00:00:00"]):
+            legacy.document(f"legacy_{i}").set({**SAMPLE_SURVEY_DATA, "userId": USER_ID, "createdAt": created_at, "timestamp": created_at})
+        # パーティション導入前のuser_latest（partitionなし）
+        mock_firestore.collection('user_latest').document(USER_ID).set({"responseId": "legacy_2", "createdAt": "2024-02-06T00:00:00"})
+
+        assert migrate_legacy() == 3
+        assert documents(mock_firestore, 'survey_responses') == []
+        assert len(documents(mock_firestore, partition_path("2024-02"))) == 2
+        assert mock_firestore.collection(partition_path("2024-01")).document("legacy_0").get().exists
+
+        # 移動した回答も置き換えの対象となる
+        with patch('main.RESPONSE_POLICY', 'overwrite'):
+            assert client.post("/survey/submit", json=SAMPLE_SURVEY_DATA).status_code == 200
+        assert not mock_firestore.collection(partition_path("2024-02")).document("legacy_2").get().exists
+        # 導入前の回答の件数はバックフィルで補正する
+        backfill_user_latest()
+        assert client.post("/user/status", json={"userId": USER_ID}).json()["data"]["responseCount"] == 3
@@ -0,0 +1,160 @@
+"""同一ユーザーの重複回答の扱い（RESPONSE_POLICY）のユニットテスト"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from local_storage import AppendOnlyLog
+from sqlite_storage import SQLiteStore
+from tests.config import SAMPLE_SURVEY_DATA
+
+USER_ID = "U_mock_user_123"
+CONCURRENT_SUBMITS = 50
+
+
+@pytest.fixture(autouse=True)
+def disable_rate_limit():
+    # 同一ユーザーの同時送信を試験するため、ユーザー単位のレート制限を外す
+    with patch('main.RATE_LIMIT_ENABLED', False):
+        yield
+
+
+def submit_concurrently_with_threads(client: TestClient):
+    """別々のスレッド（イベントループ）から同時に送信する（Firestoreのトランザクション向け）"""
+    def submit(i):
+        return client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "satisfaction": str(i % 5 + 1)})
+
+    with ThreadPoolExecutor(max_workers=CONCURRENT_SUBMITS) as executor:
+        return list(executor.map(submit, range(CONCURRENT_SUBMITS)))
+
+
+def submit_concurrently_on_loop():
+    """1つのイベントループで同時に送信する（uvicornのワーカー内の同時リクエストに相当）"""
+    from main import app
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[
+                client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "satisfaction": str(i % 5 + 1)})
+                for i in range(CONCURRENT_SUBMITS)
+            ])
+
+    return asyncio.run(run())
+
+
+class TestFirestoreResponsePolicy:
+    """Firestoreのトランザクションによる重複回答の制御のテストクラス"""
+
+    def test_reject_allows_single_response(self, client: TestClient, mock_firestore):
+        """50件の同時送信のうち1件のみ保存され、残りは409となること"""
+        with patch('main.RESPONSE_POLICY', 'reject'):
+            responses = submit_concurrently_with_threads(client)
+
+        codes = sorted(response.status_code for response in responses)
+        assert codes == [200] + [409] * (CONCURRENT_SUBMITS - 1)
+        saved = next(response for response in responses if response.status_code == 200)
+        assert saved.json()["success"] is True
+
+        status = client.post("/user/status", json={"userId": USER_ID}).json()["data"]
+        assert status["responseCount"] == 1
+        latest = mock_firestore.collection('user_latest').document(USER_ID).get().to_dict()
+        assert latest["responseId"] == status["lastResponseId"]
+
+        rollup = mock_firestore.collection('survey_stats_rollups')._documents()
+        assert sum(doc["total"] for _, doc in rollup if doc["granularity"] == "day") == 1
+
+    def test_overwrite_keeps_latest_response(self, client: TestClient, mock_firestore):
+        """同時送信しても回答は1件のみ残り、統計も1件分となること"""
+        with patch('main.RESPONSE_POLICY', 'overwrite'):
+            responses = submit_concurrently_with_threads(client)
+            assert all(response.status_code == 200 for response in responses)
+            last = client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "satisfaction": "2"}).json()
+
+        status = client.post("/user/status", json={"userId": USER_ID}).json()["data"]
+        assert status["responseCount"] == 1
+        assert status["lastResponseId"] == last["data"]["id"]
+        latest = client.get(f"/user/{USER_ID}/latest-response").json()["data"]
+        assert latest["satisfaction"] == "2"
+
+        rollup = [doc for _, doc in mock_firestore.collection('survey_stats_rollups')._documents()
+                  if doc["granularity"] == "day"]
+        assert sum(doc["total"] for doc in rollup) == 1
+        assert sum(doc["satisfaction_sum"] for doc in rollup) == 2
+
+    def test_reject_existing_response_without_user_latest(self, client: TestClient, mock_firestore):
+        """user_latestの導入前に保存された回答も回答済みとして扱うこと"""
+        client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+        with patch('main.RESPONSE_POLICY', 'reject'):
+            response = client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+        assert response.status_code == 409
+        assert response.json()["error"] == "既に回答済みです"
+
+    def test_allow_appends(self, client: TestClient, mock_firestore):
+        for _ in range(3):
+            assert client.post("/survey/submit", json=SAMPLE_SURVEY_DATA).status_code == 200
+        status = client.post("/user/status", json={"userId": USER_ID}).json()["data"]
+        assert status["responseCount"] == 3
+
+
+@pytest.fixture(params=["list", "log", "sqlite"])
+def local_store(request, tmp_path):
+    """Firestoreを使わない場合の各ストア"""
+    if request.param == "list":
+        store = []
+    elif request.param == "log":
+        store = AppendOnlyLog(str(tmp_path / "responses.log"))
+    else:
+        store = SQLiteStore(str(tmp_path / "survey.db"))
+    with patch('main.FIRESTORE_AVAILABLE', False), patch('main.mock_storage', store), \
+            patch('main.mock_rollups', {}), patch('main.mock_user_sketches', {}):
+        yield store
+    if not isinstance(store, list):
+        store.close()
+
+
+class TestLocalResponsePolicy:
+    """Firestoreを使わない場合のユーザー単位のロックによる重複回答の制御のテストクラス"""
+
+    def test_reject_allows_single_response(self, client: TestClient, local_store):
+        with patch('main.RESPONSE_POLICY', 'reject'):
+            responses = submit_concurrently_on_loop()
+
+        codes = sorted(response.status_code for response in responses)
+        assert codes == [200] + [409] * (CONCURRENT_SUBMITS - 1)
+        assert len(local_store) == 1
+
+    def test_overwrite_keeps_latest_response(self, client: TestClient, local_store):
+        with patch('main.RESPONSE_POLICY', 'overwrite'):
+            responses = submit_concurrently_on_loop()
+            assert all(response.status_code == 200 for response in responses)
+
+        assert len(local_store) == 1
+        ids = {response.json()["data"]["id"] for response in responses}
+        assert len(ids) == CONCURRENT_SUBMITS
+        status = client.post("/user/status", json={"userId": USER_ID}).json()["data"]
+        assert status["responseCount"] == 1
+        assert status["lastResponseId"] in ids
+
+        import main
+        day_rollups = [rollup for rollup in main.mock_rollups.values() if rollup["granularity"] == "day"]
+        assert sum(rollup["total"] for rollup in day_rollups) == 1
+
+    def test_overwrite_survives_restart(self, client: TestClient, tmp_path):
+        """置き換えがログから復元されること"""
+        path = str(tmp_path / "responses.log")
+        log = AppendOnlyLog(path)
+        with patch('main.FIRESTORE_AVAILABLE', False), patch('main.mock_storage', log), \
+                patch('main.mock_rollups', {}), patch('main.mock_user_sketches', {}), \
+                patch('main.RESPONSE_POLICY', 'overwrite'):
+            for satisfaction in ["1", "4"]:
+                client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "satisfaction": satisfaction})
+        log.close()
+
+        reopened = AppendOnlyLog(path)
+        assert [r["satisfaction"] for r in reopened] == ["4"]
+        assert [r["satisfaction"] for r in reopened.by_user(USER_ID)] == ["4"]
+        reopened.close()
@@ -0,0 +1,126 @@
+"""満足度の分位点・NPS・直近7日間の平均のユニットテスト"""
+import math
+import random
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from analytics import SatisfactionTracker, SurveyRow
+from sketches import ScoreHistogram
+from tests.config import MULTIPLE_TEST_DATA
+
+
+def exact_quantile(scores, q):
+    """最近接順位法による正確な分位点"""
+    ordered = sorted(scores)
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+
+def exact_nps(scores):
+    promoters = sum(1 for s in scores if s == 5)
+    detractors = sum(1 for s in scores if s <= 3)
+    return round((promoters - detractors) * 100 / len(scores), 1)
+
+
+class TestScoreHistogram:
+    """ScoreHistogramのテストクラス"""
+
+    @pytest.mark.parametrize("seed", [1, 2, 3])
+    def test_matches_exact(self, seed):
+        """分位点・平均・NPSが全件からの計算と一致すること"""
+        rng = random.Random(seed)
+        scores = [rng.choices([1, 2, 3, 4, 5], weights=[1, 2, 3, 5, 4])[0] for _ in range(rng.randint(1, 500))]
+        histogram = ScoreHistogram()
+        for score in scores:
+            histogram.add(score)
+
+        for q in (0.01, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0):
+            assert histogram.quantile(q) == exact_quantile(scores, q)
+        assert histogram.mean() == pytest.approx(sum(scores) / len(scores))
+        assert histogram.nps(5, 3) == exact_nps(scores)
+
+    def test_merge(self):
+        """マージ結果が全件のヒストグラムと一致すること"""
+        a = ScoreHistogram(counts={"1": 2, "5": 1})
+        b = ScoreHistogram(counts={"5": 3, "4": 1})
+        assert a.merge(b).to_dict() == {"1": 2, "4": 1, "5": 4}
+
+    def test_empty_and_out_of_range(self):
+        """回答がない場合はNone、範囲外のスコアはエラーになること"""
+        histogram = ScoreHistogram()
+        assert histogram.quantile(0.5) is None
+        assert histogram.nps(5, 3) is None
+        with pytest.raises(ValueError):
+            histogram.add(6)
+
+
+class TestSatisfactionTracker:
+    """SatisfactionTrackerのテストクラス"""
+
+    def test_rolling_window_matches_exact(self):
+        """直近7日間の平均・NPSが該当期間の全件からの計算と一致すること"""
+        rng = random.Random(7)
+        start = date(2025, 8, 1)
+        responses = [
+            ((start + timedelta(days=rng.randrange(20))).isoformat(), rng.randint(1, 5))
+            for _ in range(1000)
+        ]
+        tracker = SatisfactionTracker(window_days=7)
+        for day, score in responses:
+            tracker.add(day, score)
+
+        today = "2025-08-20"
+        window = [score for day, score in responses if "2025-08-14" <= day <= today]
+        summary = tracker.summary(today)
+        assert summary["rolling"]["total_responses"] == len(window)
+        assert summary["rolling"]["average_satisfaction"] == round(sum(window) / len(window), 2)
+        assert summary["rolling"]["nps"] == exact_nps(window)
+
+        scores = [score for _, score in responses]
+        assert summary["total_responses"] == len(scores)
+        assert summary["satisfaction_percentiles"]["p50"] == exact_quantile(scores, 0.5)
+        assert summary["nps"] == exact_nps(scores)
+
+    def test_constant_memory(self):
+        """期間外の日別ヒストグラムは破棄されること"""
+        tracker = SatisfactionTracker(window_days=7)
+        for offset in range(365):
+            tracker.add((date(2025, 1, 1) + timedelta(days=offset)).isoformat(), 4)
+        assert len(tracker._daily) == 7
+        assert tracker.overall.total == 365
+
+
+class TestSatisfactionStatistics:
+    """満足度の統計エンドポイントのテストクラス"""
+
+    def test_statistics_include_percentiles(self):
+        """calculate_statisticsに分位点とNPSが含まれること"""
+        from main import calculate_statistics
+        stats = calculate_statistics([SurveyRow(data, f"r{i}") for i, data in enumerate(MULTIPLE_TEST_DATA)])
+        scores = [int(data["satisfaction"]) for data in MULTIPLE_TEST_DATA]
+        assert stats.satisfaction_percentiles["p50"] == exact_quantile(scores, 0.5)
+        assert stats.nps == exact_nps(scores)
+
+    def test_endpoint_updated_on_submit(self, client: TestClient):
+        """送信ごとに加算され、ロールアップから復元した値とも一致すること"""
+        import main
+        with patch("main.satisfaction_tracker", SatisfactionTracker()), \
+             patch("main.satisfaction_tracker_loaded_at", None):
+            response = client.get("/survey/statistics/satisfaction")
+            assert response.json()["data"]["total_responses"] == 0
+
+            for test_data in MULTIPLE_TEST_DATA:
+                client.post("/survey/submit", json=test_data)
+
+            live = client.get("/survey/statistics/satisfaction").json()["data"]
+            scores = [int(data["satisfaction"]) for data in MULTIPLE_TEST_DATA]
+            assert live["total_responses"] == len(scores)
+            assert live["nps"] == exact_nps(scores)
+            assert live["rolling"]["total_responses"] == len(scores)
+            assert live["rolling"]["end"] == datetime.now().strftime("%Y-%m-%d")
+
+            main.load_satisfaction_tracker()
+            restored = client.get("/survey/statistics/satisfaction").json()["data"]
+            assert restored == live
@@ -0,0 +1,98 @@
+"""本番用のサーバー起動（server.py）のユニットテスト"""
+from unittest.mock import mock_open, patch
+
+import pytest
+
+import server
+from local_storage import AppendOnlyLog
+from sqlite_storage import SQLiteStore
+
+
+def cgroup_files(files):
+    """指定したcgroupのファイルのみ存在するopen"""
+    def fake_open(path, *args, **kwargs):
+        if path not in files:
+            raise FileNotFoundError(path)
+        return mock_open(read_data=files[path])()
+    return fake_open
+
+
+class TestWorkerCount:
+    """ワーカー数の決定のテストクラス"""
+
+    @pytest.mark.parametrize("files, expected", [
+        ({"/sys/fs/cgroup/cpu.max": "250000 100000\n"}, 2.5),
+        ({"/sys/fs/cgroup/cpu.max": "max 100000\n"}, None),
+        ({"/sys/fs/cgroup/cpu/cpu.cfs_quota_us": "200000\n",
+          "/sys/fs/cgroup/cpu/cpu.cfs_period_us": "100000\n"}, 2.0),
+        ({"/sys/fs/cgroup/cpu/cpu.cfs_quota_us": "-1\n",
+          "/sys/fs/cgroup/cpu/cpu.cfs_period_us": "100000\n"}, None),
+        ({}, None),
+    ])
+    def test_cpu_quota(self, files, expected):
+        with patch("builtins.open", cgroup_files(files)):
+            assert server.cpu_quota() == expected
+
+    def test_quota_limits_workers(self, monkeypatch):
+        """CPUクォータ（切り上げ）と利用可能なCPU数の小さい方とすること"""
+        monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+        monkeypatch.setattr(server.os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+        with patch("server.cpu_quota", return_value=2.5):
+            assert server.worker_count() == 3
+        with patch("server.cpu_quota", return_value=None):
+            assert server.worker_count() == 8
+        with patch("server.cpu_quota", return_value=0.5):
+            assert server.worker_count() == 1
+
+    def test_web_concurrency_overrides(self, monkeypatch):
+        monkeypatch.setenv("WEB_CONCURRENCY", "5")
+        assert server.worker_count() == 5
+
+
+class TestStorageWorkers:
+    """保存先に応じたワーカー数のテストクラス"""
+
+    def test_firestore_keeps_workers(self):
+        assert server.storage_workers(4, firestore_available=True) == 4
+
+    def test_local_storage_uses_single_worker(self, capsys):
+        """Firestore以外（メモリ上・SQLite・追記専用ログ）は1ワーカーとすること"""
+        assert server.storage_workers(4, firestore_available=False) == 1
+        assert "single worker" in capsys.readouterr().out
+        assert server.storage_workers(1, firestore_available=False) == 1
+
+
+class TestForkHooks:
+    """フォーク前後の処理のテストクラス"""
+
+    def test_init_worker_reopens_sqlite(self, tmp_path):
+        """フォーク後のワーカーで同じ設定のSQLiteStoreを開き直すこと"""
+        import main
+
+        store = SQLiteStore(str(tmp_path / "survey.db"), pool_size=2, batch_size=32)
+        with patch("main.FIRESTORE_AVAILABLE", False), patch("main.mock_storage", store):
+            store.append({"userId": "U1", "satisfaction": "4", "createdAt": "2024-01-01T00:00:00"})
+            main.prepare_fork()
+            main.init_worker()
+            reopened = main.mock_storage
+            assert reopened is not store
+            assert (reopened.path, reopened.pool_size, reopened.batch_size) == (store.path, 2, 32)
+            assert len(reopened) == 1
+            reopened.close()
+
+    def test_init_worker_reopens_append_only_log(self, tmp_path):
+        """フォーク後のワーカーで追記専用ログを開き直し、fsyncスレッドを動かすこと"""
+        import main
+
+        log = AppendOnlyLog(str(tmp_path / "responses.log"), fsync_interval=0.01, fsync_batch=100)
+        with patch("main.FIRESTORE_AVAILABLE", False), patch("main.mock_storage", log):
+            log.append({"id": "r1", "userId": "U1", "satisfaction": "4", "createdAt": "2024-01-01T00:00:00"})
+            main.prepare_fork()
+            assert not log._syncer.is_alive()
+            main.init_worker()
+            reopened = main.mock_storage
+            assert reopened is not log
+            assert (reopened.path, reopened.fsync_interval, reopened.fsync_batch) == (log.path, 0.01, 100)
+            assert reopened._syncer.is_alive()
+            assert reopened.get("r1")["userId"] == "U1"
+            reopened.close()
@@ -0,0 +1,97 @@
+"""シングルフライト（同時読み取りの集約）のユニットテスト"""
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from singleflight import SingleFlight
+
+
+def run_concurrently(flight: SingleFlight, keys, func):
+    """同じイベントループ上で複数の呼び出しを同時に実行"""
+    async def runner():
+        return await asyncio.gather(
+            *(flight.do(key, func) for key in keys),
+            return_exceptions=True
+        )
+    return asyncio.run(runner())
+
+
+class TestSingleFlight:
+    """SingleFlightのテストクラス"""
+
+    def test_identical_keys_share_one_call(self):
+        """同じキーの同時呼び出しが1回の実行にまとめられること"""
+        flight = SingleFlight()
+        calls = []
+
+        def slow_read():
+            calls.append(threading.get_ident())
+            time.sleep(0.05)
+            return {"value": 42}
+
+        results = run_concurrently(flight, ["same"] * 20, slow_read)
+
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert flight.metrics() == {"calls": 20, "executions": 1, "coalesced": 19, "inflight": 0}
+
+    def test_different_keys_run_separately(self):
+        """異なるキーはそれぞれ実行されること"""
+        flight = SingleFlight()
+        lock = threading.Lock()
+        calls = []
+
+        def read():
+            with lock:
+                calls.append(1)
+            time.sleep(0.01)
+            return len(calls)
+
+        run_concurrently(flight, ["a", "b", "c"], read)
+
+        assert len(calls) == 3
+        assert flight.metrics()["coalesced"] == 0
+
+    def test_errors_are_shared(self):
+        """実行中の例外が集約された全ての呼び出し元に伝わること"""
+        flight = SingleFlight()
+
+        def failing_read():
+            time.sleep(0.02)
+            raise RuntimeError("Firestore unavailable")
+
+        results = run_concurrently(flight, ["same"] * 5, failing_read)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert flight.metrics()["executions"] == 1
+
+    def test_sequential_calls_are_not_cached(self):
+        """完了後の呼び出しは新たに実行されること（キャッシュではない）"""
+        flight = SingleFlight()
+        counter = iter(range(100))
+
+        async def runner():
+            first = await flight.do("key", lambda: next(counter))
+            second = await flight.do("key", lambda: next(counter))
+            return first, second
+
+        assert asyncio.run(runner()) == (0, 1)
+
+
+class TestMetricsEndpoint:
+    """/metrics エンドポイントのテストクラス"""
+
+    def test_metrics_include_singleflight(self, client: TestClient, mock_firestore):
+        """シングルフライトのメトリクスが取得できること"""
+        client.post("/user/status", json={"userId": "U_mock_user_123"})
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+
+        metrics = response.json()["data"]["singleflight"]
+        for field in ["calls", "executions", "coalesced", "inflight"]:
+            assert field in metrics
+        assert metrics["calls"] >= 1
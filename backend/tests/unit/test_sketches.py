@@ -0,0 +1,50 @@
+"""集計用スケッチのユニットテスト"""
+import pytest
+from sketches import HyperLogLog
+
+
+class TestHyperLogLog:
+    """HyperLogLogスケッチのテストクラス"""
+
+    @pytest.mark.parametrize("cardinality", [10, 1000, 50000])
+    def test_estimate_within_error_bound(self, cardinality):
+        """推定値が標準誤差の3倍以内に収まること"""
+        sketch = HyperLogLog()
+        sketch.update(f"U{i:032x}" for i in range(cardinality))
+
+        error = abs(sketch.count() - cardinality) / cardinality
+        assert error <= 3 * sketch.standard_error
+
+    def test_duplicates_do_not_change_estimate(self):
+        """同じユーザーの重複追加でレジスタが変化しないこと"""
+        sketch = HyperLogLog()
+        sketch.update(f"user-{i}" for i in range(500))
+        before = sketch.to_bytes()
+
+        assert not any(sketch.add(f"user-{i}") for i in range(500))
+        assert sketch.to_bytes() == before
+
+    def test_merge_equals_union(self):
+        """マージ結果が和集合を追加したスケッチと一致すること"""
+        day1, day2, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        day1.update(f"user-{i}" for i in range(0, 3000))
+        day2.update(f"user-{i}" for i in range(2000, 5000))
+        union.update(f"user-{i}" for i in range(0, 5000))
+
+        assert day1.merge(day2).to_bytes() == union.to_bytes()
+
+    def test_serialization_roundtrip(self):
+        """バイト列から復元できること"""
+        sketch = HyperLogLog(precision=10)
+        sketch.update(f"user-{i}" for i in range(100))
+
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+        assert restored.precision == 10
+        assert restored.count() == sketch.count()
+
+    def test_invalid_precision(self):
+        """精度の範囲外やマージ時の不一致はエラーになること"""
+        with pytest.raises(ValueError):
+            HyperLogLog(precision=2)
+        with pytest.raises(ValueError):
+            HyperLogLog(precision=10).merge(HyperLogLog(precision=12))
@@ -0,0 +1,206 @@
+"""SQLiteストレージのユニットテスト"""
+import asyncio
+from concurrent.futures import Future
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from analytics import SurveyRow
+import main
+from main import calculate_statistics
+from sqlite_storage import DuplicateUserResponse, SQLiteStore
+from synthetic_data import generate_responses
+from tests.config import SAMPLE_SURVEY_DATA
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStore(str(tmp_path / "survey.db"), pool_size=2, batch_size=64)
+    yield store
+    store.close()
+
+
+class TestSQLiteStore:
+    """SQLiteStoreのテストクラス"""
+
+    def test_wal_mode_and_indexes(self, store):
+        """WALモードで開き、ユーザー別の取得に複合インデックスを使うこと"""
+        with store._connection() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM survey_responses WHERE userId = ? ORDER BY createdAt DESC",
+                ("U1",)
+            ).fetchall()
+        assert "idx_user_created" in " ".join(row[3] for row in plan)
+
+    def test_statistics_match_python_aggregation(self, store):
+        """GROUP BYによる統計がcalculate_statisticsと一致すること"""
+        responses = list(generate_responses(2000, seed=7))
+        store.extend(responses)
+
+        expected = calculate_statistics([SurveyRow(r) for r in responses])
+        assert store.statistics() == expected.model_dump()
+
+    def test_empty_statistics(self, store):
+        assert store.statistics() == calculate_statistics([]).model_dump()
+
+    def test_query_filters_and_pagination(self, store):
+        """絞り込み・createdAtの新しい順・ページング・射影がSQLで行われること"""
+        responses = list(generate_responses(500, seed=8))
+        store.extend(responses)
+
+        matched = sorted((r for r in responses if r["age"] == "20-29" and r["createdAt"] >= "2025-02-01"),
+                         key=lambda r: r["createdAt"], reverse=True)
+        rows = store.query([("age", "==", "20-29"), ("createdAt", ">=", "2025-02-01")], limit=10, offset=5)
+        assert rows == matched[5:15]
+
+        projected = store.query([], limit=3, fields=["satisfaction"])
+        assert all(set(row) == {"satisfaction"} for row in projected)
+
+        with pytest.raises(ValueError):
+            store.query([("age; DROP TABLE survey_responses", "==", "x")])
+
+    def test_user_responses_newest_first(self, store):
+        store.extend([
+            {"id": "r1", "userId": "U1", "createdAt": "2025-01-01T00:00:00"},
+            {"id": "r2", "userId": "U2", "createdAt": "2025-01-02T00:00:00"},
+            {"id": "r3", "userId": "U1", "createdAt": "2025-01-03T00:00:00"},
+        ])
+        assert [r["id"] for r in store.user_responses("U1")] == ["r3", "r1"]
+        assert [r["id"] for r in store] == ["r1", "r2", "r3"]
+        assert store[-1]["id"] == "r3"
+        assert len(store) == 3
+
+    def test_get_many_uses_id_index(self, store):
+        store.extend({"id": f"r{i}", "userId": "U1", "createdAt": f"2025-01-01T00:00:{i:02d}"} for i in range(10))
+        found = store.get_many(["r3", "missing", "r7", "r3"])
+        assert set(found) == {"r3", "r7"}
+        assert found["r7"]["createdAt"] == "2025-01-01T00:00:07"
+
+        with store._connection() as conn:
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM survey_responses WHERE id IN (?, ?)", ("r1", "r2")).fetchall()
+        assert "SCAN" not in " ".join(row[3] for row in plan)
+
+    def test_since_reads_created_at_range(self, store):
+        """watermark以降の回答をcreatedAtのインデックスで古い順に取得すること"""
+        store.extend([
+            {"id": "r3", "userId": "U1", "createdAt": "2025-01-03T00:00:00"},
+            {"id": "r1", "userId": "U1", "createdAt": "2025-01-01T00:00:00"},
+            {"id": "r2", "userId": "U2", "createdAt": "2025-01-02T00:00:00"},
+        ])
+        assert [r["id"] for r in store.since(None)] == ["r1", "r2", "r3"]
+        assert store.since("2025-01-01T00:00:00", ["id", "createdAt"]) == [
+            {"id": "r2", "createdAt": "2025-01-02T00:00:00"},
+            {"id": "r3", "createdAt": "2025-01-03T00:00:00"},
+        ]
+
+        with store._connection() as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM survey_responses WHERE createdAt > ? ORDER BY createdAt", ("x",)
+            ).fetchall()
+        assert "idx_created" in " ".join(row[3] for row in plan)
+
+    def test_group_commit(self, store):
+        """同時に送信された回答がまとめてコミットされること"""
+        async def submit_all():
+            return await asyncio.gather(*[
+                store.insert({"userId": f"U{i % 10}", "createdAt": f"2025-01-01T00:00:{i % 60:02d}"})
+                for i in range(300)
+            ])
+
+        ids = asyncio.run(submit_all())
+        assert len(set(ids)) == 300
+        assert len(store) == 300
+        assert store.commits < 300
+
+    def test_cancelled_write_is_skipped(self, store):
+        """呼び出し元がキャンセルした（期限切れの）書き込みは行わず、書き込みスレッドも止まらないこと"""
+        cancelled = Future()
+        cancelled.cancel()
+        store._commit([({"id": "cancelled", "userId": "U1"}, None, cancelled)])
+        assert len(store) == 0
+
+        assert asyncio.run(store.insert({"id": "kept", "userId": "U1"})) == "kept"
+        assert [r["id"] for r in store] == ["kept"]
+
+
+    def test_insert_once_checks_in_writer_transaction(self, tmp_path):
+        """同じDBを開いた2つのストアから同時に送信しても、ユーザーごとに1件のみ保存すること"""
+        path = str(tmp_path / "shared.db")
+        stores = [SQLiteStore(path, pool_size=1, batch_size=8) for _ in range(2)]
+        try:
+            futures = [
+                stores[i % 2].submit({"userId": "U1", "createdAt": f"2025-01-01T00:00:{i:02d}"}, once="reject")
+                for i in range(20)
+            ]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except DuplicateUserResponse as e:
+                    outcomes.append(e)
+            saved = [outcome for outcome in outcomes if not isinstance(outcome, DuplicateUserResponse)]
+            assert len(saved) == 1
+            assert len(stores[0].user_responses("U1")) == 1
+
+            # overwriteは同じトランザクションで最新の回答を置き換え、置き換えた回答を返す
+            doc_id, previous = stores[1].submit(
+                {"userId": "U1", "createdAt": "2025-01-02T00:00:00"}, once="overwrite"
+            ).result()
+            assert previous["id"] == saved[0][0]
+            assert [r["id"] for r in stores[0].user_responses("U1")] == [doc_id]
+        finally:
+            for store in stores:
+                store.close()
+
+
+class TestSQLiteStorageApi:
+    """SQLiteストレージを使用した場合のAPIのテストクラス"""
+
+    def test_submit_and_read(self, client: TestClient, store):
+        with patch('main.FIRESTORE_AVAILABLE', False), patch('main.mock_storage', store), \
+                patch('main.mock_rollups', {}), patch('main.mock_user_sketches', {}):
+            for satisfaction in ["3", "5"]:
+                response = client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "satisfaction": satisfaction})
+                assert response.status_code == 200
+
+            status = client.post("/user/status", json={"userId": "U_mock_user_123"}).json()["data"]
+            assert status["responseCount"] == 2
+
+            results = client.get("/survey/results", params={"satisfaction": "5"}).json()["data"]
+            assert [r["satisfaction"] for r in results["responses"]] == ["5"]
+
+            statistics = client.get("/survey/statistics").json()["data"]
+            assert statistics["total_responses"] == 2
+            assert statistics["average_satisfaction"] == 4.0
+
+    def test_search_and_policy_check_avoid_full_scan(self, client: TestClient, store):
+        """検索結果は回答IDで取得し、重複チェックはuser_responsesではなく書き込みスレッドで行うこと"""
+        called_on_loop = []
+        user_responses = store.user_responses
+
+        def tracking_user_responses(user_id):
+            try:
+                asyncio.get_running_loop()
+                called_on_loop.append(True)
+            except RuntimeError:
+                called_on_loop.append(False)
+            return user_responses(user_id)
+
+        with patch('main.FIRESTORE_AVAILABLE', False), patch('main.mock_storage', store), \
+                patch('main.mock_rollups', {}), patch('main.mock_user_sketches', {}), \
+                patch('main.RESPONSE_POLICY', 'overwrite'), \
+                patch.object(store, 'user_responses', tracking_user_responses):
+            for feedback in ["接客が丁寧", "接客が最高"]:
+                assert client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "feedback": feedback}).status_code == 200
+            client.get("/survey/feedback/search", params={"q": "接客"})
+
+            with patch.object(SQLiteStore, '__iter__', side_effect=AssertionError("full scan")):
+                responses = client.get("/survey/feedback/search", params={"q": "接客"}).json()["data"]["responses"]
+                # インデックスの差分の取り込みも全件を読まない
+                with patch('main.feedback_index_synced_at', None):
+                    main.sync_feedback_index()
+
+        assert [r["feedback"] for r in responses] == ["接客が最高"]
+        assert called_on_loop == []
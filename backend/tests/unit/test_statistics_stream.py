@@ -0,0 +1,133 @@
+"""統計ライブ配信（SSE）のユニットテスト"""
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from live_stats import StatisticsBroadcaster, statistics_delta
+from tests.config import SAMPLE_SURVEY_DATA
+
+
+def parse_sse(message: str):
+    """SSEメッセージを (event, data) に変換"""
+    lines = dict(line.split(": ", 1) for line in message.strip().split("\n"))
+    return lines["event"], json.loads(lines["data"])
+
+
+async def never_disconnected():
+    return False
+
+
+class TestStatisticsBroadcaster:
+    """StatisticsBroadcasterのテストクラス"""
+
+    def test_delta_matches_response(self):
+        """1件の回答の差分が正しいこと"""
+        delta = statistics_delta({**SAMPLE_SURVEY_DATA, "timestamp": "2025-08-10T12:34:56"})
+
+        assert delta["total_responses"] == 1
+        assert delta["satisfaction_sum"] == 4
+        assert delta["age_distribution"] == {"20-29": 1}
+        assert delta["responses_by_date"] == {"2025-08-10": 1}
+
+    def test_fan_out_to_all_subscribers(self):
+        """1回の配信が全ての購読者に届くこと"""
+        async def scenario():
+            broadcaster = StatisticsBroadcaster()
+            subscriptions = [broadcaster.subscribe() for _ in range(50)]
+
+            broadcaster.publish("delta", {"total_responses": 1})
+            await asyncio.sleep(0)
+
+            messages = [s.queue.get_nowait() for s in subscriptions]
+            return broadcaster, messages
+
+        broadcaster, messages = asyncio.run(scenario())
+        assert len(set(messages)) == 1
+        assert parse_sse(messages[0]) == ("delta", {"total_responses": 1})
+        assert broadcaster.metrics()["published"] == 1
+
+    def test_slow_consumer_is_dropped(self):
+        """バッファが溢れた購読者は切断され、他の購読者には影響しないこと"""
+        async def scenario():
+            broadcaster = StatisticsBroadcaster(buffer_size=3)
+            slow = broadcaster.subscribe()
+            fast = broadcaster.subscribe()
+            received = []
+
+            for i in range(5):
+                broadcaster.publish("delta", {"n": i})
+                await asyncio.sleep(0)
+                received.append(fast.queue.get_nowait())
+
+            events = [event async for event in broadcaster.stream(slow, never_disconnected)]
+            return broadcaster, received, events
+
+        broadcaster, received, events = asyncio.run(scenario())
+        assert len(received) == 5
+        assert [parse_sse(e)[0] for e in events] == ["ready", "dropped"]
+        assert broadcaster.metrics() == {"subscribers": 1, "published": 5, "dropped": 1}
+
+    def test_subscriber_limit(self):
+        """購読数の上限を超えた場合は購読できないこと"""
+        async def scenario():
+            broadcaster = StatisticsBroadcaster(max_subscribers=1)
+            return broadcaster.subscribe(), broadcaster.subscribe()
+
+        first, second = asyncio.run(scenario())
+        assert first is not None
+        assert second is None
+
+    def test_keepalive_and_disconnect(self):
+        """無通信時はkeepaliveを送り、切断を検知したら終了すること"""
+        async def scenario():
+            broadcaster = StatisticsBroadcaster()
+            subscription = broadcaster.subscribe()
+            checks = iter([False, True])
+
+            async def is_disconnected():
+                return next(checks)
+
+            events = [e async for e in broadcaster.stream(subscription, is_disconnected, keepalive=0.01)]
+            return broadcaster, events
+
+        broadcaster, events = asyncio.run(scenario())
+        assert events[1] == ": keepalive\n\n"
+        assert len(events) == 2
+        assert broadcaster.subscriber_count == 0
+
+
+class TestStatisticsStreamEndpoint:
+    """/survey/statistics/stream と送信処理の連携テスト"""
+
+    def test_submit_publishes_delta(self, client: TestClient, mock_firestore):
+        """回答の送信で購読者に差分が配信されること"""
+        import main
+
+        async def scenario():
+            subscription = main.statistics_broadcaster.subscribe()
+            try:
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(
+                    None, lambda: client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+                )
+                message = await asyncio.wait_for(subscription.queue.get(), timeout=1)
+                return response, message
+            finally:
+                main.statistics_broadcaster.unsubscribe(subscription)
+
+        response, message = asyncio.run(scenario())
+        assert response.status_code == 200
+
+        event, data = parse_sse(message)
+        assert event == "delta"
+        assert data["total_responses"] == 1
+        assert data["satisfaction_distribution"] == {"4": 1}
+
+    def test_stream_rejects_over_capacity(self, client: TestClient):
+        """接続数の上限に達している場合は503を返すこと"""
+        from unittest.mock import patch
+        with patch("main.statistics_broadcaster", StatisticsBroadcaster(max_subscribers=0)):
+            response = client.get("/survey/statistics/stream")
+        assert response.status_code == 503
@@ -0,0 +1,146 @@
+"""時系列統計（ロールアップ）エンドポイントのユニットテスト"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from datetime import date, timedelta
+from fastapi.testclient import TestClient
+from tests.config import MULTIPLE_TEST_DATA
+
+
+class TestStatisticsTimeseries:
+    """/survey/statistics/timeseries のテストクラス"""
+
+    def _submit_all(self, client: TestClient):
+        for test_data in MULTIPLE_TEST_DATA:
+            response = client.post("/survey/submit", json=test_data)
+            assert response.status_code == 200
+
+    def test_daily_rollups_sum_submissions(self, client: TestClient, mock_firestore):
+        """送信した回答が日単位のロールアップに加算されること"""
+        self._submit_all(client)
+        today = date.today().isoformat()
+        start = (date.today() - timedelta(days=2)).isoformat()
+
+        response = client.get(f"/survey/statistics/timeseries?start={start}&end={today}")
+        assert response.status_code == 200
+
+        data = response.json()["data"]
+        assert [point["bucket"] for point in data["series"]][-1] == today
+        assert len(data["series"]) == 3
+        assert data["series"][-1]["total_responses"] == 3
+
+        statistics = data["statistics"]
+        assert statistics["total_responses"] == 3
+        assert statistics["average_satisfaction"] == 4.0
+        assert statistics["gender_distribution"] == {"male": 1, "female": 1, "other": 1}
+        assert statistics["responses_by_date"] == {today: 3}
+        # 開発環境では全ての回答が同一のモックユーザーになる
+        assert statistics["unique_users"] == 1
+
+    def test_hourly_rollups_match_daily(self, client: TestClient, mock_firestore):
+        """時間単位の合計が日単位と一致すること"""
+        self._submit_all(client)
+        today = date.today().isoformat()
+
+        response = client.get(f"/survey/statistics/timeseries?start={today}&end={today}&granularity=hour")
+        assert response.status_code == 200
+
+        data = response.json()["data"]
+        assert len(data["series"]) == 24
+        assert sum(point["total_responses"] for point in data["series"]) == 3
+        assert data["statistics"]["total_responses"] == 3
+
+    def test_rollups_match_calculate_statistics(self, client: TestClient, mock_firestore):
+        """ロールアップの統計が全件走査の統計と一致すること"""
+        self._submit_all(client)
+        today = date.today().isoformat()
+
+        rollup_stats = client.get(f"/survey/statistics/timeseries?start={today}&end={today}").json()["data"]["statistics"]
+        scan_stats = client.get("/survey/results").json()["data"]["statistics"]
+
+        assert rollup_stats == scan_stats
+
+    @pytest.mark.parametrize("query", [
+        "start=2025-08-10&end=2025-08-01",
+        "start=2025/08/01&end=2025-08-10",
+        "start=2024-01-01&end=2025-12-31",
+        "start=2025-08-01&end=2025-08-10&granularity=minute",
+    ])
+    def test_invalid_ranges(self, client: TestClient, query):
+        """不正な期間・粒度は422になること"""
+        response = client.get(f"/survey/statistics/timeseries?{query}")
+        assert response.status_code == 422
+
+    def test_empty_range(self, client: TestClient, mock_firestore):
+        """回答のない期間は0件の統計を返すこと"""
+        response = client.get("/survey/statistics/timeseries?start=2020-01-01&end=2020-01-07")
+        assert response.status_code == 200
+
+        data = response.json()["data"]
+        assert len(data["series"]) == 7
+        assert data["statistics"]["total_responses"] == 0
+        assert data["statistics"]["unique_users"] == 0
+
+    def test_unique_users_merge_sharded_sketches(self, client: TestClient, mock_firestore):
+        """ユーザーごとに分割したスケッチと分割前の日単位のスケッチをマージすること"""
+        import main
+        from sketches import HyperLogLog
+
+        today = date.today().isoformat()
+        user_ids = [f"U{i:04d}" for i in range(200)]
+        for user_id in user_ids:
+            asyncio.run(main.record_user_sketch({"userId": user_id, "timestamp": f"{today}T12:00:00"}))
+        # 分割前の形式のスケッチ
+        legacy = HyperLogLog()
+        legacy.update(user_ids[:100] + ["U_legacy"])
+        mock_firestore.collection('survey_user_sketches').document(today).set(
+            {"date": today, "registers": legacy.to_bytes()}
+        )
+
+        shards = {main.user_sketch_document_id(today, user_id) for user_id in user_ids}
+        assert len(shards) == main.USER_SKETCH_SHARDS
+        assert main.user_sketch_document_id(today, "U0001") == main.user_sketch_document_id(today, "U0001")
+
+        response = client.get(f"/survey/statistics/timeseries?start={today}&end={today}")
+        unique_users = response.json()["data"]["statistics"]["unique_users"]
+        assert abs(unique_users - 201) <= 201 * 3 * HyperLogLog().standard_error
+
+    def test_firestore_calls_run_off_event_loop(self, client: TestClient, mock_firestore):
+        """ロールアップの書き込みと読み取りをイベントループ外（スレッドプール）で実行すること"""
+        on_loop = []
+
+        def running_loop():
+            try:
+                asyncio.get_running_loop()
+                return True
+            except RuntimeError:
+                return False
+
+        create_batch = mock_firestore.batch
+
+        def tracking_batch():
+            batch = create_batch()
+            commit = batch.commit
+
+            def tracking_commit(timeout=None):
+                on_loop.append(("commit", running_loop()))
+                commit(timeout=timeout)
+
+            batch.commit = tracking_commit
+            return batch
+
+        get_all = mock_firestore.get_all
+
+        def tracking_get_all(refs, timeout=None):
+            on_loop.append(("get_all", running_loop()))
+            return get_all(refs, timeout=timeout)
+
+        with patch.object(mock_firestore, 'batch', tracking_batch), \
+                patch.object(mock_firestore, 'get_all', tracking_get_all):
+            self._submit_all(client)
+            today = date.today().isoformat()
+            assert client.get(f"/survey/statistics/timeseries?start={today}&end={today}").status_code == 200
+
+        assert {name for name, _ in on_loop} == {"commit", "get_all"}
+        assert not any(loop for _, loop in on_loop)
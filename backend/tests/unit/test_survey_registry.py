@@ -0,0 +1,170 @@
+"""アンケート定義レジストリのユニットテスト"""
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from sqlite_storage import SQLiteStore
+from surveys import DEFAULT_SURVEY, SurveyDefinition, SurveyRegistry, survey_collection
+from tests.config import SAMPLE_SURVEY_DATA
+
+CAMPAIGN_SURVEY = {
+    "id": "summer-2025",
+    "title": "夏のキャンペーンアンケート",
+    "questions": [
+        {"name": "store", "type": "choice", "options": ["shibuya", "umeda"]},
+        {"name": "rating", "type": "rating", "min": 1, "max": 10},
+        {"name": "comment", "type": "text", "required": False, "max_length": 200},
+    ],
+}
+
+
+@pytest.fixture
+def registry():
+    """既定のアンケートとキャンペーンを登録したレジストリ"""
+    registry = SurveyRegistry()
+    registry.register(DEFAULT_SURVEY)
+    registry.register(SurveyDefinition(**CAMPAIGN_SURVEY))
+    with patch("main.survey_registry", registry):
+        yield registry
+
+
+class TestSurveyRegistry:
+    """SurveyRegistryのテストクラス"""
+
+    def test_compiles_once_per_version(self):
+        """同じIDとバージョンの再登録ではコンパイルし直さないこと"""
+        registry = SurveyRegistry()
+        first = registry.register(SurveyDefinition(**CAMPAIGN_SURVEY))
+        again = registry.register(SurveyDefinition(**CAMPAIGN_SURVEY))
+        assert again is first
+        assert registry.compilations == 1
+
+        updated = registry.register(SurveyDefinition(**{**CAMPAIGN_SURVEY, "version": 2}))
+        assert updated is not first
+        assert registry.get("summer-2025") is updated
+        assert registry.compilations == 2
+
+    def test_compiled_validator(self, registry):
+        """定義の選択肢・評価の範囲で検証し、定義外のフィールドを除くこと"""
+        compiled = registry.get("summer-2025")
+        validated = compiled.validate({"store": "umeda", "rating": "10", "extra": "x"})
+        assert validated == {"store": "umeda", "rating": "10", "comment": None}
+
+        with pytest.raises(ValidationError):
+            compiled.validate({"store": "namba", "rating": "10"})
+        with pytest.raises(ValidationError):
+            compiled.validate({"store": "umeda", "rating": "11"})
+
+    def test_default_survey_matches_survey_request(self, registry):
+        """既定のアンケートはSurveyRequestと同じ回答を受け付けること"""
+        compiled = registry.get("default")
+        validated = compiled.validate(SAMPLE_SURVEY_DATA)
+        assert validated["satisfaction"] == SAMPLE_SURVEY_DATA["satisfaction"]
+        assert compiled.plan.distribution_fields == ("age", "gender", "frequency", "satisfaction")
+
+    @pytest.mark.parametrize("questions", [
+        [{"name": "userId", "type": "text"}],
+        [{"name": "a", "type": "text"}, {"name": "a", "type": "text"}],
+        [{"name": "a", "type": "choice"}],
+    ])
+    def test_invalid_definitions(self, questions):
+        """予約フィールド・重複・選択肢なしの定義は登録できないこと"""
+        with pytest.raises(ValueError):
+            SurveyRegistry().register(SurveyDefinition(id="broken", title="broken", questions=questions))
+
+    def test_statistics_plan(self, registry):
+        """集計プランで分布と評価の平均を計算すること"""
+        plan = registry.get("summer-2025").plan
+        stats = plan.compute([
+            {"store": "umeda", "rating": "8", "comment": "good", "timestamp": "2025-08-10T10:00:00"},
+            {"store": "shibuya", "rating": "6", "comment": None, "timestamp": "2025-08-11T10:00:00"},
+        ])
+        assert stats["total_responses"] == 2
+        assert stats["distributions"] == {"store": {"umeda": 1, "shibuya": 1}, "rating": {"8": 1, "6": 1}}
+        assert stats["averages"] == {"rating": 7.0}
+        assert stats["responses_by_date"] == {"2025-08-10": 1, "2025-08-11": 1}
+
+    def test_load_file(self, tmp_path):
+        """JSONファイルから定義を登録できること"""
+        path = tmp_path / "surveys.json"
+        path.write_text(json.dumps([CAMPAIGN_SURVEY]), encoding="utf-8")
+
+        registry = SurveyRegistry()
+        assert registry.load_file(str(path)) == 1
+        assert registry.get("summer-2025").definition.title == CAMPAIGN_SURVEY["title"]
+
+
+class TestSurveyEndpoints:
+    """アンケートIDを指定するエンドポイントのテストクラス"""
+
+    def test_list_and_get(self, client: TestClient, registry):
+        """登録済みの定義を取得できること"""
+        response = client.get("/surveys")
+        assert response.status_code == 200
+        assert [s["id"] for s in response.json()["data"]] == ["default", "summer-2025"]
+
+        assert client.get("/surveys/summer-2025").json()["data"]["title"] == CAMPAIGN_SURVEY["title"]
+        assert client.get("/surveys/unknown").status_code == 404
+
+    def test_submit_to_survey_collection(self, client: TestClient, mock_firestore, registry):
+        """回答がアンケートごとのコレクションに保存されること"""
+        response = client.post("/surveys/summer-2025/submit", json={"store": "umeda", "rating": "9"})
+        assert response.status_code == 200
+
+        stored = mock_firestore.collection(survey_collection("summer-2025"))._docs
+        assert len(stored) == 1
+        assert stored[0]["surveyId"] == "summer-2025"
+        assert stored[0]["userId"] == "U_mock_user_123"
+        assert mock_firestore.collection("survey_responses")._docs == []
+
+    def test_submit_validation_error(self, client: TestClient, registry):
+        """定義に合わない回答は422になること"""
+        response = client.post("/surveys/summer-2025/submit", json={"store": "namba", "rating": "9"})
+        assert response.status_code == 422
+        assert client.post("/surveys/unknown/submit", json={}).status_code == 404
+
+    def test_default_survey_uses_existing_flow(self, client: TestClient, mock_firestore, registry):
+        """既定のアンケートへの送信は従来のコレクションとロールアップに反映されること"""
+        response = client.post("/surveys/default/submit", json=SAMPLE_SURVEY_DATA)
+        assert response.status_code == 200
+        assert len(mock_firestore.collection("survey_responses")._documents()) == 1
+        assert mock_firestore.collection("survey_stats_rollups")._refs
+
+    def test_results_are_isolated_per_survey(self, client: TestClient, mock_firestore, registry):
+        """結果の取得は対象アンケートのコレクションのみを読み取ること"""
+        for rating in ("4", "8"):
+            client.post("/surveys/summer-2025/submit", json={"store": "umeda", "rating": rating})
+        client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+
+        response = client.get("/surveys/summer-2025/results")
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert len(data["responses"]) == 2
+        assert data["statistics"]["averages"] == {"rating": 6.0}
+        assert data["statistics"]["distributions"]["store"] == {"umeda": 2}
+        assert mock_firestore.collection("survey_responses").executed_queries == []
+
+    def test_mock_storage_paging_and_ids(self, client: TestClient, registry, tmp_path):
+        """Firestoreを使わない場合、既定のアンケートのSQLiteはSQLでページングし、IDは重複しないこと"""
+        store = SQLiteStore(str(tmp_path / "survey.db"))
+        try:
+            with patch('main.FIRESTORE_AVAILABLE', False), patch('main.mock_storage', store), \
+                    patch('main.mock_survey_storage', {}), patch('main.mock_rollups', {}), \
+                    patch('main.mock_user_sketches', {}), patch('main.RATE_LIMIT_ENABLED', False):
+                for _ in range(3):
+                    assert client.post("/survey/submit", json=SAMPLE_SURVEY_DATA).status_code == 200
+                with patch.object(SQLiteStore, '__iter__', side_effect=AssertionError("full scan")):
+                    data = client.get("/surveys/default/results", params={"limit": 2, "offset": 1}).json()["data"]
+                assert len(data["responses"]) == 2
+
+                ids = [
+                    client.post("/surveys/summer-2025/submit", json={"store": "umeda", "rating": "9"}).json()["data"]["id"]
+                    for _ in range(2)
+                ]
+                assert len(set(ids)) == 2
+                assert all(doc_id.startswith("mock_summer-2025_") for doc_id in ids)
+        finally:
+            store.close()
@@ -95,3 +95,111 @@ class TestSurveyResultsEndpoint:
         pagination_fields = ["total", "limit", "offset"]
         for field in pagination_fields:
             assert field in data["data"]["pagination"]
+
+
+class TestSurveyResultsProjection:
+    """fieldsパラメータ（射影クエリ）のテストクラス"""
+
+    def _submit(self, client: TestClient, count: int = 3):
+        for i in range(count):
+            response = client.post("/survey/submit", json={
+                "age": "20-29",
+                "gender": "female",
+                "frequency": "weekly",
+                "satisfaction": str(i + 3),
+                "feedback": "射影テスト",
+            })
+            assert response.status_code == 200
+
+    def test_projection_returns_only_requested_fields(self, client: TestClient, mock_firestore):
+        """指定フィールドとidのみが返ること"""
+        self._submit(client)
+
+        response = client.get("/survey/results?fields=age,satisfaction")
+        assert response.status_code == 200
+
+        data = response.json()["data"]
+        assert len(data["responses"]) == 3
+        for row in data["responses"]:
+            assert set(row.keys()) == {"id", "age", "satisfaction"}
+
+    def test_projection_statistics(self, client: TestClient, mock_firestore):
+        """射影したフィールドのみで統計が計算されること"""
+        self._submit(client)
+
+        response = client.get("/survey/results?fields=satisfaction")
+        statistics = response.json()["data"]["statistics"]
+
+        assert statistics["total_responses"] == 3
+        assert statistics["average_satisfaction"] == 4.0
+        assert statistics["satisfaction_distribution"] == {"3": 1, "4": 1, "5": 1}
+        # 取得していないフィールドの分布は空
+        assert statistics["age_distribution"] == {}
+        assert statistics["responses_by_date"] == {}
+
+    def test_projection_invalid_field(self, client: TestClient):
+        """存在しないフィールドの指定は422になること"""
+        response = client.get("/survey/results?fields=age,password")
+        assert response.status_code == 422
+
+        response = client.get("/survey/results?fields=,")
+        assert response.status_code == 422
+
+    def test_projection_fields_match_model(self):
+        """軽量行のフィールド構成がSurveyResponseと一致すること"""
+        from analytics import SURVEY_RESPONSE_FIELDS
+        from main import SurveyResponse
+
+        assert SURVEY_RESPONSE_FIELDS == tuple(SurveyResponse.model_fields)
+
+
+class TestSurveyResultsFilters:
+    """属性・期間による絞り込みのテストクラス"""
+
+    def _submit_all(self, client: TestClient):
+        from tests.config import MULTIPLE_TEST_DATA
+        for test_data in MULTIPLE_TEST_DATA:
+            response = client.post("/survey/submit", json=test_data)
+            assert response.status_code == 200
+
+    def test_filter_by_attributes(self, client: TestClient, mock_firestore):
+        """属性の等価条件で絞り込めること"""
+        self._submit_all(client)
+
+        response = client.get("/survey/results?age=20-29&frequency=daily")
+        assert response.status_code == 200
+
+        data = response.json()["data"]
+        assert len(data["responses"]) == 1
+        assert data["responses"][0]["age"] == "20-29"
+        assert data["statistics"]["total_responses"] == 1
+        assert data["statistics"]["frequency_distribution"] == {"daily": 1}
+
+    def test_filter_pushed_down_as_where(self, client: TestClient, mock_firestore):
+        """絞り込み条件がFirestoreのwhere句として実行されること"""
+        self._submit_all(client)
+
+        client.get("/survey/results?gender=female&satisfaction=4&start_date=2025-01-01&end_date=2099-12-31")
+
+        executed = mock_firestore.collection('survey_responses').executed_queries[-1]
+        assert executed["filters"] == [
+            ("gender", "=="),
+            ("satisfaction", "=="),
+            ("createdAt", ">="),
+            ("createdAt", "<"),
+        ]
+
+    def test_filter_by_date_range(self, client: TestClient, mock_firestore):
+        """期間外の回答が除外されること"""
+        self._submit_all(client)
+
+        response = client.get("/survey/results?start_date=2020-01-01&end_date=2020-12-31")
+        assert response.status_code == 200
+        assert response.json()["data"]["responses"] == []
+
+    def test_filter_invalid_values(self, client: TestClient):
+        """不正な絞り込み条件は422になること"""
+        assert client.get("/survey/results?gender=unknown").status_code == 422
+        assert client.get("/survey/results?satisfaction=6").status_code == 422
+        assert client.get("/survey/results?frequency=hourly").status_code == 422
+        assert client.get("/survey/results?start_date=2025/01/01").status_code == 422
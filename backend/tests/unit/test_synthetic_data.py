@@ -0,0 +1,109 @@
+"""合成データ生成のユニットテスト"""
+from collections import Counter
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backfill_user_latest import backfill_user_latest
+from local_storage import AppendOnlyLog
+from main import SurveyRequest
+from rebuild_rollups import rebuild_rollups
+from report import aggregate_file
+from sqlite_storage import SQLiteStore
+from synthetic_data import generate_responses, load_local, load_memory, load_sqlite, write_ndjson
+
+
+class TestGenerateResponses:
+    """generate_responsesのテストクラス"""
+
+    def test_deterministic(self):
+        """同じシードでは同じ回答列、異なるシードでは異なる回答列になること"""
+        assert list(generate_responses(200, seed=1)) == list(generate_responses(200, seed=1))
+        assert list(generate_responses(200, seed=1)) != list(generate_responses(200, seed=2))
+
+    def test_valid_survey_responses(self):
+        """全ての回答がSurveyRequestのバリデーションを通ること"""
+        for response in generate_responses(500):
+            SurveyRequest(**response)
+
+    def test_realistic_distribution(self):
+        """偏ったユーザー分布・期間内の時系列・日本語の自由記述を持つこと"""
+        responses = list(generate_responses(20000, seed=3, start="2025-01-01", days=90))
+
+        per_user = Counter(r["userId"] for r in responses)
+        top = sum(count for _, count in per_user.most_common(len(per_user) // 100))
+        assert top / len(responses) > 0.05  # 上位1%のユーザーが5%超の回答を占める
+
+        created = [r["createdAt"] for r in responses]
+        assert created == sorted(created)
+        assert "2025-01-01" <= created[0] and created[-1] < "2025-05-01"
+
+        feedback = [r["feedback"] for r in responses if r["feedback"]]
+        assert 0.3 < len(feedback) / len(responses) < 0.5
+        assert all(text.endswith("。") for text in feedback)
+
+    def test_user_profile_is_stable(self):
+        """同じユーザーの属性は回答ごとに変わらないこと"""
+        profiles = {}
+        for response in generate_responses(5000, seed=4):
+            profile = (response["age"], response["gender"], response["frequency"])
+            assert profiles.setdefault(response["userId"], profile) == profile
+
+
+class TestLoaders:
+    """投入処理のテストクラス"""
+
+    def test_load_memory(self):
+        storage = []
+        assert load_memory(storage, generate_responses(100)) == 100
+        assert len({r["id"] for r in storage}) == 100
+
+    def test_seed_firestore_in_batches(self, client: TestClient, mock_firestore, seed_responses):
+        """バッチ書き込みで投入した回答がAPIから読み取れること"""
+        responses = seed_responses(1200, seed=5)
+
+        stored = mock_firestore.collection('survey_responses')._documents()
+        assert len(stored) == 1200
+        assert {doc_id for doc_id, _ in stored} == {r["id"] for r in responses}
+
+        response = client.get("/survey/results", params={"limit": 1000})
+        assert response.json()["data"]["pagination"]["total"] == 1000
+
+    def test_seed_firestore_then_rebuild_derived(self, mock_firestore, seed_responses):
+        """投入後の再集計・バックフィルで、ロールアップ・スケッチ・user_latestが回答と一致すること"""
+        responses = seed_responses(300, seed=7, start="2025-03-01", days=10)
+        rebuild_rollups("2025-03-01")
+        backfill_user_latest()
+
+        per_user = Counter(r["userId"] for r in responses)
+        latest = {doc_id: data for doc_id, data in mock_firestore.collection('user_latest')._documents()}
+        assert {user_id: data["responseCount"] for user_id, data in latest.items()} == dict(per_user)
+
+        sketches = mock_firestore.collection('survey_user_sketches')._documents()
+        assert {data["date"] for _, data in sketches} == {r["timestamp"][:10] for r in responses}
+        daily = [data for _, data in mock_firestore.collection('survey_stats_rollups')._documents()
+                 if data["granularity"] == "day"]
+        assert sum(data["total"] for data in daily) == 300
+
+    @pytest.mark.parametrize("loader, open_store", [
+        (load_sqlite, lambda path: SQLiteStore(path)),
+        (load_local, lambda path: AppendOnlyLog(path)),
+    ])
+    def test_load_file_storage(self, tmp_path, loader, open_store):
+        """SQLite・ローカルストレージに投入でき、同じシードの再実行では重複しないこと"""
+        path = str(tmp_path / "responses")
+        assert loader(path, generate_responses(700, seed=8)) == 700
+        assert loader(path, generate_responses(700, seed=8)) == 0
+
+        store = open_store(path)
+        try:
+            assert len(store) == 700
+            assert store.get_many(["synthetic_8_0"]) if isinstance(store, SQLiteStore) else store.get("synthetic_8_0")
+        finally:
+            store.close()
+
+    def test_ndjson_roundtrip(self, tmp_path):
+        """NDJSONに書き出した回答をreport.pyで集計できること"""
+        path = tmp_path / "responses.ndjson"
+        assert write_ndjson(str(path), generate_responses(300, seed=6)) == 300
+        assert aggregate_file(str(path))["total_responses"] == 300
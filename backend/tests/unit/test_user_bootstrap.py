@@ -0,0 +1,43 @@
+"""User Bootstrap エンドポイントのユニットテスト"""
+import pytest
+from fastapi.testclient import TestClient
+from tests.config import SAMPLE_SURVEY_DATA
+
+
+class TestUserBootstrapEndpoint:
+    """/user/bootstrap のテストクラス"""
+
+    def test_bootstrap_without_response(self, client: TestClient, mock_firestore):
+        """未回答ユーザーの場合は最新回答がnullであること"""
+        response = client.post("/user/bootstrap", json={"userId": "U_mock_user_123"})
+        assert response.status_code == 200
+
+        data = response.json()["data"]
+        assert data["status"]["hasResponse"] is False
+        assert data["status"]["responseCount"] == 0
+        assert data["latestResponse"] is None
+
+    def test_bootstrap_matches_separate_endpoints(self, client: TestClient, mock_firestore):
+        """/user/status と /user/{id}/latest-response を合わせた内容と一致すること"""
+        for satisfaction in ["3", "5"]:
+            client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "satisfaction": satisfaction})
+
+        bootstrap = client.post("/user/bootstrap", json={"userId": "U_mock_user_123"}).json()["data"]
+        user_status = client.post("/user/status", json={"userId": "U_mock_user_123"}).json()["data"]
+        latest = client.get("/user/U_mock_user_123/latest-response").json()["data"]
+
+        assert bootstrap["status"] == user_status
+        assert bootstrap["status"]["responseCount"] == 2
+        assert bootstrap["latestResponse"] == latest
+        assert bootstrap["latestResponse"]["satisfaction"] == "5"
+
+    def test_bootstrap_reads_user_latest(self, client: TestClient, mock_firestore):
+        """状態と最新回答をuser_latestの1回の取得で返し、回答を検索しないこと"""
+        client.post("/survey/submit", json=SAMPLE_SURVEY_DATA)
+        collection = mock_firestore.collection('survey_responses')
+
+        data = client.post("/user/bootstrap", json={"userId": "U_mock_user_123"}).json()["data"]
+
+        assert data["status"]["responseCount"] == 1
+        assert data["latestResponse"]["feedback"] == SAMPLE_SURVEY_DATA["feedback"]
+        assert collection.executed_queries == []
@@ -0,0 +1,109 @@
+"""ユーザーごとの最新の回答（user_latest）のユニットテスト"""
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backfill_user_latest import backfill_user_latest
+from tests.config import SAMPLE_SURVEY_DATA
+
+USER_ID = "U_mock_user_123"
+
+
+@pytest.fixture(autouse=True)
+def disable_rate_limit():
+    with patch('main.RATE_LIMIT_ENABLED', False):
+        yield
+
+
+class TestUserLatest:
+    """送信時のuser_latestの更新と直接取得のテストクラス"""
+
+    def test_submit_writes_latest_in_same_batch(self, client: TestClient, mock_firestore):
+        """回答とuser_latestを1回のバッチでコミットすること"""
+        batches = []
+        create_batch = mock_firestore.batch
+
+        def tracking_batch():
+            batch = create_batch()
+            batches.append(batch)
+            return batch
+
+        with patch.object(mock_firestore, 'batch', tracking_batch), patch('main.record_rollups'):
+            for satisfaction in ["3", "5"]:
+                response = client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "satisfaction": satisfaction})
+                assert response.status_code == 200
+
+        assert len(batches) == 2
+        latest = mock_firestore.collection('user_latest').document(USER_ID).get().to_dict()
+        assert latest["responseId"] == response.json()["data"]["id"]
+        assert latest["response"]["satisfaction"] == "5"
+        assert latest["responseCount"] == 2
+
+    def test_reads_are_direct_gets(self, client: TestClient, mock_firestore):
+        """/user/status と最新回答の取得は回答を検索しないこと"""
+        for satisfaction in ["3", "5"]:
+            client.post("/survey/submit", json={**SAMPLE_SURVEY_DATA, "satisfaction": satisfaction})
+
+        status = client.post("/user/status", json={"userId": USER_ID}).json()["data"]
+        latest = client.get(f"/user/{USER_ID}/latest-response").json()["data"]
+
+        assert status["responseCount"] == 2
+        assert status["lastResponseId"] == latest["id"]
+        assert latest["satisfaction"] == "5"
+        assert mock_firestore.collection('survey_responses').executed_queries == []
+
+    def test_user_without_latest_falls_back_to_query(self, client: TestClient, mock_firestore):
+        """user_latestの導入前の回答のみを持つユーザーは回答を検索すること"""
+        mock_firestore.collection('survey_responses').add(
+            {**SAMPLE_SURVEY_DATA, "userId": USER_ID, "createdAt": "2025-01-01T00:00:00", "timestamp": "2025-01-01T00:00:00"}
+        )
+
+        status = client.post("/user/status", json={"userId": USER_ID}).json()["data"]
+        assert status["hasResponse"] is True
+        assert mock_firestore.collection('survey_responses').executed_queries
+
+    def test_backfilled_user_without_latest_has_no_response(self, client: TestClient, mock_firestore):
+        with patch('main.USER_LATEST_BACKFILLED', True):
+            status = client.post("/user/status", json={"userId": USER_ID}).json()["data"]
+        assert status["hasResponse"] is False
+        assert mock_firestore.collection('survey_responses').executed_queries == []
+
+
+class TestBackfillUserLatest:
+    """user_latestのバックフィルのテストクラス"""
+
+    def test_backfill_matches_queries(self, client: TestClient, mock_firestore, seed_responses):
+        import main
+
+        responses = seed_responses(300, seed=11)
+        user_ids = {response["userId"] for response in responses}
+        # 回答IDのみの形式（導入前）のuser_latest
+        some_user = next(iter(user_ids))
+        mock_firestore.collection('user_latest').document(some_user).set({"responseId": "old", "createdAt": "2000-01-01"})
+
+        assert backfill_user_latest() == len(user_ids)
+
+        for user_id in user_ids:
+            expected = main.fetch_user_responses(user_id)
+            latest, count = main.fetch_user_summary(user_id)
+            assert count == len(expected)
+            assert latest["id"] == expected[0]["id"]
+            assert latest["createdAt"] == expected[0]["createdAt"]
+
+    def test_backfill_keeps_newer_latest(self, client: TestClient, mock_firestore):
+        """走査後に送信された回答（より新しいuser_latest）は上書きしないこと"""
+        mock_firestore.collection('survey_responses').add(
+            {**SAMPLE_SURVEY_DATA, "userId": USER_ID, "createdAt": "2025-01-01T00:00:00", "timestamp": "2025-01-01T00:00:00"}
+        )
+        mock_firestore.collection('user_latest').document(USER_ID).set({
+            "responseId": "newer", "createdAt": "2099-01-01T00:00:00", "partition": None,
+            "response": {**SAMPLE_SURVEY_DATA, "satisfaction": "1", "createdAt": "2099-01-01T00:00:00"},
+            "responseCount": 1
+        })
+
+        backfill_user_latest()
+
+        latest = mock_firestore.collection('user_latest').document(USER_ID).get().to_dict()
+        assert latest["responseId"] == "newer"
+        assert latest["responseCount"] == 2
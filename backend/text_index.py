@@ -0,0 +1,317 @@
+"""自由記述（feedback）の転置インデックス
+
+形態素解析器を使わず、日本語（漢字・ひらがな・カタカナ）の連続部分は文字bigram、
+英数字の連続部分は単語をトークンとする。1文字のクエリにも一致するよう、登録時は日本語の
+各文字（unigram）も含める。ポスティングリストは文書番号の昇順配列で持ち、
+検索は新しい回答から順に辿って件数に達した時点で打ち切る。
+
+置き換え・削除された回答はremove()・remove_months()で除く。自由記述が分からない場合は
+文書番号を欠番とし、ポスティングリストからは次回のキーワード集計・保存時にまとめて取り除く。
+
+永続化時はポスティングリストを差分＋可変長整数（varint）で符号化し、zlibで圧縮する。
+"""
+import heapq
+import json
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# 日本語の連続部分（bigram化する）と英数字の連続部分（単語として扱う）
+_TOKEN_RUN = re.compile(r"[ぁ-ゟ゠-ヿ㐀-䶿一-鿿々]+|[a-z0-9]+")
+_HIRAGANA_ONLY = re.compile(r"^[ぁ-ゟ]+$")
+# 永続化形式のバージョン（2: 日本語のunigramと回答月を追加）
+_FORMAT_VERSION = 2
+
+
+def normalize(text: str) -> str:
+    """全角英数・半角カナなどを正規化し、小文字化する"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def tokenize(text: str, unigrams: bool = False) -> List[str]:
+    """テキストをトークン列に変換（日本語は文字bigram、1文字のみの場合はその文字）
+
+    unigrams=Trueの場合は日本語の各文字も含める（インデックスへの登録用）。
+    """
+    tokens: List[str] = []
+    for run in _TOKEN_RUN.findall(normalize(text)):
+        if run.isascii():
+            tokens.append(run)
+            continue
+        if len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if unigrams or len(run) == 1:
+            tokens.extend(run)
+    return tokens
+
+
+def month_number(created_at: Optional[str]) -> int:
+    """createdAt（ISO 8601）・YYYY-MMの回答月をYYYYMMの整数に変換（不明な場合は0）"""
+    try:
+        return int(created_at[:4]) * 100 + int(created_at[5:7])
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_keyword(token: str) -> bool:
+    """キーワード集計の対象とするトークン（ひらがなのみ・1文字のトークンは助詞や語尾が多いため除く）"""
+    return len(token) > 1 and not _HIRAGANA_ONLY.match(token)
+
+
+def _encode_postings(postings: array) -> bytes:
+    """昇順の文書番号を差分のvarint列に符号化"""
+    out = bytearray()
+    previous = 0
+    for number in postings:
+        delta = number - previous
+        previous = number
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def _decode_postings(data: bytes) -> array:
+    postings = array("I")
+    current = 0
+    delta = 0
+    shift = 0
+    for byte in data:
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        current += delta
+        postings.append(current)
+        delta = 0
+        shift = 0
+    return postings
+
+
+class FeedbackIndex:
+    """自由記述の増分更新可能な転置インデックス
+
+    文書（回答）は追加順に文書番号を割り当てるため、番号が大きいほど新しい回答となる。
+    除いた回答の文書番号は欠番（_doc_idsの値がNone）とし、再利用しない。
+    watermarkはFirestoreから取り込み済みの最新のcreatedAtで、差分の取り込みに使用する。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._doc_ids: List[Optional[str]] = []
+        self._doc_numbers: Dict[str, int] = {}
+        # 文書番号ごとの回答月（YYYYMM）
+        self._doc_months = array("I")
+        self._postings: Dict[str, array] = {}
+        # ポスティングリストに残っている欠番の数
+        self._pending_removals = 0
+        # remove_months()で除いた月（以降はその月の回答を追加しない）
+        self._removed_months: Set[int] = set()
+        self._keyword_cache: Optional[Tuple[int, List[Tuple[str, int]]]] = None
+        self.watermark: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self._doc_numbers)
+
+    def add(self, doc_id: str, text: Optional[str], created_at: Optional[str] = None) -> bool:
+        """回答の自由記述を追加する（追加済みの回答・空の記述・除いた月の回答はFalse）"""
+        if not text or doc_id in self._doc_numbers:
+            return False
+        month = month_number(created_at)
+        tokens = set(tokenize(text, unigrams=True))
+        with self._lock:
+            if doc_id in self._doc_numbers or month in self._removed_months:
+                return False
+            number = len(self._doc_ids)
+            self._doc_ids.append(doc_id)
+            self._doc_numbers[doc_id] = number
+            self._doc_months.append(month)
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = array("I")
+                postings.append(number)
+        return True
+
+    def add_many(self, documents: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> int:
+        """(doc_id, text, createdAt) の列を追加し、watermarkを進める"""
+        added = 0
+        for doc_id, text, created_at in documents:
+            if self.add(doc_id, text, created_at):
+                added += 1
+            if created_at and (self.watermark is None or created_at > self.watermark):
+                self.watermark = created_at
+        return added
+
+    def remove(self, doc_id: str, text: Optional[str] = None) -> bool:
+        """置き換え・削除された回答を除く（textは追加時の自由記述。分からない場合は欠番のみとする）"""
+        with self._lock:
+            number = self._doc_numbers.pop(doc_id, None)
+            if number is None:
+                return False
+            self._doc_ids[number] = None
+            self._keyword_cache = None
+            if not text:
+                self._pending_removals += 1
+                return True
+            for token in set(tokenize(text, unigrams=True)):
+                postings = self._postings.get(token)
+                i = bisect_left(postings, number) if postings is not None else 0
+                if postings is not None and i < len(postings) and postings[i] == number:
+                    postings.pop(i)
+                    if not postings:
+                        del self._postings[token]
+        return True
+
+    def remove_months(self, months: Iterable[str]) -> int:
+        """回答月（YYYY-MM）の回答を除き、除いた件数を返す（アーカイブ済みのパーティションなど）"""
+        numbers = {month_number(month) for month in months} - self._removed_months - {0}
+        if not numbers:
+            return 0
+        removed = 0
+        with self._lock:
+            self._removed_months |= numbers
+            for number, month in enumerate(self._doc_months):
+                doc_id = self._doc_ids[number]
+                if month in numbers and doc_id is not None:
+                    del self._doc_numbers[doc_id]
+                    self._doc_ids[number] = None
+                    removed += 1
+            if removed:
+                self._pending_removals += removed
+                self._keyword_cache = None
+        return removed
+
+    def _compact(self) -> None:
+        """ポスティングリストから欠番を取り除く（ロックを保持して呼ぶ）"""
+        if not self._pending_removals:
+            return
+        doc_ids = self._doc_ids
+        for token in list(self._postings):
+            postings = array("I", (number for number in self._postings[token] if doc_ids[number] is not None))
+            if postings:
+                self._postings[token] = postings
+            else:
+                del self._postings[token]
+        self._pending_removals = 0
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """クエリの全トークンを含む回答IDを新しい順に返す"""
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+
+        with self._lock:
+            postings = []
+            for token in tokens:
+                token_postings = self._postings.get(token)
+                if token_postings is None:
+                    return []
+                postings.append(token_postings)
+            postings.sort(key=len)
+            shortest, others = postings[0], postings[1:]
+
+            hits: List[str] = []
+            # 最短のリストを新しい順に辿り、他のリストは二分探索で包含を確認する
+            for i in range(len(shortest) - 1, -1, -1):
+                number = shortest[i]
+                if self._doc_ids[number] is not None and all(_contains(other, number) for other in others):
+                    hits.append(self._doc_ids[number])
+                    if len(hits) >= limit:
+                        break
+            return hits
+
+    def top_keywords(self, limit: int = 20) -> List[Tuple[str, int]]:
+        """出現する回答数の多いキーワード（インデックスの更新がなければ前回の結果を再利用）"""
+        with self._lock:
+            self._compact()
+            version = len(self._doc_ids)
+            if self._keyword_cache is None or self._keyword_cache[0] != version or len(self._keyword_cache[1]) < limit:
+                ranking = heapq.nlargest(
+                    max(limit, 100),
+                    ((token, len(postings)) for token, postings in self._postings.items() if is_keyword(token)),
+                    key=lambda item: item[1]
+                )
+                self._keyword_cache = (version, ranking)
+            return self._keyword_cache[1][:limit]
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self._doc_numbers),
+                "terms": len(self._postings),
+                "postings": sum(len(postings) for postings in self._postings.values()),
+                "watermark": self.watermark,
+            }
+
+    # --- 永続化 ---
+
+    def to_bytes(self) -> bytes:
+        with self._lock:
+            self._compact()
+            terms = []
+            blobs = []
+            for token, postings in self._postings.items():
+                blob = _encode_postings(postings)
+                terms.append([token, len(blob)])
+                blobs.append(blob)
+            header = json.dumps({
+                "version": _FORMAT_VERSION,
+                "watermark": self.watermark,
+                "doc_ids": self._doc_ids,
+                "doc_months": self._doc_months.tolist(),
+                "removed_months": sorted(self._removed_months),
+                "terms": terms,
+            }, ensure_ascii=False).encode("utf-8")
+        return zlib.compress(len(header).to_bytes(4, "big") + header + b"".join(blobs))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FeedbackIndex":
+        raw = zlib.decompress(data)
+        header_size = int.from_bytes(raw[:4], "big")
+        header = json.loads(raw[4:4 + header_size].decode("utf-8"))
+        if header["version"] != _FORMAT_VERSION:
+            raise ValueError(f"unsupported feedback index version: {header['version']}")
+
+        index = cls()
+        index.watermark = header["watermark"]
+        index._doc_ids = header["doc_ids"]
+        index._doc_numbers = {doc_id: number for number, doc_id in enumerate(index._doc_ids) if doc_id is not None}
+        index._doc_months = array("I", header["doc_months"])
+        index._removed_months = set(header["removed_months"])
+        position = 4 + header_size
+        for token, size in header["terms"]:
+            index._postings[token] = _decode_postings(raw[position:position + size])
+            position += size
+        return index
+
+    def save(self, path: str) -> None:
+        """一時ファイルに書き込んでから置き換える
+
+        複数のワーカーが終了時に同じパスへ保存しても、壊れたファイルが残らないよう
+        一時ファイル名にはプロセスIDを含める（最後に置き換えたワーカーの内容が残る）。
+        """
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(self.to_bytes())
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @classmethod
+    def load(cls, path: str) -> "FeedbackIndex":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def _contains(postings: array, number: int) -> bool:
+    i = bisect_left(postings, number)
+    return i < len(postings) and postings[i] == number
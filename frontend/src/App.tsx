@@ -4,8 +4,8 @@ import SurveyForm from '@/components/SurveyForm';
 import ThankYou from '@/components/ThankYou';
 import LoadingScreen from '@/components/LoadingScreen';
 import ErrorMessage from '@/components/ErrorMessage';
-import { checkUserStatus, getUserLatestResponse, setIDTokenForAPI } from '@/services/api';
-import { UserStatus, SurveyResponse } from '@/types';
+import { bootstrapUser, setIDTokenForAPI } from '@/services/api';
+import { UserStatus, SurveyResponse, UserBootstrap } from '@/types';
 
 function App() {
   const { isLoading, error, profile, isLoggedIn, getIDToken } = useLiff();
@@ -49,28 +49,21 @@ function App() {
           setTimeout(() => reject(new Error('Timeout')), 5000)
         );
         
-        const statusPromise = checkUserStatus({
+        // 回答状態と最新回答を1回のリクエストで取得
+        const bootstrapPromise = bootstrapUser({
           userId: profile.userId,
           displayName: profile.displayName
         });
         
         // レースコンディション: タイムアウトまたは正常なレスポンス
-        const status = await Promise.race([statusPromise, timeoutPromise]) as UserStatus;
+        const bootstrap = await Promise.race([bootstrapPromise, timeoutPromise]) as UserBootstrap;
         
-        setUserStatus(status);
+        setUserStatus(bootstrap.status);
 
-        // 回答済みの場合、最新の回答を取得
-        if (status.hasResponse) {
-          try {
-            const latestResponse = await getUserLatestResponse(profile.userId);
-            if (latestResponse) {
-              setPreviousResponse(latestResponse);
-              setShowPreviousResponseConfirm(true);
-            }
-          } catch (responseError) {
-            console.warn('Failed to fetch previous response:', responseError);
-            // 前回の回答取得に失敗してもユーザー状態は保持
-          }
+        // 回答済みの場合、最新の回答を表示
+        if (bootstrap.status.hasResponse && bootstrap.latestResponse) {
+          setPreviousResponse(bootstrap.latestResponse);
+          setShowPreviousResponseConfirm(true);
         }
       } catch (error) {
         console.error('Failed to fetch user status:', error);
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { SurveyFormData, ApiResponse, UserStatus, UserStatusRequest, SurveyResponse } from '@/types';
+import { SurveyFormData, ApiResponse, UserStatus, UserStatusRequest, SurveyResponse, UserBootstrap } from '@/types';
 
 // API ベースURL（環境変数から取得、fallbackは開発用）
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
@@ -78,6 +78,22 @@ export const checkUserStatus = async (userRequest: UserStatusRequest): Promise<U
   }
 };
 
+// 起動時の初期データ取得（回答状態と最新回答を1往復で取得）
+export const bootstrapUser = async (userRequest: UserStatusRequest): Promise<UserBootstrap> => {
+  try {
+    const response = await apiClient.post<ApiResponse<UserBootstrap>>('/user/bootstrap', userRequest);
+    
+    if (response.data.success && response.data.data) {
+      return response.data.data;
+    } else {
+      throw new Error(response.data.error || 'ユーザー情報の取得に失敗しました');
+    }
+  } catch (error: any) {
+    console.error('Error bootstrapping user:', error);
+    throw new Error(error.response?.data?.detail || error.message || 'ユーザー情報の取得に失敗しました');
+  }
+};
+
 // ユーザーの最新回答取得
 export const getUserLatestResponse = async (userId: string): Promise<SurveyResponse | null> => {
   try {
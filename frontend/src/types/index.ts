@@ -36,6 +36,12 @@ export interface SurveyResponse extends SurveyFormData {
   timestamp: string;
 }
 
+// 起動時の初期データ（回答状態と最新回答）
+export interface UserBootstrap {
+  status: UserStatus;
+  latestResponse: SurveyResponse | null;
+}
+
 // API レスポンスの型定義
 export interface ApiResponse<T> {
   success: boolean;
@@ -53,6 +59,9 @@ export interface SurveyStatistics {
   satisfaction_distribution: Record<string, number>;
   average_satisfaction: number;
   responses_by_date: Record<string, number>;
+  unique_users?: number | null;
+  satisfaction_percentiles?: Record<string, number> | null;
+  nps?: number | null;
 }
 
 // エラーの型定義
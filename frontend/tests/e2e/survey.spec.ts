@@ -69,7 +69,7 @@ test.describe('LIFF Survey App', () => {
     await page.fill('textarea[name="feedback"]', 'とても良いサービスです');
     
     // IDToken認証APIモックを設定
-    await page.route('**/user/status', async route => {
+    await page.route('**/user/bootstrap', async route => {
       const request = route.request();
       const authHeader = request.headers()['authorization'];
       
@@ -80,9 +80,12 @@ test.describe('LIFF Survey App', () => {
           body: JSON.stringify({
             success: true,
             data: {
-              userId: 'U_mock_user_123',
-              hasResponse: false,
-              responseCount: 0
+              status: {
+                userId: 'U_mock_user_123',
+                hasResponse: false,
+                responseCount: 0
+              },
+              latestResponse: null
             }
           })
         });